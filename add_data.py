@@ -1,11 +1,12 @@
 from models import SessionLocal, Usuario, Examen
+from avisos import a_mascara
 
 def agregar_datos():
     session = SessionLocal()
 
     nuevo_usuario = Usuario(
         telefono="whatsapp:+51972552408",
-        avisos_globales="30,20,10,5",
+        avisos_globales_mask=a_mascara([30, 20, 10, 5]),
         usar_globales=True,
         timezone="America/Lima"  # <- Zona horaria del usuario
     )
@@ -13,7 +14,7 @@ def agregar_datos():
     examen = Examen(
         curso="Física",
         fecha="2025-08-15",
-        avisos="30,20,10,5"
+        avisos_mask=a_mascara([30, 20, 10, 5])
     )
 
     nuevo_usuario.examenes.append(examen)
@@ -3,6 +3,7 @@ import argparse
 from typing import List, Dict
 import pytz
 from models import SessionLocal, Usuario, Examen
+from avisos import MIN_DIA, MAX_DIA, a_mascara, a_texto, parse_avisos
 from sqlalchemy.orm import joinedload
 
 DEFAULT_AVISOS = "30,20,10,5"
@@ -21,8 +22,8 @@ def validar_avisos(cadena: str) -> str:
         avisos = [int(x) for x in cadena.split(",")]
     except Exception:
         raise ValueError("Formato de avisos inválido. Usa números separados por comas. Ej: 30,20,10,5")
-    if any(a < 5 for a in avisos):
-        raise ValueError("Todos los días de aviso deben ser >= 5")
+    if any(not MIN_DIA <= a <= MAX_DIA for a in avisos):
+        raise ValueError(f"Todos los días de aviso deben estar entre {MIN_DIA} y {MAX_DIA}")
     return ",".join(str(a) for a in avisos)
 
 
@@ -65,13 +66,17 @@ def registrar_examen_interactivo(usuario):
     while True:
         curso = input("\nNombre del curso (ej: Física): ").strip()
         fecha = input("Fecha del examen (formato YYYY-MM-DD): ").strip()
-        avisos = pedir_avisos(usuario.avisos_globales)
+        avisos = pedir_avisos(a_texto(usuario.avisos_globales_mask))
 
-        nuevo_examen = Examen(
-            curso=curso,
-            fecha=fecha,
-            avisos=avisos
-        )
+        try:
+            nuevo_examen = Examen(
+                curso=curso,
+                fecha=fecha,
+                avisos_mask=a_mascara(parse_avisos(avisos))
+            )
+        except ValueError as e:
+            print(f"❌ {e}")
+            continue
         usuario.examenes.append(nuevo_examen)
         print(f"✅ Examen de {curso} el {fecha} registrado correctamente.")
 
@@ -98,7 +103,7 @@ def registrar_usuario_db(session, telefono, timezone, examenes):
         nuevo_examen = Examen(
             curso=ex["curso"],
             fecha=ex["fecha"],
-            avisos=ex.get("avisos", DEFAULT_AVISOS)
+            avisos_mask=a_mascara(parse_avisos(ex.get("avisos", DEFAULT_AVISOS)))
         )
         usuario.examenes.append(nuevo_examen)
 
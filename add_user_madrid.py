@@ -1,4 +1,5 @@
 from models import SessionLocal, Usuario, Examen, init_db
+from avisos import a_mascara
 
 # Inicializa la BD por si acaso
 init_db()
@@ -7,7 +8,7 @@ session = SessionLocal()
 # Crear usuario ficticio con zona horaria de Madrid
 usuario = Usuario(
     telefono="whatsapp:+34123456789",  # Número ficticio
-    avisos_globales="30,20,10,5",
+    avisos_globales_mask=a_mascara([30, 20, 10, 5]),
     usar_globales=True,
     timezone="Europe/Madrid"
 )
@@ -18,7 +19,7 @@ session.commit()
 examen = Examen(
     curso="Matemáticas",
     fecha="2025-08-15",
-    avisos="30,20,10,5",
+    avisos_mask=a_mascara([30, 20, 10, 5]),
     usuario_id=usuario.id
 )
 session.add(examen)
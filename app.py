@@ -3,13 +3,17 @@ import json
 import schedule
 import time
 import random
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from pathlib import Path
 from dotenv import load_dotenv
+from registro_envios import RegistroEnvios
+from diario_datos import DiarioDatos
 
 # ================== CONFIG ==================
 DRY_RUN = True  # True => Simulación (no envía). False => Enviar mensajes reales.
-SENT_LOG_PATH = Path("sent_log.json")  # Log para evitar duplicados diarios
+DATA_PATH = Path("data.json")  # Alumnos y exámenes (lo edita gestor_avisos.py)
+SENT_LOG_DIR = Path("sent_log")  # Envíos ya hechos, un archivo por fecha de examen (ver registro_envios.py)
+SENT_LOG_LEGADO = Path("sent_log.json")  # Formato anterior; se importa la primera vez
 HORARIOS = ["09:00", "15:00"]  # Horas programadas
 AVISOS_DEFAULT = [30, 10, 5]  # Si no hay avisos válidos
 MIN_DIA = 5
@@ -62,13 +66,20 @@ def save_json(path, data):
     except Exception as e:
         print(f"[{datetime.now()}] Error guardando {path}: {e}")
 
+_registro_envios = None
+
+def registro_envios():
+    """El registro se abre una vez por proceso: en el bucle de main() no se vuelve a leer."""
+    global _registro_envios
+    if _registro_envios is None:
+        _registro_envios = RegistroEnvios(SENT_LOG_DIR, SENT_LOG_LEGADO)
+    return _registro_envios
+
 def ya_enviado_hoy(log, student_name, course, exam_date, hoy):
-    key = f"{student_name}|{course}|{exam_date}|{hoy.isoformat()}"
-    return key in log
+    return log.ya_enviado(student_name, course, exam_date, hoy)
 
 def marcar_enviado(log, student_name, course, exam_date, hoy):
-    key = f"{student_name}|{course}|{exam_date}|{hoy.isoformat()}"
-    log[key] = True
+    log.marcar(student_name, course, exam_date, hoy)
 
 def normalizar_avisos(avisos):
     """ Mantiene solo valores entre 5 y 30, máximo 4, sin duplicados, orden desc. """
@@ -89,6 +100,39 @@ def obtener_avisos(estudiante, examen):
     else:
         return normalizar_avisos(examen.get("avisos", []))
 
+# ================== CACHÉ DE data.json ==================
+# data.json (y su diario de cambios, ver diario_datos.py) solo se vuelve a leer si cambió el mtime o
+# el tamaño de alguno. Al leerlo se parsean las fechas y se normalizan los avisos una vez, y se arma
+# un índice día de envío -> recordatorios de ese día, así un tick del bucle sin cambios en el archivo
+# es un par de stat() y un dict.get().
+_datos = {"firma": None, "por_dia": {}}
+
+def indexar_recordatorios(estudiantes):
+    """ {día de envío: [(estudiante, examen, días restantes), ...]} en el orden de data.json. """
+    por_dia = {}
+    for estudiante in estudiantes:
+        for examen in estudiante["examenes"]:
+            fecha_examen = datetime.strptime(examen["fecha"], "%Y-%m-%d").date()
+            for dias in obtener_avisos(estudiante, examen):
+                dia = fecha_examen - timedelta(days=dias)
+                por_dia.setdefault(dia, []).append((estudiante, examen, dias))
+    return por_dia
+
+def recordatorios_del_dia(hoy, path=None):
+    diario = DiarioDatos(path or DATA_PATH)
+    firma = diario.firma()
+    if firma != _datos["firma"]:
+        try:
+            por_dia = indexar_recordatorios(diario.cargar(default=[]))
+        except Exception as e:
+            # Quedó mal escrito o a medias: se sigue con lo último que se leyó bien y se reintenta
+            # en el próximo tick.
+            print(f"[{datetime.now()}] Error leyendo {diario.path}: {e}")
+        else:
+            # Si cambió mientras se leía, no se guarda la firma: el próximo tick lo relee.
+            _datos.update(firma=firma if diario.firma() == firma else None, por_dia=por_dia)
+    return _datos["por_dia"].get(hoy, [])
+
 # ================== INTERFAZ DE MENSAJERÍA ==================
 def enviar_mensaje(to, body, media_url=None):
     """Interfaz única para enviar mensajes, independientemente del proveedor."""
@@ -111,35 +155,26 @@ def enviar_mensaje(to, body, media_url=None):
 
 # ================== LÓGICA PRINCIPAL ==================
 def enviar_recordatorios(simulated_today: date | None = None):
-    estudiantes = load_json("data.json", default=[])
-    sent_log = load_json(SENT_LOG_PATH, default={})
-
     hoy = simulated_today or datetime.today().date()
+    pendientes = recordatorios_del_dia(hoy)
+    sent_log = registro_envios()
+    sent_log.podar(hoy)  # exámenes que ya pasaron: no se les vuelve a avisar
+
+    for estudiante, examen, dias_restantes in pendientes:
+        if ya_enviado_hoy(sent_log, estudiante["nombre"], examen["curso"], examen["fecha"], hoy):
+            continue
+
+        cita = random.choice(CITAS)
+        imagen = random.choice(IMAGENES)
+        cuerpo = (
+            f"Hola {estudiante['nombre']}! "
+            f"Tu examen de {examen['curso']} es en {dias_restantes} día(s). "
+            f"¡Es hora de prepararte! 💪\n"
+            f"Frase inspiradora: {cita}"
+        )
 
-    for estudiante in estudiantes:
-        for examen in estudiante["examenes"]:
-            fecha_examen = datetime.strptime(examen["fecha"], "%Y-%m-%d").date()
-            dias_restantes = (fecha_examen - hoy).days
-
-            avisos = obtener_avisos(estudiante, examen)
-
-            if dias_restantes in avisos:
-                if ya_enviado_hoy(sent_log, estudiante["nombre"], examen["curso"], examen["fecha"], hoy):
-                    continue
-
-                cita = random.choice(CITAS)
-                imagen = random.choice(IMAGENES)
-                cuerpo = (
-                    f"Hola {estudiante['nombre']}! "
-                    f"Tu examen de {examen['curso']} es en {dias_restantes} día(s). "
-                    f"¡Es hora de prepararte! 💪\n"
-                    f"Frase inspiradora: {cita}"
-                )
-
-                enviar_mensaje(estudiante["telefono"], cuerpo, media_url=[imagen])
-                marcar_enviado(sent_log, estudiante["nombre"], examen["curso"], examen["fecha"], hoy)
-
-    save_json(SENT_LOG_PATH, sent_log)
+        enviar_mensaje(estudiante["telefono"], cuerpo, media_url=[imagen])
+        marcar_enviado(sent_log, estudiante["nombre"], examen["curso"], examen["fecha"], hoy)
 
 def main():
     print(f"Arrancando bot académico. DRY_RUN = {DRY_RUN}. Hoy: {datetime.today().date()}")
@@ -0,0 +1,62 @@
+# avisos.py
+# Avisos (días antes del examen) como máscara de bits: el bit i representa MIN_DIA + i días.
+# Con días entre 5 y 30 la lista completa cabe en 26 bits, y la base puede evaluar
+# `mascara & (1 << (dias - MIN_DIA))` sin parsear cadenas.
+
+# ---------------- CONFIG ----------------
+MIN_DIA = 5
+MAX_DIA = 30
+MAX_AVISOS = 4
+AVISOS_DEFAULT = [30, 20, 10, 5]
+
+
+def a_mascara(dias) -> int:
+    """[30, 10, 5] -> máscara. Ignora valores fuera de MIN_DIA..MAX_DIA."""
+    mascara = 0
+    for d in dias:
+        d = int(d)
+        if MIN_DIA <= d <= MAX_DIA:
+            mascara |= 1 << (d - MIN_DIA)
+    return mascara
+
+
+def de_mascara(mascara: int | None) -> list[int]:
+    """Máscara -> lista de días en orden descendente (como se muestran al usuario)."""
+    mascara = mascara or 0
+    return [MIN_DIA + i for i in range(MAX_DIA - MIN_DIA, -1, -1) if mascara >> i & 1]
+
+
+MASCARA_DEFAULT = a_mascara(AVISOS_DEFAULT)
+
+
+def tiene_aviso(mascara: int | None, dias: int) -> bool:
+    return MIN_DIA <= dias <= MAX_DIA and bool((mascara or 0) >> (dias - MIN_DIA) & 1)
+
+
+def mascara_efectiva(mascara_examen: int | None, mascara_globales: int | None) -> int:
+    """Avisos del examen; si no tiene, los globales del usuario; si tampoco, los de por defecto."""
+    return mascara_examen or mascara_globales or MASCARA_DEFAULT
+
+
+def parse_avisos(cadena: str | None) -> list[int]:
+    """'30,20,10' -> [30, 20, 10]. Formato de texto heredado (columnas antiguas, CLI)."""
+    if not cadena:
+        return []
+    return [int(x) for x in str(cadena).split(",") if x.strip().isdigit()]
+
+
+def normalizar_avisos(avisos, default=AVISOS_DEFAULT) -> list[int]:
+    """Solo días entre MIN_DIA y MAX_DIA, sin duplicados, orden desc., máximo MAX_AVISOS."""
+    if not avisos:
+        return list(default)
+    try:
+        avisos = [int(x) for x in avisos]
+    except ValueError:
+        return list(default)
+    filtrados = sorted({d for d in avisos if MIN_DIA <= d <= MAX_DIA}, reverse=True)
+    return filtrados[:MAX_AVISOS] if filtrados else list(default)
+
+
+def a_texto(mascara: int | None) -> str:
+    """Máscara -> '30,20,10,5' (para mostrar o exportar)."""
+    return ",".join(map(str, de_mascara(mascara)))
@@ -0,0 +1,392 @@
+# benchmark.py
+import os
+import io
+import math
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+import contextlib
+import socket
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+SALIDA_DIR = Path("bench_resultados")
+
+COMANDOS_WEBHOOK = [
+    ("MENU", "MENU"),
+    ("MIS EXAMENES", "MIS EXAMENES"),
+    ("SET GLOBALES", "SET GLOBALES 30 20 10 5"),
+    ("USAR GLOBALES", "USAR GLOBALES SI"),
+    ("AGREGAR EXAMEN", "AGREGAR EXAMEN Bench {i} 2030-01-15 20 10"),
+    ("SET CURSO", "SET CURSO Bench {i} 15 5"),
+    ("CAMBIAR FECHA", "CAMBIAR FECHA Bench {i} 2030-02-01"),
+    ("ELIMINAR EXAMEN", "ELIMINAR EXAMEN Bench {i}"),
+]
+# Mezcla de la prueba de carga: mayoría de lecturas, como el tráfico real del bot
+MEZCLA_CARGA = ["MIS EXAMENES", "MENU", "MIS EXAMENES", "SET GLOBALES {d} 10 5",
+                "MIS EXAMENES", "AGREGAR EXAMEN Carga {i} 2030-01-15 10", "MIS EXAMENES", "ELIMINAR EXAMEN Carga {i}"]
+MEZCLA_ESCRITURAS = ["SET GLOBALES {d} 10 5", "USAR GLOBALES NO", "USAR GLOBALES SI", "SET GLOBALES {d} 20"]
+_UVICORN = [sys.executable, "-m", "uvicorn", "webhook_asgi:app", "--log-level", "warning", "--port"]
+SERVIDORES_CARGA = {  # nombre -> (comando, variables de entorno extra)
+    "flask_dev": ([sys.executable, "-c",
+                   "import sys, whatsapp_webhook as w; w.app.run(port=int(sys.argv[1]), threaded=True)"], {}),
+    "asgi_uvicorn": (_UVICORN, {}),
+    "asgi_diferida": (_UVICORN, {"WEBHOOK_ESCRITURA_DIFERIDA": "1"}),
+}
+COMANDOS_ESCRITURA = [
+    ("SET GLOBALES", "SET GLOBALES {d} 10 5"),
+    ("AGREGAR EXAMEN", "AGREGAR EXAMEN Conc {i} 2030-01-15 20 10"),
+    ("ELIMINAR EXAMEN", "ELIMINAR EXAMEN Conc {i}"),
+]
+
+
+# ---------------- Estadística ----------------
+def percentil(ordenadas, p):
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not ordenadas:
+        return 0.0
+    k = max(0, min(len(ordenadas) - 1, math.ceil(p / 100 * len(ordenadas)) - 1))
+    return ordenadas[k]
+
+
+def resumir(muestras, unidades: int | None = None) -> dict:
+    """muestras: duraciones en segundos. `unidades`: elementos procesados en total (para el throughput)."""
+    ordenadas = sorted(muestras)
+    total = sum(ordenadas)
+    resumen = {
+        "n": len(ordenadas),
+        "p50_ms": round(percentil(ordenadas, 50) * 1000, 3),
+        "p99_ms": round(percentil(ordenadas, 99) * 1000, 3),
+        "media_ms": round(total / len(ordenadas) * 1000, 3) if ordenadas else 0.0,
+        "max_ms": round(ordenadas[-1] * 1000, 3) if ordenadas else 0.0,
+        "throughput_por_s": round((unidades if unidades is not None else len(ordenadas)) / total, 1) if total else 0.0,
+    }
+    return resumen
+
+
+def commit_actual() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return "desconocido"
+
+
+# ---------------- Escenarios ----------------
+class DespachadorSilencioso:
+    """Despachador de simulación que no imprime: mide el scheduler, no la consola."""
+    dry_run = True
+
+    def enviar(self, mensajes):
+        return [{"to": m["to"], "sid": "SIMULADO", "estado": "simulado", "intentos": 0, "error": None}
+                for m in mensajes]
+
+
+def bench_scheduler(hoy: date):
+    """Un tick por cada hora UTC del día: cubre todas las zonas horarias de la población."""
+    import scheduler
+
+    despachador = DespachadorSilencioso()
+    muestras, total = [], 0
+    for hora in range(24):
+        now_utc = datetime(hoy.year, hoy.month, hoy.day, hora, tzinfo=timezone.utc)
+        with contextlib.redirect_stdout(io.StringIO()):
+            t0 = time.perf_counter()
+            resultados = scheduler.procesar_tick(despachador, hoy, now_utc, ignore_hour=False)
+            muestras.append(time.perf_counter() - t0)
+        total += len(resultados)
+    return dict(resumir(muestras, unidades=total), recordatorios=total)
+
+
+def bench_generar_mensajes(hoy: date, repeticiones: int):
+    from models import SessionLocal, Examen
+    from scheduler import generar_mensajes_recordatorio
+
+    session = SessionLocal()
+    examenes = [{"curso": c, "fecha": f} for c, f in session.query(Examen.curso, Examen.fecha)]
+    session.close()
+    muestras, mensajes = [], 0
+    for i in range(repeticiones):
+        t0 = time.perf_counter()
+        mensajes += len(generar_mensajes_recordatorio(examenes, dias_faltantes=5 + i % 26, hoy=hoy))
+        muestras.append(time.perf_counter() - t0)
+    return dict(resumir(muestras, unidades=len(examenes) * repeticiones), examenes=len(examenes), mensajes=mensajes)
+
+
+def bench_webhook(telefonos, repeticiones: int):
+    """Latencia por comando del handler /whatsapp (cliente de pruebas de Flask, sin red)."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        import whatsapp_webhook
+    client = whatsapp_webhook.app.test_client()
+    muestras = {nombre: [] for nombre, _ in COMANDOS_WEBHOOK}
+    for i in range(repeticiones):
+        telefono = telefonos[i % len(telefonos)]
+        for nombre, plantilla in COMANDOS_WEBHOOK:
+            t0 = time.perf_counter()
+            r = client.post("/whatsapp", data={"Body": plantilla.format(i=i), "From": telefono,
+                                               "MessageSid": f"SMbench{i:08d}{nombre.replace(' ', '')}"})
+            muestras[nombre].append(time.perf_counter() - t0)
+            if r.status_code != 200:
+                raise RuntimeError(f"/whatsapp respondió {r.status_code} para {nombre}")
+    resultados = {nombre: resumir(m) for nombre, m in muestras.items()}
+    todas = [x for m in muestras.values() for x in m]
+    resultados["TOTAL"] = resumir(todas)
+    return resultados
+
+
+def bench_etapas(telefonos, repeticiones: int):
+    """parse / ejecutar / render de cada comando por separado, sin Flask ni TwiML."""
+    import comandos
+    from models import SessionLocal, Usuario
+
+    muestras = {}
+    session = SessionLocal()
+    for i in range(repeticiones):
+        usuario = session.query(Usuario).filter_by(telefono=telefonos[i % len(telefonos)]).one()
+        for nombre, plantilla in COMANDOS_WEBHOOK:
+            t0 = time.perf_counter()
+            comando, args = comandos.resolver(plantilla.format(i=f"e{i}"))
+            muestras.setdefault(f"{nombre}/resolver", []).append(time.perf_counter() - t0)
+            tiempos = {}
+            comandos.atender(session, usuario, comando, args, tiempos)
+            for etapa, duracion in tiempos.items():
+                muestras.setdefault(f"{nombre}/{etapa}", []).append(duracion)
+    session.close()
+    return {clave: resumir(m) for clave, m in muestras.items()}
+
+
+def _escanear_en_bucle(parar: threading.Event, duraciones):
+    """Lectura completa de exámenes+usuarios (como el scheduler antiguo) hasta que se pida parar."""
+    from models import SessionLocal, Usuario, Examen
+
+    while not parar.is_set():
+        session = SessionLocal()
+        t0 = time.perf_counter()
+        for _ in session.query(Examen, Usuario).join(Examen.usuario).yield_per(500):
+            pass
+        session.close()
+        duraciones.append(time.perf_counter() - t0)
+
+
+def _escrituras_webhook(client, telefonos, repeticiones, prefijo):
+    muestras, errores = [], 0
+    for i in range(repeticiones):
+        telefono = telefonos[i % len(telefonos)]
+        for _, plantilla in COMANDOS_ESCRITURA:
+            t0 = time.perf_counter()
+            r = client.post("/whatsapp", data={"Body": plantilla.format(i=f"{prefijo}{i}", d=5 + i % 26),
+                                               "From": telefono})
+            muestras.append(time.perf_counter() - t0)
+            if r.status_code != 200 or "❌ Error" in r.get_data(as_text=True):
+                errores += 1
+    return muestras, errores
+
+
+def bench_concurrencia(telefonos, repeticiones: int):
+    """
+    Latencia de las escrituras del webhook con la base en reposo y con un escaneo del scheduler
+    corriendo a la vez en otro hilo. Los errores cuentan respuestas con "database is locked" u otros.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        import whatsapp_webhook
+    client = whatsapp_webhook.app.test_client()
+
+    reposo, errores_reposo = _escrituras_webhook(client, telefonos, repeticiones, "r")
+    parar, escaneos = threading.Event(), []
+    hilo = threading.Thread(target=_escanear_en_bucle, args=(parar, escaneos), daemon=True)
+    hilo.start()
+    try:
+        concurrente, errores = _escrituras_webhook(client, telefonos, repeticiones, "c")
+    finally:
+        parar.set()
+        hilo.join()
+    return {
+        "escritura_en_reposo": dict(resumir(reposo), errores=errores_reposo),
+        "escritura_con_escaneo": dict(resumir(concurrente), errores=errores),
+        "escaneo_scheduler": resumir(escaneos),
+    }
+
+
+def _puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _levantar_servidor(comando, puerto: int, entorno=None, espera: float = 30.0):
+    proc = subprocess.Popen(comando + [str(puerto)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            env={**os.environ, **(entorno or {})})
+    limite = time.monotonic() + espera
+    while time.monotonic() < limite:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{puerto}/", timeout=1).read()
+            return proc
+        except OSError:
+            if proc.poll() is not None:
+                break
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"No arrancó el servidor: {' '.join(comando)}")
+
+
+def _generar_carga(url, telefonos, total: int, concurrencia: int, mezcla=MEZCLA_CARGA):
+    def una(i):
+        cuerpo = urllib.parse.urlencode({
+            "Body": mezcla[i % len(mezcla)].format(i=i // len(mezcla), d=5 + i % 26),
+            "From": telefonos[i % len(telefonos)],
+        }).encode()
+        lectura = mezcla[i % len(mezcla)] in ("MIS EXAMENES", "MENU")
+        t0 = time.perf_counter()
+        try:
+            with urllib.request.urlopen(url, data=cuerpo, timeout=30) as r:
+                ok = r.status == 200 and b"Error procesando" not in r.read()
+        except OSError:
+            ok = False
+        return time.perf_counter() - t0, ok, lectura
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(concurrencia) as pool:
+        resultados = list(pool.map(una, range(total)))
+    pared = time.perf_counter() - inicio
+    resumen = resumir([d for d, _, _ in resultados])
+    resumen["throughput_por_s"] = round(total / pared, 1)  # con concurrencia cuenta el tiempo de pared
+    resumen["errores"] = sum(1 for _, ok, _ in resultados if not ok)
+    for nombre, es_lectura in (("lecturas", True), ("escrituras", False)):
+        muestras = [d for d, _, lec in resultados if lec == es_lectura]
+        if not muestras:
+            continue
+        r = resumir(muestras)
+        resumen[nombre] = {"p50_ms": r["p50_ms"], "p99_ms": r["p99_ms"]}
+    return resumen
+
+
+def bench_carga(telefonos, total: int, concurrencia: int):
+    """
+    Prueba de carga HTTP real contra cada servidor (proceso aparte, misma base): el servidor de
+    desarrollo de Flask, la variante ASGI bajo uvicorn y la misma con escritura diferida. Cada uno
+    con la mezcla habitual y con una de solo escrituras.
+    """
+    resultados = {}
+    for nombre, (comando, entorno) in SERVIDORES_CARGA.items():
+        puerto = _puerto_libre()
+        proc = _levantar_servidor(comando, puerto, entorno)
+        try:
+            url = f"http://127.0.0.1:{puerto}/whatsapp"
+            _generar_carga(url, telefonos, min(total, 200), concurrencia)  # calentamiento
+            resultados[nombre] = {
+                "mixta": _generar_carga(url, telefonos, total, concurrencia),
+                "escrituras": _generar_carga(url, telefonos, total, concurrencia, MEZCLA_ESCRITURAS),
+            }
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+    return resultados
+
+
+# ---------------- Comparación ----------------
+def _aplanar(resultados, prefijo=""):
+    for clave, valor in resultados.items():
+        if isinstance(valor, dict) and "p50_ms" in valor:
+            yield f"{prefijo}{clave}", valor
+        elif isinstance(valor, dict):
+            yield from _aplanar(valor, f"{prefijo}{clave}/")
+
+
+def comparar(anterior: dict, actual: dict):
+    print(f"\n=== Comparación {anterior.get('commit')} -> {actual.get('commit')} ===")
+    previos = dict(_aplanar(anterior["resultados"]))
+    for nombre, r in _aplanar(actual["resultados"]):
+        p = previos.get(nombre)
+        if p is None:
+            print(f"{nombre:40s} (nuevo) p50={r['p50_ms']}ms p99={r['p99_ms']}ms")
+            continue
+        cambios = []
+        for metrica in ("p50_ms", "p99_ms", "throughput_por_s"):
+            delta = (r[metrica] - p[metrica]) / p[metrica] * 100 if p[metrica] else 0.0
+            cambios.append(f"{metrica}={r[metrica]} ({delta:+.1f}%)")
+        print(f"{nombre:40s} " + "  ".join(cambios))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del scheduler y del webhook sobre una población sintética.")
+    parser.add_argument("--usuarios", type=int, default=2000)
+    parser.add_argument("--examenes", type=int, default=10000)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--repeticiones", type=int, default=200, help="Repeticiones por comando del webhook.")
+    parser.add_argument("--escenarios", nargs="+",
+                        default=["scheduler", "mensajes", "webhook", "etapas", "concurrencia"],
+                        choices=["scheduler", "mensajes", "webhook", "etapas", "concurrencia", "carga"])
+    parser.add_argument("--carga-peticiones", type=int, default=2000, help="Peticiones de la prueba de carga.")
+    parser.add_argument("--concurrencia", type=int, default=32, help="Clientes simultáneos en la prueba de carga.")
+    parser.add_argument("--salida", default=None, help="Archivo JSON de resultados.")
+    parser.add_argument("--comparar", default=None, help="JSON de una corrida anterior para comparar.")
+    args = parser.parse_args()
+
+    # La base del benchmark es temporal: se fija antes de importar models/scheduler/webhook
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["DATABASE_URL"] = f"sqlite:///{Path(tmp.name) / 'bench.db'}"
+    os.environ.setdefault("LIMITE_TELEFONO", "0")  # pocos teléfonos muy activos: el limitador falsearía la medida
+
+    from models import SessionLocal, Usuario, init_db
+    from generar_poblacion import generar_poblacion
+
+    hoy = date.today()
+    with contextlib.redirect_stdout(io.StringIO()):
+        init_db()
+    session = SessionLocal()
+    poblacion = generar_poblacion(session, args.usuarios, args.examenes, args.semilla,
+                                  inicio=hoy - timedelta(days=10), verbose=False)
+    telefonos = [t for (t,) in session.query(Usuario.telefono).limit(200)]
+    session.close()
+    print(f"[INFO] Población: {args.usuarios} usuarios, {args.examenes} exámenes ({poblacion['segundos']:.1f}s)")
+
+    resultados = {}
+    if "scheduler" in args.escenarios:
+        resultados["scheduler_tick"] = bench_scheduler(hoy)
+        print(f"[INFO] scheduler_tick: {resultados['scheduler_tick']}")
+    if "mensajes" in args.escenarios:
+        resultados["generar_mensajes_recordatorio"] = bench_generar_mensajes(hoy, repeticiones=50)
+        print(f"[INFO] generar_mensajes_recordatorio: {resultados['generar_mensajes_recordatorio']}")
+    if "webhook" in args.escenarios:
+        resultados["webhook"] = bench_webhook(telefonos, args.repeticiones)
+        for nombre, r in resultados["webhook"].items():
+            print(f"[INFO] webhook {nombre}: {r}")
+    if "etapas" in args.escenarios:
+        resultados["etapas"] = bench_etapas(telefonos, args.repeticiones)
+        for nombre, r in resultados["etapas"].items():
+            print(f"[INFO] etapa {nombre}: {r}")
+    if "concurrencia" in args.escenarios:
+        resultados["concurrencia"] = bench_concurrencia(telefonos, args.repeticiones)
+        for nombre, r in resultados["concurrencia"].items():
+            print(f"[INFO] concurrencia {nombre}: {r}")
+    if "carga" in args.escenarios:
+        resultados["carga"] = bench_carga(telefonos, args.carga_peticiones, args.concurrencia)
+        for nombre, r in resultados["carga"].items():
+            print(f"[INFO] carga {nombre}: {r}")
+
+    informe = {
+        "commit": commit_actual(),
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "parametros": vars(args),
+        "resultados": resultados,
+    }
+    salida = Path(args.salida) if args.salida else SALIDA_DIR / f"bench_{informe['commit']}_{datetime.now():%Y%m%d_%H%M%S}.json"
+    salida.parent.mkdir(parents=True, exist_ok=True)
+    salida.write_text(json.dumps(informe, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"[INFO] Resultados guardados en {salida}")
+
+    if args.comparar:
+        comparar(json.loads(Path(args.comparar).read_text(encoding="utf-8")), informe)
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
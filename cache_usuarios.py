@@ -0,0 +1,149 @@
+# cache_usuarios.py
+# Caché en memoria teléfono -> snapshot del usuario con sus exámenes, para que MENU y MIS EXAMENES
+# no toquen SQLite. Cualquier flush/commit de este proceso que toque un Usuario o Examen invalida
+# la entrada; los cambios de otros procesos (add_user.py, scripts) se ven al vencer el TTL.
+import os
+import time
+import threading
+from collections import OrderedDict, namedtuple
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from models import Usuario, Examen
+
+# ---------------- CONFIG ----------------
+MAX_ENTRADAS = int(os.getenv("USUARIOS_CACHE_MAX", 10000))
+TTL_SEGUNDOS = float(os.getenv("USUARIOS_CACHE_TTL", 60))
+
+ExamenSnapshot = namedtuple("ExamenSnapshot", "id curso fecha avisos_mask")
+UsuarioSnapshot = namedtuple("UsuarioSnapshot", "id telefono usar_globales avisos_globales_mask timezone examenes")
+
+
+def snapshot(usuario: Usuario) -> UsuarioSnapshot:
+    """Copia inmutable (sin sesión) del usuario y sus exámenes."""
+    examenes = tuple(ExamenSnapshot(ex.id, ex.curso, ex.fecha, ex.avisos_mask) for ex in usuario.examenes)
+    return UsuarioSnapshot(usuario.id, usuario.telefono, usuario.usar_globales,
+                           usuario.avisos_globales_mask, usuario.timezone, examenes)
+
+
+class CacheUsuarios:
+    """LRU con TTL. `epoca` cambia con cada invalidación: un snapshot leído antes no se guarda."""
+
+    def __init__(self, max_entradas: int = MAX_ENTRADAS, ttl: float = TTL_SEGUNDOS, reloj=time.monotonic):
+        self.max_entradas, self.ttl, self.reloj = max_entradas, ttl, reloj
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()  # telefono -> (expira, snapshot)
+        self._telefonos = {}            # usuario_id -> telefono
+        self.epoca = 0
+
+    def obtener(self, telefono):
+        with self._lock:
+            entrada = self._entradas.get(telefono)
+            if entrada is None:
+                return None
+            if entrada[0] <= self.reloj():
+                self._quitar(telefono)
+                return None
+            self._entradas.move_to_end(telefono)
+            return entrada[1]
+
+    def guardar(self, snap: UsuarioSnapshot, epoca: int):
+        """Guarda `snap` solo si nada se invalidó desde `epoca` (la leída antes de ir a la base)."""
+        if self.max_entradas <= 0:
+            return snap
+        with self._lock:
+            if epoca != self.epoca:
+                return snap
+            self._entradas[snap.telefono] = (self.reloj() + self.ttl, snap)
+            self._entradas.move_to_end(snap.telefono)
+            self._telefonos[snap.id] = snap.telefono
+            while len(self._entradas) > self.max_entradas:
+                _, (_, s) = self._entradas.popitem(last=False)
+                self._telefonos.pop(s.id, None)
+        return snap
+
+    def reemplazar(self, snap: UsuarioSnapshot):
+        """Guarda `snap` sin mirar la época (escritura diferida: es el estado más nuevo que hay)."""
+        with self._lock:
+            self.epoca += 1  # una lectura de la base en curso no debe pisarlo
+            self._entradas[snap.telefono] = (self.reloj() + self.ttl, snap)
+            self._entradas.move_to_end(snap.telefono)
+            self._telefonos[snap.id] = snap.telefono
+            while len(self._entradas) > self.max_entradas:
+                _, (_, s) = self._entradas.popitem(last=False)
+                self._telefonos.pop(s.id, None)
+        return snap
+
+    def invalidar(self, telefonos=(), usuario_ids=()):
+        with self._lock:
+            self.epoca += 1
+            for usuario_id in usuario_ids:
+                telefono = self._telefonos.get(usuario_id)
+                if telefono is not None:
+                    self._quitar(telefono)
+            for telefono in telefonos:
+                self._quitar(telefono)
+
+    def limpiar(self):
+        with self._lock:
+            self.epoca += 1
+            self._entradas.clear()
+            self._telefonos.clear()
+
+    def _quitar(self, telefono):
+        entrada = self._entradas.pop(telefono, None)
+        if entrada is not None:
+            self._telefonos.pop(entrada[1].id, None)
+
+    def __len__(self):
+        return len(self._entradas)
+
+
+CACHE = CacheUsuarios()
+
+
+# ---------------- Invalidación ----------------
+AL_DIA = "cache_usuarios_al_dia"  # session.info[AL_DIA] = True: la caché ya tiene estos cambios (escritura diferida)
+
+
+def _afectados(session):
+    telefonos, ids = set(), set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Usuario):
+            telefonos.add(obj.telefono)
+            historial = inspect(obj).attrs.telefono.history
+            telefonos.update(t for t in historial.deleted if t)
+            if obj.id is not None:
+                ids.add(obj.id)
+        elif isinstance(obj, Examen):
+            historial = inspect(obj).attrs.usuario_id.history
+            ids.update(i for i in (obj.usuario_id, *historial.deleted) if i is not None)
+            usuario = obj.__dict__.get("usuario")  # sin lazy load dentro del flush
+            if usuario is not None:
+                telefonos.add(usuario.telefono)
+    return telefonos, ids
+
+
+@event.listens_for(Session, "before_flush")
+def _invalidar_en_flush(session, flush_context, instances):
+    if session.info.get(AL_DIA):
+        return
+    telefonos, ids = _afectados(session)
+    if telefonos or ids:
+        # Se invalida al escribir y otra vez al confirmar: una lectura concurrente entre medias
+        # pudo volver a cachear los datos viejos
+        pendientes = session.info.setdefault("cache_usuarios", (set(), set()))
+        pendientes[0].update(telefonos)
+        pendientes[1].update(ids)
+        CACHE.invalidar(telefonos, ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidar_en_commit(session):
+    pendientes = session.info.pop("cache_usuarios", None)
+    if pendientes:
+        CACHE.invalidar(*pendientes)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _descartar_pendientes(session, previous_transaction):
+    session.info.pop("cache_usuarios", None)
@@ -0,0 +1,352 @@
+# comandos.py
+# Comandos del bot de WhatsApp. Cada comando tiene tres etapas separadas:
+#   parse(args)                         -> parámetros (solo texto, sin base de datos)
+#   ejecutar(session, usuario, params)  -> resultado en datos planos (consultas y cambios; el commit
+#                                          lo hace atender(), o el escritor de escritura_diferida.py)
+#   render(resultado)                   -> texto de la respuesta
+# Los comandos que escriben tienen además aplicar(snapshot, params): el mismo cambio sobre el
+# snapshot cacheado del usuario, con las mismas validaciones, sin tocar la base.
+# El mensaje se tokeniza una vez y el comando se busca en un dict por sus palabras clave.
+# Un mensaje de varias líneas (un comando o una fila `curso fecha [avisos]` por línea) se valida
+# entero sobre un snapshot con planificar() y se guarda de una vez con persistir().
+import time
+from models import Examen, parse_fecha
+from cache_usuarios import ExamenSnapshot
+from avisos import MASCARA_DEFAULT, a_mascara, de_mascara, normalizar_avisos
+
+MAX_PALABRAS_CLAVE = 2  # "MENU" / "SET GLOBALES": nunca más de dos palabras
+MAX_LINEAS = 40         # un semestre entero cabe de sobra
+
+
+class ErrorComando(Exception):
+    """Error esperado (formato, curso inexistente...): el mensaje se envía tal cual al usuario."""
+
+
+class Comando:
+    """
+    `lectura`: no escribe; ejecutar() recibe el snapshot cacheado del usuario (sin sesión).
+    Los que escriben devuelven `params` desde ejecutar(), así render() sirve igual tras aplicar().
+    """
+
+    def __init__(self, nombre, claves, parse, ejecutar, render, lectura=False, aplicar=None):
+        self.nombre, self.claves = nombre, claves
+        self.parse, self.ejecutar, self.render = parse, ejecutar, render
+        self.lectura, self.aplicar = lectura, aplicar
+
+
+COMANDOS = {}  # ("SET", "GLOBALES") -> Comando
+
+
+def registrar(nombre, *claves, parse=None, ejecutar=None, render=None, lectura=False, aplicar=None):
+    """Registra un comando bajo una o más frases clave (por defecto, su propio nombre)."""
+    comando = Comando(nombre, claves or (nombre,), parse or (lambda args: args),
+                      ejecutar or (lambda session, usuario, params: params), render, lectura, aplicar)
+    for clave in comando.claves:
+        palabras = tuple(clave.upper().split())
+        assert len(palabras) <= MAX_PALABRAS_CLAVE, clave
+        COMANDOS[palabras] = comando
+    return comando
+
+
+def resolver(incoming: str):
+    """Texto -> (comando, args) con args = tokens después de las palabras clave; (None, tokens) si no hay."""
+    tokens = incoming.split()
+    claves = [t.upper() for t in tokens[:MAX_PALABRAS_CLAVE]]
+    for n in range(len(claves), 0, -1):
+        comando = COMANDOS.get(tuple(claves[:n]))
+        if comando is not None:
+            return comando, tokens[n:]
+    return None, tokens
+
+
+def resolver_lineas(texto: str):
+    """
+    Mensaje de varias líneas -> [(comando, args)] por línea no vacía. Una línea sin palabra clave
+    pero con fecha (`Cálculo II 2030-05-10 20 10`) es un AGREGAR EXAMEN.
+    """
+    pasos = []
+    for linea in texto.splitlines():
+        comando, args = resolver(linea)
+        if comando is None and any(_es_fecha(t) for t in args):
+            comando = COMANDOS[("AGREGAR", "EXAMEN")]
+        if comando is not None or args:
+            pasos.append((comando, args))
+    return pasos
+
+
+def atender(session, usuario, comando: Comando, args, tiempos=None):
+    """
+    Corre las tres etapas y devuelve el texto de respuesta. `tiempos`, si se pasa, recibe
+    {"parse": s, "ejecutar": s, "render": s} de las etapas que llegaron a correr.
+    """
+    tiempos = tiempos if tiempos is not None else {}
+    try:
+        t0 = time.perf_counter()
+        params = comando.parse(args)
+        t1 = time.perf_counter()
+        tiempos["parse"] = t1 - t0
+        resultado = comando.ejecutar(session, usuario, params)
+        if not comando.lectura:
+            session.commit()
+        t2 = time.perf_counter()
+        tiempos["ejecutar"] = t2 - t1
+        texto = comando.render(resultado)
+        tiempos["render"] = time.perf_counter() - t2
+        return texto
+    except ErrorComando as e:
+        if session is not None:
+            session.rollback()
+        return str(e)
+    except Exception as e:
+        if session is not None:
+            session.rollback()
+        return f"❌ Error procesando {comando.nombre}: {e}"
+
+
+# ---------------- Utils ----------------
+def _buscar_examen(session, usuario, curso):
+    ex = session.query(Examen).filter_by(usuario_id=usuario.id, curso=curso).first()
+    if ex is None:
+        raise ErrorComando(f"❌ No encontré el curso '{curso}'.")
+    return ex
+
+
+def _examen_snapshot(usuario, curso):
+    for i, ex in enumerate(usuario.examenes):
+        if ex.curso == curso:
+            return i, ex
+    raise ErrorComando(f"❌ No encontré el curso '{curso}'.")
+
+
+def _con_examen(usuario, i, examen):
+    """Snapshot con el examen `i` reemplazado (None lo quita)."""
+    examenes = usuario.examenes[:i] + ((examen,) if examen is not None else ()) + usuario.examenes[i + 1:]
+    return usuario._replace(examenes=examenes)
+
+
+def _es_fecha(token):
+    return len(token) == 10 and token.count("-") == 2
+
+
+def _fecha(texto):
+    try:
+        return parse_fecha(texto)
+    except ValueError as e:
+        raise ErrorComando(f"❌ {e}")
+
+
+def formatear_examenes(examenes, usar_globales: bool, globales_mask: int | None):
+    """examenes: [(curso, fecha, avisos_mask), ...]"""
+    if not examenes:
+        return "No tienes exámenes registrados."
+    lines = []
+    for curso, fecha, avisos_mask in examenes:
+        avisos = de_mascara(avisos_mask)
+        if (not avisos) and usar_globales:
+            avisos_str = f"(usa globales: {de_mascara(globales_mask)})"
+        else:
+            avisos_str = str(avisos if avisos else de_mascara(MASCARA_DEFAULT))
+        lines.append(f"- {curso}: {fecha} | avisos: {avisos_str}")
+    return "\n".join(lines)
+
+
+def help_text():
+    return (
+        "📚 *Menú de configuración*\n\n"
+        "• *MENU* → ver este menú\n"
+        "• *MIS EXAMENES* → lista tus exámenes\n"
+        "• *SET GLOBALES 30 20 10 5* → define avisos globales (5–30 días, máx 4)\n"
+        "• *USAR GLOBALES SI* o *USAR GLOBALES NO*\n"
+        "• *SET CURSO <curso> 20 10 5* → avisos solo para ese curso\n"
+        "• *AGREGAR EXAMEN <curso> <YYYY-MM-DD> [avisos...]*\n"
+        "• *CAMBIAR FECHA <curso> <YYYY-MM-DD>*\n"
+        "• *ELIMINAR EXAMEN <curso>*\n\n"
+        "Puedes mandar varias líneas en un mensaje; una línea *<curso> <YYYY-MM-DD> [avisos...]* "
+        "agrega ese examen.\n"
+    )
+
+
+# ---------------- MENU ----------------
+registrar("MENU", "MENU", "AYUDA", "HELP", render=lambda _: help_text(), lectura=True)
+
+
+# ---------------- MIS EXAMENES ----------------
+def _ejecutar_mis_examenes(session, usuario, params):
+    # `usuario` es el snapshot de cache_usuarios (o un Usuario ORM): mismos atributos
+    examenes = [(ex.curso, ex.fecha, ex.avisos_mask) for ex in usuario.examenes]
+    return examenes, usuario.usar_globales, usuario.avisos_globales_mask
+
+registrar("MIS EXAMENES", ejecutar=_ejecutar_mis_examenes,
+          render=lambda r: f"🗓 *Tus exámenes:*\n{formatear_examenes(*r)}", lectura=True)
+
+
+# ---------------- SET GLOBALES d1 d2 d3 d4 ----------------
+def _ejecutar_set_globales(session, usuario, avisos):
+    usuario.avisos_globales_mask = a_mascara(avisos)
+    usuario.usar_globales = True
+    return avisos
+
+def _aplicar_set_globales(usuario, avisos):
+    return usuario._replace(avisos_globales_mask=a_mascara(avisos), usar_globales=True)
+
+registrar("SET GLOBALES", parse=normalizar_avisos, ejecutar=_ejecutar_set_globales, aplicar=_aplicar_set_globales,
+          render=lambda avisos: f"✅ Avisos globales guardados: {avisos}\nSe aplicarán a todos tus cursos.")
+
+
+# ---------------- USAR GLOBALES SI/NO ----------------
+def _parse_usar_globales(args):
+    palabra = args[-1].upper() if args else ""
+    if palabra in ("SI", "SÍ", "YES"):
+        return True
+    if palabra in ("NO", "N"):
+        return False
+    raise ErrorComando("Escribe: *USAR GLOBALES SI* o *USAR GLOBALES NO*.")
+
+def _ejecutar_usar_globales(session, usuario, activar):
+    usuario.usar_globales = activar
+    return activar
+
+registrar("USAR GLOBALES", parse=_parse_usar_globales, ejecutar=_ejecutar_usar_globales,
+          aplicar=lambda usuario, activar: usuario._replace(usar_globales=activar),
+          render=lambda activar: "✅ Activado: se usarán tus avisos globales." if activar
+          else "✅ Desactivado: cada curso tendrá sus propios avisos.")
+
+
+# ---------------- SET CURSO <curso> d1 d2 d3 d4 ----------------
+def _parse_set_curso(args):
+    curso = " ".join(t for t in args if not t.isdigit())
+    return curso, normalizar_avisos([t for t in args if t.isdigit()])
+
+def _ejecutar_set_curso(session, usuario, params):
+    curso, avisos = params
+    ex = _buscar_examen(session, usuario, curso)
+    ex.avisos_mask = a_mascara(avisos)
+    usuario.usar_globales = False
+    return params
+
+def _aplicar_set_curso(usuario, params):
+    curso, avisos = params
+    i, ex = _examen_snapshot(usuario, curso)
+    return _con_examen(usuario, i, ex._replace(avisos_mask=a_mascara(avisos)))._replace(usar_globales=False)
+
+registrar("SET CURSO", parse=_parse_set_curso, ejecutar=_ejecutar_set_curso, aplicar=_aplicar_set_curso,
+          render=lambda r: f"✅ Avisos del curso *{r[0]}* actualizados a: {r[1]}")
+
+
+# ---------------- AGREGAR EXAMEN <curso> <fecha> [avisos...] ----------------
+def _parse_agregar_examen(args):
+    if len(args) < 2:
+        raise ErrorComando("Formato: AGREGAR EXAMEN <curso> <YYYY-MM-DD> [avisos...]")
+    fecha_idx = next((i for i, t in enumerate(args) if _es_fecha(t)), None)
+    if fecha_idx is None:
+        raise ErrorComando("Falta la fecha. Usa formato: YYYY-MM-DD")
+    dias_tokens = args[fecha_idx + 1:]
+    avisos = normalizar_avisos(dias_tokens) if dias_tokens else []
+    return " ".join(args[:fecha_idx]), _fecha(args[fecha_idx]), avisos
+
+def _ejecutar_agregar_examen(session, usuario, params):
+    curso, fecha, avisos = params
+    if session.query(Examen.id).filter_by(usuario_id=usuario.id, curso=curso).first():
+        raise ErrorComando(f"❌ Ya existe un examen para el curso '{curso}'. Usa CAMBIAR FECHA o SET CURSO.")
+    usuario.examenes.append(Examen(curso=curso, fecha=fecha, avisos_mask=a_mascara(avisos)))
+    return params
+
+def _aplicar_agregar_examen(usuario, params):
+    curso, fecha, avisos = params
+    if any(ex.curso == curso for ex in usuario.examenes):
+        raise ErrorComando(f"❌ Ya existe un examen para el curso '{curso}'. Usa CAMBIAR FECHA o SET CURSO.")
+    examen = ExamenSnapshot(None, curso, fecha, a_mascara(avisos))  # el id lo asigna el escritor
+    return usuario._replace(examenes=usuario.examenes + (examen,))
+
+registrar("AGREGAR EXAMEN", parse=_parse_agregar_examen, ejecutar=_ejecutar_agregar_examen,
+          aplicar=_aplicar_agregar_examen,
+          render=lambda r: f"✅ Examen agregado: *{r[0]}* el {r[1]} "
+                           f"(avisos: {r[2] if r[2] else '(usará globales/default)'})")
+
+
+# ---------------- CAMBIAR FECHA <curso> <YYYY-MM-DD> ----------------
+def _parse_cambiar_fecha(args):
+    if len(args) < 2:
+        raise ErrorComando("Formato: CAMBIAR FECHA <curso> <YYYY-MM-DD>")
+    return " ".join(args[:-1]), _fecha(args[-1])
+
+def _ejecutar_cambiar_fecha(session, usuario, params):
+    curso, fecha = params
+    _buscar_examen(session, usuario, curso).fecha = fecha
+    return params
+
+def _aplicar_cambiar_fecha(usuario, params):
+    curso, fecha = params
+    i, ex = _examen_snapshot(usuario, curso)
+    return _con_examen(usuario, i, ex._replace(fecha=fecha))
+
+registrar("CAMBIAR FECHA", parse=_parse_cambiar_fecha, ejecutar=_ejecutar_cambiar_fecha,
+          aplicar=_aplicar_cambiar_fecha,
+          render=lambda r: f"✅ Fecha actualizada para *{r[0]}*: {r[1]}")
+
+
+# ---------------- ELIMINAR EXAMEN <curso> ----------------
+def _ejecutar_eliminar_examen(session, usuario, curso):
+    session.delete(_buscar_examen(session, usuario, curso))
+    return curso
+
+registrar("ELIMINAR EXAMEN", parse=" ".join, ejecutar=_ejecutar_eliminar_examen,
+          aplicar=lambda usuario, curso: _con_examen(usuario, _examen_snapshot(usuario, curso)[0], None),
+          render=lambda curso: f"✅ Examen eliminado: *{curso}*")
+
+
+# ---------------- Varias líneas ----------------
+def planificar(usuario, pasos):
+    """
+    Corre las líneas en orden sobre el snapshot `usuario`, sin base: las lecturas ven los cambios de
+    las líneas anteriores y los duplicados se buscan en los exámenes ya cargados. Una línea con
+    error se informa y se salta; las demás siguen.
+    Devuelve (texto consolidado, snapshot final, [(comando, params)] de las escrituras válidas).
+    """
+    if len(pasos) > MAX_LINEAS:
+        return f"❌ Máximo {MAX_LINEAS} líneas por mensaje.", usuario, []
+    respuestas, aplicados = [], []
+    for n, (comando, args) in enumerate(pasos, 1):
+        if comando is None:
+            respuestas.append(f"{n}. ❓ No entendí: {' '.join(args)}")
+            continue
+        try:
+            params = comando.parse(args)
+            if comando.lectura:
+                texto = comando.render(comando.ejecutar(None, usuario, params))
+            else:
+                usuario = comando.aplicar(usuario, params)
+                aplicados.append((comando, params))
+                texto = comando.render(params)
+        except ErrorComando as e:
+            texto = str(e)
+        except Exception as e:
+            texto = f"❌ Error procesando {comando.nombre}: {e}"
+        respuestas.append(f"{n}. {texto}")
+    escrituras = sum(1 for comando, _ in pasos if comando is not None and not comando.lectura)
+    encabezado = f"📋 *{len(aplicados)} de {escrituras} cambios guardados*" if escrituras else "📋 *Respuestas*"
+    return "\n".join([encabezado, *respuestas]), usuario, aplicados
+
+
+def persistir(session, usuario, snap):
+    """
+    Lleva al Usuario ORM (con sus exámenes ya cargados) el estado de `snap`, que debe venir de
+    planificar() sobre ese mismo usuario: un solo flush para todo el mensaje. No hace commit.
+    """
+    if usuario.usar_globales != snap.usar_globales:
+        usuario.usar_globales = snap.usar_globales
+    if usuario.avisos_globales_mask != snap.avisos_globales_mask:
+        usuario.avisos_globales_mask = snap.avisos_globales_mask
+    nuevos = {ex.curso: ex for ex in snap.examenes}
+    for ex in [ex for ex in usuario.examenes if ex.curso not in nuevos]:
+        usuario.examenes.remove(ex)  # delete-orphan
+    actuales = {ex.curso: ex for ex in usuario.examenes}
+    for curso, nuevo in nuevos.items():
+        ex = actuales.get(curso)
+        if ex is None:
+            usuario.examenes.append(Examen(curso=curso, fecha=nuevo.fecha, avisos_mask=nuevo.avisos_mask))
+            continue
+        if ex.fecha != nuevo.fecha:
+            ex.fecha = nuevo.fecha
+        if ex.avisos_mask != nuevo.avisos_mask:
+            ex.avisos_mask = nuevo.avisos_mask
@@ -0,0 +1,147 @@
+# despachador.py
+import os
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from twilio.rest import Client
+from twilio.base.exceptions import TwilioRestException
+
+# ---------------- CONFIG ----------------
+TWILIO_FROM_DEFAULT = "whatsapp:+14155238886"
+MPS_DEFAULT = 10          # mensajes por segundo (cuota del proveedor)
+WORKERS_DEFAULT = 8       # envíos simultáneos
+REINTENTOS_DEFAULT = 4    # intentos por mensaje (incluye el primero)
+BACKOFF_BASE = 0.5        # segundos; se duplica en cada reintento
+BACKOFF_MAX = 30.0
+
+
+class TokenBucket:
+    """Limitador de tasa: `tasa` fichas por segundo, con ráfagas de hasta `capacidad`."""
+
+    def __init__(self, tasa: float, capacidad: float | None = None):
+        if tasa <= 0:
+            raise ValueError("La tasa del token bucket debe ser > 0")
+        self.tasa = float(tasa)
+        self.capacidad = float(capacidad if capacidad is not None else max(1.0, tasa))
+        self._fichas = self.capacidad
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _rellenar(self, ahora):
+        self._fichas = min(self.capacidad, self._fichas + (ahora - self._ultimo) * self.tasa)
+        self._ultimo = ahora
+
+    def intentar(self) -> bool:
+        """Toma una ficha si hay disponible; no bloquea."""
+        with self._lock:
+            self._rellenar(time.monotonic())
+            if self._fichas >= 1:
+                self._fichas -= 1
+                return True
+            return False
+
+    def tomar(self):
+        """Toma una ficha, esperando lo necesario (la espera ocurre fuera del lock)."""
+        while True:
+            with self._lock:
+                self._rellenar(time.monotonic())
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return
+                espera = (1 - self._fichas) / self.tasa
+            time.sleep(espera)
+
+
+def es_reintentable(error: Exception) -> bool:
+    """429 y 5xx de Twilio, o fallos de red, merecen otro intento; el resto de 4xx no."""
+    if isinstance(error, TwilioRestException):
+        return error.status == 429 or error.status >= 500
+    return isinstance(error, OSError)  # incluye las excepciones de red de requests
+
+
+def crear_cliente(account_sid: str, auth_token: str, base_url: str | None = None):
+    """
+    Cliente Twilio reutilizable (mantiene su sesión HTTP).
+    `base_url` (o TWILIO_API_BASE_URL) permite apuntar a un servidor Twilio falso local.
+    """
+    client = Client(account_sid, auth_token)
+    base_url = base_url or os.getenv("TWILIO_API_BASE_URL")
+    if base_url:
+        client.api.base_url = base_url
+    return client
+
+
+class Despachador:
+    """
+    Envía lotes de mensajes con un pool acotado de hilos, respetando un token bucket
+    de mensajes por segundo y reintentando con backoff exponencial ante 429/5xx.
+    """
+
+    def __init__(self, client, dry_run: bool = False, mps: float = MPS_DEFAULT,
+                 workers: int = WORKERS_DEFAULT, reintentos: int = REINTENTOS_DEFAULT,
+                 from_: str | None = None, backoff_base: float = BACKOFF_BASE):
+        self.client = client
+        self.dry_run = dry_run
+        self.bucket = TokenBucket(mps)
+        self.workers = max(1, workers)
+        self.reintentos = max(1, reintentos)
+        self.from_ = from_ or os.getenv("TWILIO_WHATSAPP_NUMBER", TWILIO_FROM_DEFAULT)
+        self.backoff_base = backoff_base
+
+    def _enviar_uno(self, mensaje: dict) -> dict:
+        to, body = mensaje["to"], mensaje["body"]
+        resultado = dict(mensaje)  # se conservan las claves extra (ids de examen, outbox...)
+        resultado.update(sid=None, estado="fallido", intentos=0, error=None)
+
+        if self.dry_run:
+            print(f"[SIMULADO] -> {to}: {body}")
+            resultado.update(sid="SIMULADO", estado="simulado")
+            return resultado
+
+        for intento in range(1, self.reintentos + 1):
+            resultado["intentos"] = intento
+            self.bucket.tomar()
+            try:
+                msg = self.client.messages.create(from_=self.from_, body=body, to=to)
+            except Exception as e:
+                resultado["error"] = str(e)
+                if intento == self.reintentos or not es_reintentable(e):
+                    print(f"[ERROR] Enviando a {to}: {e}")
+                    return resultado
+                espera = min(BACKOFF_MAX, self.backoff_base * 2 ** (intento - 1))
+                time.sleep(espera * random.uniform(0.5, 1.0))
+                continue
+            print(f"[OK] Enviado a {to} (SID: {msg.sid})")
+            resultado.update(sid=msg.sid, estado="enviado", error=None)
+            return resultado
+        return resultado
+
+    def enviar(self, mensajes):
+        """
+        `mensajes`: iterable de dicts con "to" y "body" (se conservan las demás claves).
+        Devuelve un resultado por mensaje, en el mismo orden.
+        """
+        mensajes = list(mensajes)
+        if not mensajes:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(mensajes))) as pool:
+            return list(pool.map(self._enviar_uno, mensajes))
+
+    def enviar_iter(self, mensajes):
+        """Como `enviar`, pero entrega cada resultado apenas termina (sin orden garantizado)."""
+        mensajes = list(mensajes)
+        if not mensajes:
+            return
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(mensajes))) as pool:
+            futuros = [pool.submit(self._enviar_uno, m) for m in mensajes]
+            for futuro in as_completed(futuros):
+                yield futuro.result()
+
+
+def resumen(resultados) -> dict:
+    """Conteo por estado de una lista de resultados de Despachador.enviar."""
+    conteo = {}
+    for r in resultados:
+        conteo[r["estado"]] = conteo.get(r["estado"], 0) + 1
+    return conteo
@@ -0,0 +1,213 @@
+# diario_datos.py
+# data.json con diario de cambios: en vez de reescribir todo el archivo por cada edición,
+# gestor_avisos.py añade una línea al diario con el estudiante que cambió.
+#   data.json                      -> foto (snapshot) de la lista de estudiantes
+#   data.json.diario               -> una línea JSON por cambio: {"nombre": ..., "estudiante": {...} | null}
+#   data.json.diario.compactando   -> el diario que se está pasando a la foto (o que quedó de un corte)
+# Leer = foto + diarios en orden. Cada línea trae al estudiante completo, así que aplicarla dos veces
+# da lo mismo (un corte a mitad de una compactación no pierde ni duplica nada).
+# Compactar = renombrar el diario, escribir la foto nueva en un temporal y os.replace(): data.json
+# siempre está entero, con la versión vieja o con la nueva.
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+# ---------------- CONFIG ----------------
+DATA_PATH = Path("data.json")
+COMPACTAR_MIN_BYTES = int(os.getenv("DIARIO_COMPACTAR_BYTES", 64 * 1024))
+COMPACTAR_FRACCION = 0.25  # se compacta cuando el diario pasa de esta fracción de la foto
+REINTENTOS_LECTURA = 5
+COMPACTANDO_VENCE = 60  # s sin tocar para dar por abandonado un .compactando de otro proceso
+
+
+class DiarioDatos:
+    def __init__(self, path=DATA_PATH, compactar_min_bytes=COMPACTAR_MIN_BYTES):
+        self.path = Path(path)
+        self.diario = self.path.with_name(self.path.name + ".diario")
+        self.compactando = self.path.with_name(self.path.name + ".diario.compactando")
+        self.compactar_min_bytes = compactar_min_bytes
+
+    # ---------------- LECTURA ----------------
+    def firma(self):
+        """(mtime_ns, tamaño) de los tres archivos: si no cambia, lo cargado sigue valiendo."""
+        firma = []
+        for ruta in (self.path, self.compactando, self.diario):
+            try:
+                st = ruta.stat()
+                firma.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                firma.append(None)
+        return tuple(firma)
+
+    def cargar(self, default=None):
+        """Lista de estudiantes: la foto con los diarios aplicados. Sin data.json ni diario -> default."""
+        for _ in range(REINTENTOS_LECTURA):
+            antes = self.firma()
+            datos = self._leer()
+            if self.firma() == antes:  # nadie compactó ni escribió mientras se leía
+                break
+        if datos is None:
+            if default is not None:
+                return default
+            raise FileNotFoundError(f"No existe {self.path.resolve()}")
+        return datos
+
+    def _leer(self):
+        datos = None
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                datos = json.load(f)
+        cambios = self.cambios()
+        if cambios:
+            datos = aplicar(datos or [], cambios)
+        return datos
+
+    def cambios(self):
+        """Cambios del diario todavía no pasados a la foto, en orden."""
+        return self._cambios(self.compactando) + self._cambios(self.diario)
+
+    def descartar_cambios(self):
+        """Borra los diarios (cuando data.json se reescribió entero desde otra fuente)."""
+        self.compactando.unlink(missing_ok=True)
+        self.diario.unlink(missing_ok=True)
+
+    def _cambios(self, ruta):
+        try:
+            with open(ruta, "rb") as f:
+                return self._parsear(f.read(), ruta)
+        except FileNotFoundError:
+            return []
+
+    @staticmethod
+    def _parsear(contenido, ruta):
+        cambios = []
+        for n, linea in enumerate(contenido.splitlines(), 1):
+            try:
+                cambios.append(json.loads(linea))
+            except ValueError:
+                # Una escritura cortada deja una línea a medias; lo que vino después sigue valiendo.
+                print(f"[WARN] Línea {n} incompleta en {ruta}, se ignora")
+        return cambios
+
+    # ---------------- ESCRITURA ----------------
+    def registrar(self, estudiante, nombre=None):
+        """Añade al diario el estado completo de un estudiante (None lo elimina)."""
+        self.registrar_varios([(nombre or estudiante["nombre"], estudiante)])
+
+    def registrar_varios(self, cambios):
+        """[(nombre, estudiante | None), ...] en una sola escritura al final del diario."""
+        bloque = "".join(
+            json.dumps({"nombre": nombre, "estudiante": estudiante}, ensure_ascii=False) + "\n"
+            for nombre, estudiante in cambios
+        ).encode("utf-8")
+        if bloque:
+            self._anadir(bloque)
+
+    def _anadir(self, bloque):
+        # Un solo write() con O_APPEND: dos procesos que registran a la vez no mezclan sus líneas.
+        fd = os.open(self.diario, os.O_WRONLY | os.O_CREAT | os.O_APPEND | getattr(os, "O_BINARY", 0), 0o644)
+        try:
+            os.write(fd, bloque)
+        finally:
+            os.close(fd)
+
+    def necesita_compactar(self):
+        try:
+            tamano_diario = self.diario.stat().st_size
+        except FileNotFoundError:
+            return False
+        try:
+            tamano_foto = self.path.stat().st_size
+        except FileNotFoundError:
+            tamano_foto = 0
+        return tamano_diario >= max(self.compactar_min_bytes, tamano_foto * COMPACTAR_FRACCION)
+
+    # ---------------- COMPACTACIÓN ----------------
+    def compactar(self):
+        """Pasa los diarios a data.json. Devuelve cuántos cambios se aplicaron (0 si otro ya compacta)."""
+        if not self.compactando.exists():
+            try:
+                os.replace(self.diario, self.compactando)
+            except FileNotFoundError:
+                return 0
+            # El rename conserva el mtime de la última escritura al diario: sin tocarlo, otro proceso
+            # vería este .compactando como abandonado y lo compactaría a la vez.
+            os.utime(self.compactando)
+        elif time.time() - self.compactando.stat().st_mtime < COMPACTANDO_VENCE:
+            return 0  # otro proceso está compactando
+        # (si no, quedó de un corte anterior y se termina ahora; el diario nuevo espera a la próxima)
+        with open(self.compactando, "rb") as f:
+            leido = f.read()
+        datos = None
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                datos = json.load(f)
+        cambios = self._parsear(leido, self.compactando)
+        self._escribir_foto(aplicar(datos or [], cambios))
+
+        # Un registrar() que abrió el diario justo antes del rename escribió en .compactando:
+        # lo que llegó después de leerlo se pasa al diario nuevo antes de borrarlo.
+        with open(self.compactando, "rb") as f:
+            tarde = f.read()[len(leido):]
+        if tarde:
+            self._anadir(tarde)
+        self.compactando.unlink(missing_ok=True)
+        return len(cambios)
+
+    def compactar_si_hace_falta(self):
+        """Compacta si el diario ya es grande. Devuelve cuántos cambios pasó a la foto."""
+        if not self.necesita_compactar():
+            return 0
+        try:
+            n = self.compactar()
+        except Exception as e:
+            print(f"[ERROR] No se pudo compactar {self.diario}: {e}")
+            return 0
+        if n:
+            print(f"[INFO] {n} cambios del diario pasados a {self.path}")
+        return n
+
+    def _escribir_foto(self, datos):
+        tmp = self.path.with_name(f"{self.path.name}.tmp-{os.getpid()}-{threading.get_ident()}")
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                # Un estudiante por línea: se lee igual de bien a ojo y es mucho más corto que indent=2.
+                f.write("[\n" + ",\n".join(json.dumps(st, ensure_ascii=False) for st in datos) + "\n]\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+
+def aplicar(datos, cambios):
+    """Aplica cambios {"nombre", "estudiante"} sobre la lista de estudiantes (la modifica y la devuelve)."""
+    indice = {}
+    for i, st in enumerate(datos):
+        indice.setdefault(st.get("nombre"), i)  # como find_student: manda el primero con ese nombre
+    borrados = False
+    for cambio in cambios:
+        nombre, estudiante = cambio["nombre"], cambio["estudiante"]
+        i = indice.get(nombre)
+        if estudiante is None:
+            if i is not None:
+                datos[i] = None
+                del indice[nombre]
+                borrados = True
+        elif i is None:
+            indice[estudiante.get("nombre")] = len(datos)
+            datos.append(estudiante)
+        else:
+            datos[i] = estudiante
+            if estudiante.get("nombre") != nombre:
+                del indice[nombre]
+                indice[estudiante.get("nombre")] = i
+    if borrados:
+        datos[:] = [st for st in datos if st is not None]
+    return datos
+
+
+def cargar(path=DATA_PATH, default=None):
+    return DiarioDatos(path).cargar(default)
@@ -0,0 +1,155 @@
+# duplicados.py
+# Si el webhook tarda, Twilio reintenta el mismo POST (mismo MessageSid). Aquí se guarda la
+# respuesta de cada MessageSid para devolverla tal cual en el reintento, sin volver a ejecutar el
+# comando. Un reintento que llega mientras el primer intento sigue en curso espera su respuesta.
+#   - En memoria: LRU acotado (DEDUPE_MAX) con TTL (DEDUPE_TTL), por proceso.
+#   - WEBHOOK_DEDUPE_SQLITE=1: además la tabla respuestas_webhook, para que varios workers
+#     compartan los MessageSid (el primero que inserta la fila atiende; los demás esperan).
+# Si el intento falla se suelta el MessageSid: el siguiente reintento se atiende de nuevo.
+import os
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.sqlite import insert
+from models import SessionLocal, RespuestaWebhook
+
+# ---------------- CONFIG ----------------
+MAX_ENTRADAS = int(os.getenv("DEDUPE_MAX", 10000))
+TTL_SEGUNDOS = float(os.getenv("DEDUPE_TTL", 3600))   # Twilio reintenta durante pocos minutos
+ESPERA = float(os.getenv("DEDUPE_ESPERA", 15))        # s que un reintento espera al intento en curso
+VENCIMIENTO = float(os.getenv("DEDUPE_VENCIMIENTO", 120))  # s tras los que una fila sin respuesta es de
+                                                           # un worker que murió y otro puede tomarla
+USAR_SQLITE = os.getenv("WEBHOOK_DEDUPE_SQLITE", "0") == "1"
+SONDEO = 0.05           # s entre lecturas de la tabla mientras otro worker atiende el mensaje
+PODA_CADA = 500         # respuestas guardadas entre cada borrado de filas vencidas
+
+EN_CURSO = object()     # reclamar(..., bloquear=False): otro intento lo está atendiendo
+SIN_RESPUESTA = '<?xml version="1.0" encoding="UTF-8"?><Response />'  # TwiML vacío: no se envía nada
+
+
+def _ahora() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class Deduplicador:
+    """
+    reclamar(sid) antes de atender: None si le toca a este intento (que luego llama guardar() o
+    soltar()); si no, la respuesta ya dada. `sesiones`: SessionLocal para compartir por SQLite.
+    """
+
+    def __init__(self, max_entradas: int = MAX_ENTRADAS, ttl: float = TTL_SEGUNDOS, espera: float = ESPERA,
+                 sesiones=None, vencimiento: float = VENCIMIENTO, reloj=time.monotonic):
+        self.max_entradas, self.ttl, self.espera, self.vencimiento = max_entradas, ttl, espera, vencimiento
+        self.sesiones, self.reloj = sesiones, reloj
+        self._cond = threading.Condition()
+        self._respuestas = OrderedDict()  # sid -> (expira, respuesta)
+        self._en_curso = set()
+        self._guardadas = 0
+
+    def reclamar(self, sid, bloquear: bool = True):
+        """
+        Con bloquear=False no espera al intento en curso: devuelve EN_CURSO (el webhook ASGI lo
+        usa para no frenar el loop). Si la espera vence, devuelve SIN_RESPUESTA.
+        """
+        limite = self.reloj() + self.espera
+        with self._cond:
+            while True:
+                respuesta = self._respuesta(sid)
+                if respuesta is not None:
+                    return respuesta
+                if sid not in self._en_curso:
+                    self._en_curso.add(sid)
+                    break
+                if not bloquear:
+                    return EN_CURSO
+                restante = limite - self.reloj()
+                if restante <= 0:
+                    return SIN_RESPUESTA
+                self._cond.wait(restante)
+        if self.sesiones is None:
+            return None
+        try:
+            return self._reclamar_en_base(sid, limite)
+        except Exception:
+            self.soltar(sid, en_base=False)
+            raise
+
+    def guardar(self, sid, respuesta: str):
+        podar = self._guardar_local(sid, respuesta)
+        if self.sesiones is not None:
+            with self.sesiones() as session:
+                session.execute(update(RespuestaWebhook).where(RespuestaWebhook.message_sid == sid)
+                                .values(respuesta=respuesta))
+                if podar:
+                    session.execute(delete(RespuestaWebhook).where(
+                        RespuestaWebhook.creado < _ahora() - timedelta(seconds=self.ttl)))
+                session.commit()
+
+    def soltar(self, sid, en_base: bool = True):
+        """El intento falló: el próximo reintento vuelve a atender el mensaje."""
+        with self._cond:
+            self._en_curso.discard(sid)
+            self._cond.notify_all()
+        if en_base and self.sesiones is not None:
+            with self.sesiones() as session:
+                session.execute(delete(RespuestaWebhook).where(
+                    RespuestaWebhook.message_sid == sid, RespuestaWebhook.respuesta.is_(None)))
+                session.commit()
+
+    def _respuesta(self, sid):
+        entrada = self._respuestas.get(sid)
+        if entrada is None:
+            return None
+        if entrada[0] <= self.reloj():
+            del self._respuestas[sid]
+            return None
+        self._respuestas.move_to_end(sid)
+        return entrada[1]
+
+    def _reclamar_en_base(self, sid, limite):
+        """
+        INSERT de la fila como marca "en curso". Si ya existía, otro worker lo atiende (o ya lo
+        atendió): se sondea su respuesta. Una marca sin respuesta más vieja que `vencimiento` es
+        de un worker que murió y se toma.
+        """
+        tabla = RespuestaWebhook.__table__.c
+        while True:
+            ahora = _ahora()
+            stmt = insert(RespuestaWebhook.__table__).values(message_sid=sid, creado=ahora)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["message_sid"], set_={"creado": stmt.excluded.creado},
+                where=tabla.respuesta.is_(None) & (tabla.creado < ahora - timedelta(seconds=self.vencimiento)))
+            with self.sesiones() as session:
+                tomado = session.execute(stmt).rowcount == 1
+                session.commit()
+                if tomado:
+                    return None
+                respuesta = session.execute(
+                    select(RespuestaWebhook.respuesta).where(RespuestaWebhook.message_sid == sid)).scalar()
+            if respuesta is not None:
+                self._guardar_local(sid, respuesta)
+                return respuesta
+            if self.reloj() >= limite:
+                self.soltar(sid, en_base=False)
+                return SIN_RESPUESTA
+            time.sleep(SONDEO)
+
+    def _guardar_local(self, sid, respuesta: str) -> bool:
+        """Devuelve True cada PODA_CADA respuestas: toca borrar las filas vencidas de la tabla."""
+        with self._cond:
+            self._en_curso.discard(sid)
+            self._respuestas[sid] = (self.reloj() + self.ttl, respuesta)
+            self._respuestas.move_to_end(sid)
+            while len(self._respuestas) > self.max_entradas:
+                self._respuestas.popitem(last=False)
+            self._guardadas += 1
+            self._cond.notify_all()
+            return self._guardadas % PODA_CADA == 0
+
+    def __len__(self):
+        return len(self._respuestas)
+
+
+DEDUPE = Deduplicador(sesiones=SessionLocal if USAR_SQLITE else None)
@@ -0,0 +1,188 @@
+# escritura_diferida.py
+# Modo opcional del webhook (WEBHOOK_ESCRITURA_DIFERIDA=1): un comando que escribe se valida contra
+# el snapshot cacheado del usuario (Comando.aplicar), se responde al instante y la mutación se encola.
+# Un hilo escritor junta las de muchos usuarios y las confirma con UN commit por lote, en vez de un
+# commit (y su escritura al WAL) por mensaje.
+# Read-your-writes: el snapshot nuevo queda en la caché (el escritor no lo invalida al confirmar), y
+# quien tenga que leer de la base a un teléfono con mutaciones sin confirmar espera antes a que el
+# escritor las confirme (esperar()). Si una mutación falla al escribirse, su teléfono se invalida.
+# Los mensajes de un mismo teléfono se planean de a uno (candado por teléfono) y siempre sobre el
+# snapshot que dejó el anterior: dos a la vez ya no parten de la misma foto ni se pisan en la caché.
+import os
+import time
+import queue
+import atexit
+import threading
+from sqlalchemy.orm import selectinload
+from models import SessionLocal, Usuario
+import cache_usuarios
+import comandos
+import metricas
+
+# ---------------- CONFIG ----------------
+ACTIVA = os.getenv("WEBHOOK_ESCRITURA_DIFERIDA", "0") == "1"
+MAX_LOTE = int(os.getenv("ESCRITURA_MAX_LOTE", 200))                 # mutaciones por commit
+ESPERA_LOTE = float(os.getenv("ESCRITURA_ESPERA_MS", 5)) / 1000      # cuánto se junta antes de escribir
+ESPERA_BARRERA = float(os.getenv("ESCRITURA_ESPERA_BARRERA", 10))    # s; luego se lee lo que haya
+CANDADOS = 256                                                        # candados por teléfono (por hash)
+
+M_LOTE = metricas.REGISTRO.histograma(
+    "webhook_escritura_lote", "Mutaciones confirmadas por commit del escritor diferido.",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 200, 500))
+M_MUTACIONES = metricas.REGISTRO.contador(
+    "webhook_escritura_mutaciones_total", "Mutaciones diferidas por comando y resultado.", ("comando", "resultado"))
+
+
+class ColaEscrituras:
+    """Cola de (telefono, comando, params) con un hilo escritor que la vacía por lotes."""
+
+    def __init__(self, sesiones=SessionLocal, max_lote: int = MAX_LOTE, espera: float = ESPERA_LOTE):
+        self.sesiones, self.max_lote, self.espera = sesiones, max_lote, espera
+        self._cola = queue.Queue()
+        self._cond = threading.Condition()
+        self._pendientes = {}  # telefono -> mutaciones encoladas sin confirmar
+        self._candados = [threading.Lock() for _ in range(CANDADOS)]
+        self._hilo = None
+
+    def candado(self, telefono) -> threading.Lock:
+        """Candado de `telefono` (compartido con los teléfonos de igual hash, no se crean por usuario)."""
+        return self._candados[hash(telefono) % len(self._candados)]
+
+    def encolar(self, telefono, comando, params):
+        with self._cond:
+            self._pendientes[telefono] = self._pendientes.get(telefono, 0) + 1
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._bucle, name="escritura-diferida", daemon=True)
+                self._hilo.start()
+                atexit.register(self.vaciar, ESPERA_BARRERA)
+        self._cola.put((telefono, comando, params))
+
+    def esperar(self, telefono, timeout: float = ESPERA_BARRERA) -> bool:
+        """Bloquea hasta que `telefono` no tenga mutaciones sin confirmar. False si venció el tiempo."""
+        with self._cond:
+            return self._cond.wait_for(lambda: telefono not in self._pendientes, timeout)
+
+    def vaciar(self, timeout: float | None = None) -> bool:
+        """Espera a que se confirme todo lo encolado (al salir, en tests y benchmarks)."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pendientes, timeout)
+
+    def pendientes(self) -> int:
+        with self._cond:
+            return sum(self._pendientes.values())
+
+    def _bucle(self):
+        while True:
+            lote = [self._cola.get()]
+            limite = time.monotonic() + self.espera
+            while len(lote) < self.max_lote:
+                restante = limite - time.monotonic()
+                try:
+                    lote.append(self._cola.get(timeout=restante) if restante > 0 else self._cola.get_nowait())
+                except queue.Empty:
+                    break
+            self._escribir(lote)
+
+    def _escribir(self, lote):
+        telefonos = {telefono for telefono, _, _ in lote}
+        fallidos = set()
+        session = self.sesiones()
+        session.info[cache_usuarios.AL_DIA] = True  # los snapshots cacheados ya incluyen el lote
+        try:
+            # BEGIN explícito: pysqlite no abre la transacción antes del SAVEPOINT, y sin ella
+            # cada RELEASE confirmaría por su cuenta (un commit por mutación otra vez)
+            session.connection().exec_driver_sql("BEGIN IMMEDIATE")
+            usuarios = {u.telefono: u for u in session.query(Usuario).options(selectinload(Usuario.examenes))
+                        .filter(Usuario.telefono.in_(telefonos))}
+            for telefono, comando, params in lote:
+                try:
+                    with session.begin_nested():
+                        usuario = usuarios.get(telefono)
+                        if usuario is None:
+                            raise comandos.ErrorComando(f"usuario {telefono} ya no existe")
+                        comando.ejecutar(session, usuario, params)
+                    metricas.REGISTRO.incrementar(M_MUTACIONES, comando.nombre, "ok")
+                except Exception as e:
+                    # Ya se le respondió que sí: se avisa en el log y la caché vuelve a leer la base
+                    fallidos.add(telefono)
+                    metricas.REGISTRO.incrementar(M_MUTACIONES, comando.nombre, "error")
+                    print(f"[WARN] Escritura diferida {comando.nombre} de {telefono} descartada: {e}")
+            session.commit()
+            metricas.REGISTRO.observar(M_LOTE, len(lote))
+        except Exception as e:
+            session.rollback()
+            fallidos = telefonos
+            for _, comando, _ in lote:
+                metricas.REGISTRO.incrementar(M_MUTACIONES, comando.nombre, "error")
+            print(f"[ERROR] Escritura diferida: lote de {len(lote)} descartado: {e}")
+        finally:
+            session.close()
+            if fallidos:
+                cache_usuarios.CACHE.invalidar(telefonos=fallidos)
+            with self._cond:
+                for telefono, _, _ in lote:
+                    restantes = self._pendientes[telefono] - 1
+                    if restantes:
+                        self._pendientes[telefono] = restantes
+                    else:
+                        del self._pendientes[telefono]
+                self._cond.notify_all()
+
+
+COLA = ColaEscrituras() if ACTIVA else None
+
+
+def encolar_plan(snap, planear):
+    """
+    Bajo el candado del teléfono: planear(snapshot más nuevo) -> (resultado, final, aplicados), deja
+    `final` en la caché y encola `aplicados`. Devuelve `resultado`. `snap` solo aporta el teléfono
+    (y el estado, si la caché ya no lo tiene y la base tampoco).
+    """
+    with COLA.candado(snap.telefono):
+        actual = cache_usuarios.CACHE.obtener(snap.telefono) or _releer(snap)
+        resultado, final, aplicados = planear(actual)
+        if aplicados:
+            cache_usuarios.CACHE.reemplazar(final)
+            for comando, params in aplicados:
+                COLA.encolar(snap.telefono, comando, params)
+        return resultado
+
+
+def _releer(snap):
+    # La entrada venció o se invalidó entre la lectura del mensaje y el candado: `snap` puede ser
+    # viejo, así que se espera lo encolado (con el candado nadie encola más) y se lee la base.
+    if not COLA.esperar(snap.telefono):
+        print(f"[WARN] {snap.telefono}: escrituras diferidas sin confirmar, se lee la base igual")
+    epoca = cache_usuarios.CACHE.epoca
+    session = COLA.sesiones()
+    try:
+        usuario = (session.query(Usuario).options(selectinload(Usuario.examenes))
+                   .filter_by(telefono=snap.telefono).first())
+        if usuario is None:
+            return snap
+        return cache_usuarios.CACHE.guardar(cache_usuarios.snapshot(usuario), epoca)
+    finally:
+        session.close()
+
+
+def atender(snap, comando: comandos.Comando, args, tiempos=None):
+    """
+    Como comandos.atender pero sin sesión: parse, aplicar() sobre el snapshot, encolar y render.
+    Los errores esperados (curso inexistente, duplicado...) salen igual, antes de encolar nada.
+    """
+    tiempos = tiempos if tiempos is not None else {}
+    try:
+        t0 = time.perf_counter()
+        params = comando.parse(args)
+        t1 = time.perf_counter()
+        tiempos["parse"] = t1 - t0
+        encolar_plan(snap, lambda actual: (None, comando.aplicar(actual, params), [(comando, params)]))
+        t2 = time.perf_counter()
+        tiempos["ejecutar"] = t2 - t1
+        texto = comando.render(params)
+        tiempos["render"] = time.perf_counter() - t2
+        return texto
+    except comandos.ErrorComando as e:
+        return str(e)
+    except Exception as e:
+        return f"❌ Error procesando {comando.nombre}: {e}"
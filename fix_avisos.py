@@ -1,23 +1,14 @@
 # fix_avisos.py
-from models import SessionLocal, Examen
+# La revisión corre por lotes y con checkpoint en mantenimiento.py (tarea "avisos"). Con avisos
+# guardados como máscara ya no puede haber días menores a 5, así que no cambia nada.
+from models import init_db
+from mantenimiento import TAREAS, ejecutar
 
-def fix_avisos():
-    session = SessionLocal()
-    exámenes = session.query(Examen).all()
-    cambios = 0
-
-    for ex in exámenes:
-        avisos_lista = [int(x) for x in ex.avisos.split(",") if x.strip().isdigit()]
-        avisos_filtrados = sorted([d for d in avisos_lista if d >= 5], reverse=True)
-
-        if avisos_lista != avisos_filtrados:
-            ex.avisos = ",".join(str(d) for d in avisos_filtrados)
-            cambios += 1
-            print(f"[FIX] Examen '{ex.curso}' ({ex.fecha}) -> Avisos: {ex.avisos}")
-
-    session.commit()
-    session.close()
-    print(f"\n[INFO] Corrección completada. Exámenes actualizados: {cambios}")
+def fix_avisos(**opciones):
+    stats = ejecutar(TAREAS["avisos"], **opciones)
+    print(f"\n[INFO] Revisión completada. Exámenes revisados: {stats['revisados']}, actualizados: {stats['cambiados']}")
+    return stats
 
 if __name__ == "__main__":
+    init_db()
     fix_avisos()
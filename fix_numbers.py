@@ -1,21 +1,13 @@
 # fix_numbers.py
-from models import SessionLocal, Usuario
+# La corrección corre por lotes y con checkpoint en mantenimiento.py (tarea "numeros").
+from models import init_db
+from mantenimiento import TAREAS, ejecutar
 
-def fix_numbers():
-    session = SessionLocal()
-    usuarios = session.query(Usuario).all()
-    cambios = 0
-
-    for u in usuarios:
-        if not u.telefono.startswith("whatsapp:"):
-            old_number = u.telefono
-            u.telefono = f"whatsapp:{u.telefono}"
-            cambios += 1
-            print(f"[FIX] {old_number} -> {u.telefono}")
-
-    session.commit()
-    session.close()
-    print(f"Corrección completada. Números modificados: {cambios}")
+def fix_numbers(**opciones):
+    stats = ejecutar(TAREAS["numeros"], **opciones)
+    print(f"Corrección completada. Números modificados: {stats['cambiados']}")
+    return stats
 
 if __name__ == "__main__":
+    init_db()
     fix_numbers()
@@ -0,0 +1,113 @@
+# generar_poblacion.py
+import argparse
+import random
+import time
+from datetime import date, timedelta
+from models import Base, Usuario, Examen
+from avisos import a_mascara
+
+# ---------------- CONFIG ----------------
+# Distribución aproximada de zonas horarias de los estudiantes (peso relativo)
+ZONAS = {
+    "America/Lima": 55,
+    "America/Bogota": 10,
+    "America/Mexico_City": 8,
+    "America/Santiago": 5,
+    "America/Argentina/Buenos_Aires": 5,
+    "America/Caracas": 3,
+    "America/Guayaquil": 3,
+    "America/La_Paz": 2,
+    "Europe/Madrid": 6,
+    "America/New_York": 2,
+    "Asia/Kolkata": 1,
+}
+CURSOS = [
+    "Matemáticas", "Física", "Química", "Biología", "Historia", "Literatura", "Economía",
+    "Contabilidad", "Finanzas", "Estadística", "Programación", "Inglés", "Anatomía",
+    "Macroeconomía", "Microeconomía", "Cálculo II", "Álgebra Lineal", "Derecho Civil",
+]
+# Avisos personalizados más comunes; [] = usa los globales
+AVISOS_EXAMEN = [[], [], [], [], [], [30, 10, 5], [20, 10, 5], [10, 5], [15, 7], [30, 20, 10, 5]]
+AVISOS_GLOBALES = [[30, 20, 10, 5], [30, 20, 10, 5], [30, 20, 10, 5], [20, 10, 5], [30, 15, 7], [10, 5]]
+LOTE = 1000
+
+
+def fecha_examen(rng: random.Random, inicio: date, dias_semestre: int) -> date:
+    """Fechas agrupadas en semanas de parciales (~45% del semestre) y finales (~95%), más ruido."""
+    r = rng.random()
+    if r < 0.4:
+        centro = 0.45
+    elif r < 0.8:
+        centro = 0.95
+    else:
+        return inicio + timedelta(days=rng.randrange(dias_semestre))
+    offset = int(rng.gauss(centro * dias_semestre, 5))
+    return inicio + timedelta(days=min(max(offset, 0), dias_semestre - 1))
+
+
+def generar_poblacion(session, n_usuarios: int, n_examenes: int, semilla: int = 42,
+                      inicio: date | None = None, dias_semestre: int = 120, verbose: bool = True):
+    """
+    Inserta `n_usuarios` usuarios y `n_examenes` exámenes repartidos entre ellos.
+    Se usa el ORM (en lotes) para que los recordatorios se materialicen igual que en producción.
+    """
+    rng = random.Random(semilla)
+    inicio = inicio or date.today()
+    zonas, pesos = zip(*ZONAS.items())
+    base_tel = 51_900_000_000 + rng.randrange(10_000_000)
+
+    # Exámenes por usuario: multinomial aproximada (cada examen cae en un usuario al azar)
+    por_usuario = [0] * n_usuarios
+    for _ in range(n_examenes):
+        por_usuario[rng.randrange(n_usuarios)] += 1
+
+    t0 = time.perf_counter()
+    for i in range(n_usuarios):
+        u = Usuario(
+            telefono=f"whatsapp:+{base_tel + i}",
+            avisos_globales_mask=a_mascara(rng.choice(AVISOS_GLOBALES)),
+            usar_globales=rng.random() < 0.8,
+            timezone=rng.choices(zonas, pesos)[0],
+        )
+        cursos = rng.sample(CURSOS, min(por_usuario[i], len(CURSOS)))
+        cursos += [f"{rng.choice(CURSOS)} {k}" for k in range(por_usuario[i] - len(cursos))]
+        for curso in cursos:
+            u.examenes.append(Examen(
+                curso=curso,
+                fecha=fecha_examen(rng, inicio, dias_semestre),
+                avisos_mask=a_mascara(rng.choice(AVISOS_EXAMEN)),
+            ))
+        session.add(u)
+        if (i + 1) % LOTE == 0:
+            session.commit()
+            if verbose:
+                print(f"[INFO] {i + 1}/{n_usuarios} usuarios insertados...")
+    session.commit()
+    segundos = time.perf_counter() - t0
+    if verbose:
+        print(f"[INFO] Población generada: {n_usuarios} usuarios, {n_examenes} exámenes en {segundos:.1f}s")
+    return {"usuarios": n_usuarios, "examenes": n_examenes, "segundos": segundos}
+
+
+def main():
+    from sqlalchemy.orm import sessionmaker
+    from models import crear_engine
+
+    parser = argparse.ArgumentParser(description="Genera una población sintética de usuarios y exámenes.")
+    parser.add_argument("--usuarios", type=int, default=1000)
+    parser.add_argument("--examenes", type=int, default=5000)
+    parser.add_argument("--db", default="sqlite:///poblacion.db", help="URL de la base destino (no usar data.db).")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--inicio", default=None, help="Inicio del semestre (YYYY-MM-DD). Default: hoy.")
+    args = parser.parse_args()
+
+    engine = crear_engine(args.db)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    inicio = date.fromisoformat(args.inicio) if args.inicio else None
+    generar_poblacion(session, args.usuarios, args.examenes, args.semilla, inicio)
+    session.close()
+
+
+if __name__ == "__main__":
+    main()
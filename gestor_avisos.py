@@ -1,10 +1,15 @@
 import argparse
-import json
+import io
+import shlex
+import sys
+from contextlib import redirect_stdout, redirect_stderr
 from pathlib import Path
 from datetime import datetime
 from datetime import datetime as dt
+from diario_datos import DiarioDatos
 
 DATA_PATH = Path("data.json")
+DIARIO = DiarioDatos(DATA_PATH)  # los cambios se añaden a data.json.diario (ver diario_datos.py)
 
 MIN_DIA = 5
 MAX_DIA = 30
@@ -13,16 +18,16 @@ AVISOS_DEFAULT = [30, 10, 5]
 
 # ---------- Utilidades ----------
 def load_json(path, default=None):
-    if not path.exists():
-        if default is not None:
-            return default
-        raise FileNotFoundError(f"No existe {path.resolve()}")
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return DiarioDatos(path).cargar(default)
 
-def save_json(path, data):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+_lote = None  # durante un batch: nombre -> estudiante modificado (se guardan todos juntos al final)
+
+def guardar_estudiante(st):
+    """Añade el estudiante al diario en vez de reescribir todo data.json."""
+    if _lote is not None:
+        _lote[st["nombre"]] = st
+        return
+    DIARIO.registrar(st)
 
 def normalizar_avisos(avisos):
     if avisos is None:
@@ -36,13 +41,45 @@ def normalizar_avisos(avisos):
         return AVISOS_DEFAULT
     return filtrados[:MAX_AVISOS]
 
+class Indexada(list):
+    """
+    Lista de dicts (estudiantes o exámenes) con un índice clave -> posición, para batch.
+    El índice se arma en la primera búsqueda y se rehace si quedó desactualizado (un examen
+    renombrado o eliminado); con fija=True un nombre que no está no obliga a rehacerlo.
+    """
+    def __init__(self, items, clave, fija=False):
+        super().__init__(items)
+        self.clave, self.fija = clave, fija
+        self._pos, self._largo = None, None
+
+    def buscar(self, valor):
+        pos = self._pos.get(valor) if self._pos is not None else None
+        if pos is not None and pos < len(self) and self[pos].get(self.clave) == valor:
+            return pos, self[pos]
+        if self._pos is None or pos is not None or not self.fija or self._largo != len(self):
+            self._pos, self._largo = {}, len(self)
+            for i, item in enumerate(self):
+                self._pos.setdefault(item.get(self.clave), i)  # como el recorrido lineal: manda el primero
+            pos = self._pos.get(valor)
+        return (None, None) if pos is None else (pos, self[pos])
+
+def indexar(data):
+    """nombre -> estudiante y, en cada estudiante, curso -> examen (una sola vez por batch)."""
+    for st in data:
+        st["examenes"] = Indexada(st.get("examenes", []), "curso")
+    return Indexada(data, "nombre", fija=True)
+
 def find_student(data, nombre):
+    if isinstance(data, Indexada):
+        return data.buscar(nombre)
     for i, st in enumerate(data):
         if st.get("nombre") == nombre:
             return i, st
     return None, None
 
 def find_course(examenes, curso):
+    if isinstance(examenes, Indexada):
+        return examenes.buscar(curso)
     for i, ex in enumerate(examenes):
         if ex.get("curso") == curso:
             return i, ex
@@ -123,6 +160,13 @@ def build_parser():
     s_delete.add_argument("--estudiante", required=True, help="Nombre del estudiante")
     s_delete.add_argument("--curso", required=True, help="Curso a eliminar")
 
+    # Varias operaciones en una corrida
+    s_batch = sub.add_parser("batch", help="Aplica muchas operaciones (una por línea) y guarda una sola vez")
+    s_batch.add_argument("archivo", nargs="?", default="-",
+                         help="Archivo con una operación por línea, como en la línea de comandos "
+                              "(ej: set-curso --estudiante \"Ana\" --curso Física --avisos 20 10). "
+                              "Sin archivo o con '-' se lee de stdin. Las líneas con # se ignoran.")
+
     return p
 
 # ---------- Comandos ----------
@@ -150,7 +194,7 @@ def cmd_set_globales(data, args):
             st["usar_globales"] = False
 
     data[idx] = st
-    save_json(DATA_PATH, data)
+    guardar_estudiante(st)
     print(f"✅ Globales actualizados para {st['nombre']}: {avisos}")
     print_student_summary(st)
 
@@ -169,7 +213,7 @@ def cmd_set_curso(data, args):
     ex["avisos"] = avisos
     st["examenes"][ex_idx] = ex
     data[idx] = st
-    save_json(DATA_PATH, data)
+    guardar_estudiante(st)
     print(f"✅ Avisos del curso '{args.curso}' de {st['nombre']}: {avisos}")
     print_student_summary(st)
 
@@ -190,7 +234,7 @@ def cmd_copiar_a_todos(data, args):
 
     st["usar_globales"] = False  # Si copia por curso, asumimos configuración por-curso
     data[idx] = st
-    save_json(DATA_PATH, data)
+    guardar_estudiante(st)
     print(f"✅ Avisos del curso '{args.curso}' copiados a TODOS los cursos de {st['nombre']}: {avisos}")
     print_student_summary(st)
 
@@ -216,7 +260,7 @@ def cmd_add_examen(data, args):
         "avisos": avisos
     })
     data[idx] = st
-    save_json(DATA_PATH, data)
+    guardar_estudiante(st)
     print(f"✅ Examen añadido para {st['nombre']}: {args.curso} el {args.fecha} (avisos: {avisos if avisos else '(usará globales o default)'})")
     print_student_summary(st)
 
@@ -238,7 +282,7 @@ def cmd_update_fecha(data, args):
     ex["fecha"] = args.nueva_fecha
     st["examenes"][ex_idx] = ex
     data[idx] = st
-    save_json(DATA_PATH, data)
+    guardar_estudiante(st)
     print(f"✅ Fecha actualizada: {st['nombre']} - {args.curso} ahora es {args.nueva_fecha}")
     print_student_summary(st)
 
@@ -263,7 +307,7 @@ def cmd_rename_examen(data, args):
     ex["curso"] = args.nuevo_curso
     st["examenes"][ex_idx] = ex
     data[idx] = st
-    save_json(DATA_PATH, data)
+    guardar_estudiante(st)
     print(f"✅ Curso renombrado: '{args.curso}' -> '{args.nuevo_curso}' en {st['nombre']}")
     print_student_summary(st)
 
@@ -280,10 +324,65 @@ def cmd_delete_examen(data, args):
 
     st["examenes"].pop(ex_idx)
     data[idx] = st
-    save_json(DATA_PATH, data)
+    guardar_estudiante(st)
     print(f"✅ Examen eliminado: {args.curso} de {st['nombre']}")
     print_student_summary(st)
 
+COMANDOS = {
+    "set-globales": cmd_set_globales,
+    "set-curso": cmd_set_curso,
+    "copiar-a-todos": cmd_copiar_a_todos,
+    "add-examen": cmd_add_examen,
+    "update-fecha": cmd_update_fecha,
+    "rename-examen": cmd_rename_examen,
+    "delete-examen": cmd_delete_examen,
+}
+
+def ejecutar_operacion(parser, data, linea):
+    """Una línea de batch -> (ok, mensaje). La salida del comando no se muestra: se resume."""
+    salida, errores = io.StringIO(), io.StringIO()
+    try:
+        with redirect_stdout(salida), redirect_stderr(errores):
+            args = parser.parse_args(shlex.split(linea))
+            if args.cmd not in COMANDOS:
+                return False, f"'{args.cmd}' no se puede usar dentro de batch"
+            COMANDOS[args.cmd](data, args)
+    except SystemExit:  # argparse ya escribió el motivo en stderr
+        return False, (errores.getvalue().strip().splitlines() or ["argumentos inválidos"])[-1]
+    except Exception as e:  # shlex (comillas sin cerrar), avisos no numéricos, datos mal formados...
+        return False, f"{e}"
+    resultado = next((l for l in salida.getvalue().splitlines() if l.startswith(("✅", "❌"))), "")
+    return resultado.startswith("✅"), resultado[1:].strip()
+
+def cmd_batch(parser, data, args):
+    global _lote
+    if args.archivo == "-":
+        lineas = sys.stdin.read().splitlines()
+    else:
+        with open(args.archivo, "r", encoding="utf-8") as f:
+            lineas = f.read().splitlines()
+
+    data = indexar(data)
+    _lote = {}
+    ok = errores = 0
+    try:
+        for n, linea in enumerate(lineas, 1):
+            if not linea.strip() or linea.lstrip().startswith("#"):
+                continue
+            exito, mensaje = ejecutar_operacion(parser, data, linea)
+            if exito:
+                ok += 1
+            else:
+                errores += 1
+            print(f"{n:>5} {'OK   ' if exito else 'ERROR'} {linea.strip()}  ->  {mensaje}")
+        cambiados = list(_lote.values())
+    finally:
+        _lote = None
+    guardar = [(st["nombre"], st) for st in cambiados]
+    DIARIO.registrar_varios(guardar)
+    print(f"\n{ok + errores} operaciones: {ok} OK, {errores} con error. "
+          f"{len(guardar)} estudiante(s) guardados en una sola escritura.")
+
 def main():
     parser = build_parser()
     args = parser.parse_args()
@@ -310,8 +409,13 @@ def main():
         cmd_rename_examen(data, args)
     elif args.cmd == "delete-examen":
         cmd_delete_examen(data, args)
+    elif args.cmd == "batch":
+        cmd_batch(parser, data, args)
     else:
         parser.print_help()
 
+    # Después de mostrar el resultado: si el diario ya es grande, se pasa a data.json ahora.
+    DIARIO.compactar_si_hace_falta()
+
 if __name__ == "__main__":
     main()
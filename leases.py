@@ -0,0 +1,122 @@
+# leases.py
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import and_, or_, update
+from sqlalchemy.dialects.sqlite import insert
+from models import Lease
+
+# ---------------- CONFIG ----------------
+DURACION_DEFAULT = timedelta(minutes=30)  # si el titular muere, otro puede tomar el shard pasado este tiempo;
+                                          # mientras trabaja, el titular lo renueva tras cada lote enviado
+
+
+def _ahora() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def titular_actual() -> str:
+    """Identificador único del proceso que pide el lease."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def parse_shard(spec: str | None):
+    """'3/8' -> (3, 8). El índice va de 0 a TOTAL-1. None -> (0, 1), es decir, sin particionar."""
+    if not spec:
+        return 0, 1
+    try:
+        indice, total = (int(x) for x in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"Shard inválido: {spec}. Usa INDICE/TOTAL, ej: 3/8")
+    if total < 1 or not 0 <= indice < total:
+        raise ValueError(f"Shard inválido: {spec}. El índice debe ir de 0 a {total - 1}")
+    return indice, total
+
+
+def nombre_lease(indice: int, total: int) -> str:
+    return f"scheduler:{indice}/{total}"
+
+
+def total_de_lease(nombre: str) -> int:
+    return int(nombre.rsplit("/", 1)[1])
+
+
+def adquirir(session, nombre: str, periodo: str, titular: str,
+             duracion: timedelta = DURACION_DEFAULT, ahora: datetime | None = None) -> bool:
+    """
+    Intenta tomar el lease `nombre` para `periodo` con un único UPSERT atómico.
+    - Si otro proceso lo tiene activo (sin completar y sin vencer), se niega, sea cual sea el periodo.
+    - Si ya se completó ese mismo periodo, se niega: el trabajo de esa hora ya está hecho.
+    - Si venció sin completarse (el titular murió) o se completó otro periodo, se toma.
+    """
+    ahora = ahora or _ahora()
+    stmt = insert(Lease.__table__).values(
+        nombre=nombre, periodo=periodo, titular=titular, expira=ahora + duracion, completado=False
+    )
+    tabla = Lease.__table__.c
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["nombre"],
+        set_={"periodo": stmt.excluded.periodo, "titular": stmt.excluded.titular,
+              "expira": stmt.excluded.expira, "completado": False},
+        where=or_(
+            and_(tabla.completado == True, tabla.periodo != stmt.excluded.periodo),  # noqa: E712
+            and_(tabla.completado == False, tabla.expira < ahora),  # noqa: E712
+        ),
+    )
+    session.connection().execute(stmt)
+    session.commit()
+    lease = session.get(Lease, nombre, populate_existing=True)
+    return lease is not None and lease.titular == titular
+
+
+def completar(session, nombre: str, titular: str):
+    """Marca el periodo como trabajado: otra corrida del mismo periodo lo saltará."""
+    session.execute(
+        update(Lease)
+        .where(Lease.nombre == nombre, Lease.titular == titular)
+        .values(completado=True, expira=_ahora())
+    )
+    session.commit()
+
+
+def liberar(session, nombre: str, titular: str):
+    """Suelta el lease sin completarlo (p. ej. tras un error) para que otro proceso reintente."""
+    session.execute(
+        update(Lease)
+        .where(Lease.nombre == nombre, Lease.titular == titular)
+        .values(expira=_ahora() - timedelta(seconds=1))
+    )
+    session.commit()
+
+
+def renovar(session, nombre: str, titular: str, duracion: timedelta = DURACION_DEFAULT,
+            ahora: datetime | None = None) -> bool:
+    """
+    Extiende el lease mientras el titular sigue trabajando (se llama tras cada lote del outbox).
+    False si ya no es suyo (venció y otro proceso lo tomó): el titular debe dejar de trabajar.
+    """
+    ahora = ahora or _ahora()
+    renovado = session.execute(
+        update(Lease)
+        .where(Lease.nombre == nombre, Lease.titular == titular, Lease.completado == False)  # noqa: E712
+        .values(expira=ahora + duracion)
+    ).rowcount
+    session.commit()
+    return renovado == 1
+
+
+def shards_en_conflicto(session, nombre: str, ahora: datetime | None = None):
+    """
+    Leases activos del scheduler con otro TOTAL de shards que `nombre` (p. ej. un run sin --shard
+    mientras corren 0/2 y 1/2): se solapan en usuarios sin compartir lease. Se consulta después de
+    adquirir: si dos corridas chocan, al menos una ve a la otra y se retira.
+    """
+    ahora = ahora or _ahora()
+    total = total_de_lease(nombre)
+    activos = (
+        session.query(Lease.nombre)
+        .filter(Lease.nombre.like("scheduler:%"), Lease.completado == False, Lease.expira >= ahora)  # noqa: E712
+        .all()
+    )
+    return sorted(n for (n,) in activos if total_de_lease(n) != total)
@@ -0,0 +1,82 @@
+# limitador.py
+# Protege al webhook de un remitente que inunda de mensajes y de los picos de carga:
+#   - un token bucket por teléfono (From): LIMITE_TELEFONO mensajes/s con ráfagas de RAFAGA_TELEFONO;
+#   - un tope global de mensajes atendiéndose a la vez (MAX_EN_CURSO).
+# Lo que se pasa del límite recibe al instante un TwiML fijo, sin tocar la base.
+import os
+import threading
+from collections import OrderedDict
+from despachador import TokenBucket
+import metricas
+
+# ---------------- CONFIG ----------------
+LIMITE_TELEFONO = float(os.getenv("LIMITE_TELEFONO", 0.5))     # mensajes/s sostenidos por teléfono (0 = sin límite)
+RAFAGA_TELEFONO = float(os.getenv("RAFAGA_TELEFONO", 10))      # mensajes seguidos antes de frenar
+MAX_EN_CURSO = int(os.getenv("MAX_EN_CURSO", 64))              # mensajes atendiéndose a la vez (0 = sin tope)
+MAX_TELEFONOS = int(os.getenv("LIMITADOR_MAX_TELEFONOS", 50000))  # buckets en memoria (LRU)
+
+_TWIML = '<?xml version="1.0" encoding="UTF-8"?><Response><Message>{}</Message></Response>'
+RESPUESTA_TELEFONO = _TWIML.format("⏳ Estás enviando muchos mensajes seguidos. Espera un momento y vuelve a intentar.")
+RESPUESTA_SATURADO = _TWIML.format("⏳ Estamos atendiendo muchos mensajes. Intenta de nuevo en unos segundos.")
+
+
+class Limitador:
+    """admitir(telefono) -> None si se atiende (y luego hay que llamar salir()); si no, el TwiML fijo."""
+
+    def __init__(self, tasa: float = LIMITE_TELEFONO, rafaga: float = RAFAGA_TELEFONO,
+                 max_en_curso: int = MAX_EN_CURSO, max_telefonos: int = MAX_TELEFONOS):
+        self.tasa, self.rafaga = tasa, rafaga
+        self.max_en_curso, self.max_telefonos = max_en_curso, max_telefonos
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()  # telefono -> TokenBucket
+        self.en_curso = 0
+
+    def admitir(self, telefono):
+        if self.tasa > 0 and telefono and not self._bucket(telefono).intentar():
+            metricas.REGISTRO.incrementar(M_RECHAZOS, "telefono")
+            return RESPUESTA_TELEFONO
+        with self._lock:
+            if self.max_en_curso and self.en_curso >= self.max_en_curso:
+                saturado = True
+            else:
+                saturado = False
+                self.en_curso += 1
+        if saturado:
+            metricas.REGISTRO.incrementar(M_RECHAZOS, "saturado")
+            return RESPUESTA_SATURADO
+        return None
+
+    def salir(self):
+        with self._lock:
+            self.en_curso -= 1
+
+    def _bucket(self, telefono) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(telefono)
+            if bucket is None:
+                bucket = self._buckets[telefono] = TokenBucket(self.tasa, self.rafaga)
+                if len(self._buckets) > self.max_telefonos:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(telefono)
+            return bucket
+
+    def telefonos(self) -> int:
+        return len(self._buckets)
+
+
+LIMITADOR = Limitador()
+
+# ---------------- Métricas ----------------
+M_RECHAZOS = metricas.REGISTRO.contador(
+    "webhook_rechazos_total", "Mensajes contestados con la respuesta fija: por teléfono o por saturación.",
+    ("motivo",))
+metricas.REGISTRO.medidor("webhook_en_curso", "Mensajes atendiéndose ahora mismo.", lambda: LIMITADOR.en_curso)
+metricas.REGISTRO.medidor("webhook_en_curso_max", "Tope de mensajes a la vez (MAX_EN_CURSO; 0 = sin tope).",
+                          lambda: LIMITADOR.max_en_curso)
+metricas.REGISTRO.medidor("webhook_limite_telefono", "Mensajes/s sostenidos por teléfono (LIMITE_TELEFONO).",
+                          lambda: LIMITADOR.tasa)
+metricas.REGISTRO.medidor("webhook_rafaga_telefono", "Ráfaga por teléfono (RAFAGA_TELEFONO).",
+                          lambda: LIMITADOR.rafaga)
+metricas.REGISTRO.medidor("webhook_limitador_telefonos", "Teléfonos con bucket en memoria.",
+                          lambda: LIMITADOR.telefonos())
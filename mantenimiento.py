@@ -0,0 +1,205 @@
+# mantenimiento.py
+# Correcciones de datos por lotes (keyset por id) con checkpoint tras cada lote: cada commit es
+# corto, así el webhook puede escribir entre lotes, y si el proceso se corta se reanuda donde quedó.
+import argparse
+import time
+from datetime import datetime, timezone
+from sqlalchemy.orm import selectinload
+from models import SessionLocal, Usuario, Examen, Checkpoint, init_db
+
+# ---------------- CONFIG ----------------
+LOTE_DEFAULT = 500
+PAUSA_DEFAULT = 0.05  # segundos entre lotes para dejar pasar a otros escritores
+
+
+def _ahora():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def normalizar_telefono(telefono: str) -> str:
+    telefono = telefono.strip()
+    return telefono if telefono.startswith("whatsapp:") else f"whatsapp:{telefono}"
+
+
+class Tarea:
+    """
+    Una corrección: `corregir(session, obj)` aplica el cambio sobre el objeto ORM y devuelve
+    la lista de cambios en texto (vacía si no había nada que corregir).
+    """
+
+    def __init__(self, nombre, modelo, corregir, descripcion, opciones=()):
+        self.nombre, self.modelo, self.corregir = nombre, modelo, corregir
+        self.descripcion, self.opciones = descripcion, tuple(opciones)
+
+
+# ---------------- Correcciones ----------------
+def corregir_avisos(session, ex: Examen):
+    # El fix_avisos.py original quitaba los días menores a 5. Con máscaras esos días no se pueden
+    # guardar (bit i = MIN_DIA + i), así que no queda nada que corregir: la tarea solo revisa.
+    # No se recorta a MAX_AVISOS: add_user.py acepta cualquier cantidad de días entre 5 y 30.
+    return []
+
+
+def corregir_numero(session, u: Usuario):
+    nuevo = normalizar_telefono(u.telefono)
+    if nuevo == u.telefono:
+        return []
+    otro = session.query(Usuario.id).filter(Usuario.telefono == nuevo, Usuario.id != u.id).first()
+    if otro is not None:
+        print(f"[WARN] {u.telefono} (usuario {u.id}) duplica al usuario {otro.id}; usa la tarea 'fusionar'.")
+        return []
+    antes, u.telefono = u.telefono, nuevo
+    return [f"{antes} -> {u.telefono}"]
+
+
+def fusionar_usuario(session, u: Usuario):
+    """El usuario de menor id se queda con los exámenes de sus duplicados (mismo número con/sin prefijo)."""
+    numero = normalizar_telefono(u.telefono)
+    duplicados = (
+        session.query(Usuario)
+        .options(selectinload(Usuario.examenes))
+        .filter(Usuario.telefono.in_([numero, numero[len("whatsapp:"):]]), Usuario.id > u.id)
+        .order_by(Usuario.id)
+        .all()
+    )
+    cambios = []
+    for dup in duplicados:
+        cambios.append(f"Usuario {dup.id} ({dup.telefono}): {len(dup.examenes)} examen(es) -> usuario {u.id}")
+        for examen in list(dup.examenes):
+            u.examenes.append(examen)
+        session.delete(dup)
+    if duplicados or u.telefono != numero:
+        session.flush()  # el duplicado se borra antes de que el principal tome su número
+        if u.telefono != numero:
+            cambios.append(f"Usuario {u.id}: {u.telefono} -> {numero}")
+            u.telefono = numero
+    return cambios
+
+
+TAREAS = {
+    "avisos": Tarea("avisos", Examen, corregir_avisos, "Revisa los avisos de cada examen (sin cambios: con máscaras no hay días fuera de 5–30)."),
+    "numeros": Tarea("numeros", Usuario, corregir_numero, "Agrega el prefijo whatsapp: a los teléfonos."),
+    "fusionar": Tarea("fusionar", Usuario, fusionar_usuario, "Fusiona usuarios con el mismo número.",
+                      opciones=[selectinload(Usuario.examenes)]),
+}
+
+
+# ---------------- Ejecución ----------------
+def _checkpoint(session, nombre):
+    cp = session.get(Checkpoint, nombre)
+    if cp is None:
+        cp = Checkpoint(nombre=nombre, ultimo_id=0, revisados=0, cambiados=0, completado=False)
+        session.add(cp)
+    return cp
+
+
+def ejecutar(tarea: Tarea, sesiones=SessionLocal, lote: int = LOTE_DEFAULT, dry_run: bool = False,
+             desde_cero: bool = False, pausa: float = PAUSA_DEFAULT, filtro=None, nombre: str | None = None):
+    """
+    Recorre tarea.modelo por id ascendente en lotes de `lote` filas. Sin dry_run, cada lote se
+    confirma junto con su checkpoint (misma transacción); con dry_run se muestran los cambios y
+    se descarta todo, sin tocar el checkpoint.
+    Devuelve {"revisados", "cambiados", "lotes", "ultimo_id", "segundos"} de esta corrida.
+    """
+    nombre = nombre or tarea.nombre
+    modelo = tarea.modelo
+
+    session = sesiones()
+    cp = _checkpoint(session, nombre)
+    if desde_cero or cp.completado:
+        cp.ultimo_id, cp.revisados, cp.cambiados, cp.completado = 0, 0, 0, False
+    ultimo_id = cp.ultimo_id
+    if ultimo_id and not dry_run:
+        print(f"[INFO] {nombre}: reanudando después del id {ultimo_id} ({cp.revisados} revisados antes).")
+    pendientes = session.query(modelo).filter(modelo.id > ultimo_id)
+    if filtro is not None:
+        pendientes = pendientes.filter(filtro)
+    total = pendientes.count()
+    if dry_run:
+        session.rollback()
+    else:
+        session.commit()
+    session.close()
+
+    stats = {"revisados": 0, "cambiados": 0, "lotes": 0, "ultimo_id": ultimo_id, "segundos": 0.0}
+    etiqueta = "[DRY-RUN]" if dry_run else "[FIX]"
+    inicio = time.perf_counter()
+    while True:
+        t0 = time.perf_counter()
+        session = sesiones()
+        query = session.query(modelo).options(*tarea.opciones).filter(modelo.id > ultimo_id)
+        if filtro is not None:
+            query = query.filter(filtro)
+        filas = query.order_by(modelo.id).limit(lote).all()
+        if not filas:
+            session.close()
+            break
+
+        cambiados = 0
+        for obj in filas:
+            if obj not in session:  # borrado por una fusión de este mismo lote
+                continue
+            cambios = tarea.corregir(session, obj)
+            if cambios:
+                cambiados += 1
+                for cambio in cambios:
+                    print(f"{etiqueta} {cambio}")
+        primer_id, ultimo_id = filas[0].id, filas[-1].id
+
+        if dry_run:
+            session.rollback()
+        else:
+            cp = _checkpoint(session, nombre)
+            cp.ultimo_id = ultimo_id
+            cp.revisados += len(filas)
+            cp.cambiados += cambiados
+            cp.actualizado = _ahora()
+            session.commit()
+        session.close()
+
+        stats["lotes"] += 1
+        stats["revisados"] += len(filas)
+        stats["cambiados"] += cambiados
+        stats["ultimo_id"] = ultimo_id
+        segundos = time.perf_counter() - t0
+        progreso = stats["revisados"] / total * 100 if total else 100.0
+        print(f"[INFO] {nombre}: lote {stats['lotes']} (ids {primer_id}-{ultimo_id}) "
+              f"revisados {stats['revisados']}/{total} ({progreso:.0f}%) | cambiados {cambiados} | "
+              f"{len(filas) / segundos:.0f} filas/s")
+        if pausa:
+            time.sleep(pausa)
+
+    if not dry_run:
+        session = sesiones()
+        cp = _checkpoint(session, nombre)
+        cp.completado, cp.actualizado = True, _ahora()
+        session.commit()
+        session.close()
+    stats["segundos"] = time.perf_counter() - inicio
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Correcciones de datos por lotes, reanudables.")
+    parser.add_argument("tarea", choices=sorted(TAREAS), help="; ".join(f"{t.nombre}: {t.descripcion}"
+                                                                       for t in TAREAS.values()))
+    parser.add_argument("--dry-run", action="store_true", help="Mostrar los cambios sin guardarlos.")
+    parser.add_argument("--lote", type=int, default=LOTE_DEFAULT, help=f"Filas por lote (default {LOTE_DEFAULT}).")
+    parser.add_argument("--pausa", type=float, default=PAUSA_DEFAULT, help="Segundos de pausa entre lotes.")
+    parser.add_argument("--desde-cero", action="store_true", help="Ignorar el checkpoint y empezar del id 0.")
+    args = parser.parse_args()
+
+    init_db()
+    try:
+        stats = ejecutar(TAREAS[args.tarea], lote=args.lote, dry_run=args.dry_run,
+                         desde_cero=args.desde_cero, pausa=args.pausa)
+    except KeyboardInterrupt:
+        print(f"\n[INFO] Interrumpido. Vuelve a ejecutar 'python mantenimiento.py {args.tarea}' para reanudar.")
+        return
+    modo = "Simulación" if args.dry_run else "Corrección"
+    print(f"[INFO] {modo} completada: {stats['revisados']} revisados, {stats['cambiados']} con cambios, "
+          f"{stats['lotes']} lote(s) en {stats['segundos']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
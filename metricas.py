@@ -0,0 +1,164 @@
+# metricas.py
+import re
+import time
+import threading
+import contextvars
+from sqlalchemy import event
+
+# ---------------- CONFIG ----------------
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_RE_CONSULTA = re.compile(r"^\s*(\w+)(?:.*?\b(?:FROM|INTO|UPDATE)\s+\"?(\w+))?", re.IGNORECASE | re.DOTALL)
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _etiquetas(pares) -> str:
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{k}="{_escapar(v)}"' for k, v in pares) + "}"
+
+
+class Histograma:
+    """Histograma acumulativo al estilo Prometheus, con una serie por combinación de etiquetas."""
+
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS):
+        self.nombre, self.ayuda, self.etiquetas, self.buckets = nombre, ayuda, tuple(etiquetas), buckets
+        self._series = {}
+
+    def observar(self, valor: float, *valores_etiquetas):
+        serie = self._series.get(valores_etiquetas)
+        if serie is None:
+            serie = self._series[valores_etiquetas] = [[0] * len(self.buckets), 0.0, 0]
+        conteos = serie[0]
+        for i, limite in enumerate(self.buckets):
+            if valor <= limite:
+                conteos[i] += 1
+        serie[1] += valor
+        serie[2] += 1
+
+    def exponer(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        for valores, (conteos, suma, total) in sorted(self._series.items()):
+            base = list(zip(self.etiquetas, valores))
+            for limite, conteo in zip(self.buckets, conteos):
+                lineas.append(f"{self.nombre}_bucket{_etiquetas(base + [('le', limite)])} {conteo}")
+            lineas.append(f"{self.nombre}_bucket{_etiquetas(base + [('le', '+Inf')])} {total}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas(base)} {suma:.6f}")
+            lineas.append(f"{self.nombre}_count{_etiquetas(base)} {total}")
+        return lineas
+
+
+class Contador:
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre, self.ayuda, self.etiquetas = nombre, ayuda, tuple(etiquetas)
+        self._series = {}
+
+    def incrementar(self, *valores_etiquetas, cantidad=1):
+        self._series[valores_etiquetas] = self._series.get(valores_etiquetas, 0) + cantidad
+
+    def exponer(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} counter"]
+        for valores, total in sorted(self._series.items()):
+            lineas.append(f"{self.nombre}{_etiquetas(list(zip(self.etiquetas, valores)))} {total}")
+        return lineas
+
+
+class Medidor:
+    """Valor instantáneo (gauge): `leer()` se llama al exponer, así no hay que actualizarlo."""
+
+    def __init__(self, nombre, ayuda, leer):
+        self.nombre, self.ayuda, self.leer = nombre, ayuda, leer
+
+    def exponer(self):
+        return [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} gauge", f"{self.nombre} {self.leer()}"]
+
+
+class Registro:
+    """Métricas en memoria de este proceso, expuestas en formato de texto de Prometheus."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metricas = {}
+
+    def _registrar(self, metrica):
+        with self._lock:
+            return self._metricas.setdefault(metrica.nombre, metrica)
+
+    def histograma(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS):
+        return self._registrar(Histograma(nombre, ayuda, etiquetas, buckets))
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        return self._registrar(Contador(nombre, ayuda, etiquetas))
+
+    def medidor(self, nombre, ayuda, leer):
+        return self._registrar(Medidor(nombre, ayuda, leer))
+
+    def observar(self, metrica, valor, *etiquetas):
+        with self._lock:
+            metrica.observar(valor, *etiquetas)
+
+    def incrementar(self, metrica, *etiquetas, cantidad=1):
+        with self._lock:
+            metrica.incrementar(*etiquetas, cantidad=cantidad)
+
+    def exponer(self) -> str:
+        with self._lock:
+            lineas = []
+            for metrica in self._metricas.values():
+                lineas.extend(metrica.exponer())
+        return "\n".join(lineas) + "\n"
+
+
+REGISTRO = Registro()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# ---------------- Tiempo de base de datos por petición ----------------
+# ContextVar y no threading.local: vale igual para los hilos de Flask que para las tareas asyncio
+# de webhook_asgi.py (varias peticiones en el mismo hilo), y SQLAlchemy la propaga a sus greenlets
+_peticion = contextvars.ContextVar("metricas_peticion", default=None)
+
+
+def nombre_consulta(sql: str) -> str:
+    """'SELECT usuarios', 'UPDATE examenes'... para agrupar tiempos por tipo de consulta."""
+    m = _RE_CONSULTA.match(sql)
+    if not m:
+        return "OTRA"
+    verbo, tabla = m.group(1).upper(), m.group(2)
+    return f"{verbo} {tabla}" if tabla else verbo
+
+
+def iniciar_peticion():
+    """Empieza a acumular el tiempo de SQL de la petición actual (hilo o tarea asyncio)."""
+    _peticion.set([])
+
+
+def consultas_peticion():
+    """[(nombre_consulta, segundos), ...] ejecutadas desde iniciar_peticion() en esta petición."""
+    return _peticion.get() or []
+
+
+def terminar_peticion():
+    consultas = consultas_peticion()
+    _peticion.set(None)
+    return consultas
+
+
+def instrumentar_engine(engine):
+    """Cronometra cada sentencia SQL del engine y la atribuye a la petición en curso."""
+    if engine.__dict__.get("_metricas_instrumentado"):
+        return
+    engine.__dict__["_metricas_instrumentado"] = True
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_metricas_t0", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _despues(conn, cursor, statement, parameters, context, executemany):
+        inicio = conn.info["_metricas_t0"].pop()
+        consultas = _peticion.get()
+        if consultas is not None:
+            consultas.append((nombre_consulta(statement), time.perf_counter() - inicio))
@@ -0,0 +1,151 @@
+# migrar_esquema.py
+# Migra data.db del esquema antiguo (examenes.fecha como texto libre, avisos "30,20,10,5")
+# al actual: fechas YYYY-MM-DD normalizadas y avisos como máscara de bits (ver avisos.py).
+# Borra columnas, así que no corre sola: init_db() se niega a arrancar con el esquema antiguo y
+# hay que ejecutar este script a mano (deja antes una copia de respaldo de la base).
+import argparse
+import sqlite3
+from datetime import datetime
+from sqlalchemy import inspect, text
+from avisos import MASCARA_DEFAULT, a_mascara, parse_avisos
+
+FORMATOS_FECHA = ("%Y-%m-%d", "%Y/%m/%d", "%d/%m/%Y", "%d-%m-%Y")
+
+
+def _columnas(bind, tabla):
+    return {c["name"] for c in inspect(bind).get_columns(tabla)}
+
+
+def necesita_migracion(bind) -> bool:
+    """`bind`: engine o conexión."""
+    insp = inspect(bind)
+    if not insp.has_table("examenes") or not insp.has_table("usuarios"):
+        return False
+    return ("avisos_mask" not in _columnas(bind, "examenes")
+            or "avisos_globales_mask" not in _columnas(bind, "usuarios"))
+
+
+def verificar_esquema(engine):
+    """Lo llama init_db(): con el esquema antiguo nadie arranca hasta migrar a mano."""
+    if necesita_migracion(engine):
+        raise RuntimeError(
+            f"{engine.url.database} tiene el esquema anterior (fechas como texto, avisos '30,20,10,5'). "
+            f"Detén el webhook y el scheduler y ejecuta: python migrar_esquema.py"
+        )
+
+
+def respaldar(engine):
+    """Copia consistente de la base SQLite (API de backup, vale con WAL) junto al archivo. Devuelve la ruta."""
+    origen = engine.url.database
+    destino = f"{origen}.bak-{datetime.now():%Y%m%d-%H%M%S}"
+    with sqlite3.connect(origen) as fuente, sqlite3.connect(destino) as copia:
+        fuente.backup(copia)
+    return destino
+
+
+def normalizar_fecha(valor):
+    """'2025-8-5', '2025/08/05', '05/08/2025'... -> '2025-08-05'. None si no es una fecha válida."""
+    if valor is None:
+        return None
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(str(valor).strip(), formato).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def _mascaras(conn, tabla, columna_texto):
+    """{cadena: máscara} para cada valor distinto de la columna antigua (se parsea una vez por valor)."""
+    valores = conn.execute(text(f"SELECT DISTINCT {columna_texto} FROM {tabla}")).scalars()
+    return {v: a_mascara(parse_avisos(v)) for v in valores}
+
+
+def migrar(engine, borrar_invalidas: bool = False):
+    """
+    Agrega las columnas de máscara, las llena desde las columnas de texto, normaliza las fechas
+    y elimina las columnas antiguas. Si hay fechas inválidas no toca nada salvo `borrar_invalidas`.
+    Todo va en una transacción con el lock de escritura tomado de entrada: si otro proceso migra a
+    la vez, espera y luego encuentra la base ya migrada (devuelve None).
+    """
+    with engine.begin() as conn:
+        # pysqlite no abre la transacción antes de un ALTER: se abre a mano, y IMMEDIATE toma el lock ya
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        if not necesita_migracion(conn):
+            return None
+        col_examenes, col_usuarios = _columnas(conn, "examenes"), _columnas(conn, "usuarios")
+        fechas = conn.execute(text("SELECT id, fecha FROM examenes")).all()
+        cambios, invalidas = [], []
+        for examen_id, fecha in fechas:
+            normal = normalizar_fecha(fecha)
+            if normal is None:
+                invalidas.append((examen_id, fecha))
+            elif normal != fecha:
+                cambios.append({"id": examen_id, "fecha": normal})
+        if invalidas and not borrar_invalidas:
+            detalle = ", ".join(f"#{i} '{f}'" for i, f in invalidas[:10])
+            raise RuntimeError(
+                f"{len(invalidas)} examen(es) con fecha inválida ({detalle}). Corrígelos o ejecuta: "
+                f"python migrar_esquema.py --borrar-invalidas"
+            )
+
+        if "avisos_mask" not in col_examenes:
+            conn.execute(text("ALTER TABLE examenes ADD COLUMN avisos_mask INTEGER NOT NULL DEFAULT 0"))
+        if "avisos_globales_mask" not in col_usuarios:
+            conn.execute(text(
+                f"ALTER TABLE usuarios ADD COLUMN avisos_globales_mask INTEGER NOT NULL DEFAULT {MASCARA_DEFAULT}"))
+
+        if "avisos" in col_examenes:
+            for cadena, mascara in _mascaras(conn, "examenes", "avisos").items():
+                conn.execute(text("UPDATE examenes SET avisos_mask = :m WHERE avisos IS :c"),
+                             {"m": mascara, "c": cadena})
+            conn.execute(text("ALTER TABLE examenes DROP COLUMN avisos"))
+        if "avisos_globales" in col_usuarios:
+            for cadena, mascara in _mascaras(conn, "usuarios", "avisos_globales").items():
+                conn.execute(text("UPDATE usuarios SET avisos_globales_mask = :m WHERE avisos_globales IS :c"),
+                             {"m": mascara or MASCARA_DEFAULT, "c": cadena})
+            conn.execute(text("ALTER TABLE usuarios DROP COLUMN avisos_globales"))
+
+        if cambios:
+            conn.execute(text("UPDATE examenes SET fecha = :fecha WHERE id = :id"), cambios)
+        if invalidas:
+            ids = [{"id": i} for i, _ in invalidas]
+            if inspect(conn).has_table("recordatorios"):
+                conn.execute(text("DELETE FROM recordatorios WHERE examen_id = :id"), ids)
+            conn.execute(text("DELETE FROM examenes WHERE id = :id"), ids)
+
+    print(f"[INFO] Esquema migrado: {len(fechas)} examen(es), {len(cambios)} fecha(s) normalizada(s), "
+          f"{len(invalidas)} eliminado(s) por fecha inválida.")
+    return {"examenes": len(fechas), "normalizadas": len(cambios), "eliminadas": len(invalidas)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migra data.db a fechas tipadas y avisos como máscara de bits.")
+    parser.add_argument("--borrar-invalidas", action="store_true",
+                        help="Eliminar los exámenes cuya fecha no se puede interpretar.")
+    args = parser.parse_args()
+
+    from models import engine, init_db, SessionLocal, reconstruir_recordatorios
+    if not necesita_migracion(engine):
+        print("[INFO] La base ya tiene el esquema actual.")
+        return
+    print(f"[INFO] Copia de respaldo: {respaldar(engine)}")
+    try:
+        resultado = migrar(engine, borrar_invalidas=args.borrar_invalidas)
+    except RuntimeError as e:
+        print(f"[ERROR] {e}")
+        return
+    if resultado is None:
+        print("[INFO] Otro proceso ya migró la base.")
+        return
+    tenia_recordatorios = inspect(engine).has_table("recordatorios")
+    init_db()  # tablas e índices nuevos; si recordatorios no existía, ya los genera
+    if tenia_recordatorios:
+        session = SessionLocal()
+        total = reconstruir_recordatorios(session)
+        session.close()
+        print(f"[INFO] Recordatorios recalculados para {total} examen(es).")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,10 @@
-from sqlalchemy import Column, Integer, String, Date, Boolean, ForeignKey, create_engine
-from sqlalchemy.orm import declarative_base, relationship, sessionmaker
+import os
+from datetime import date, datetime, timedelta
+from sqlalchemy import (Column, Integer, String, Text, Date, DateTime, Boolean, ForeignKey,
+                        UniqueConstraint, Index, create_engine, event, inspect, func, case, cast, literal, and_)
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import declarative_base, relationship, sessionmaker, object_session, validates, Session
+from avisos import MIN_DIA, MAX_DIA, MASCARA_DEFAULT, de_mascara, mascara_efectiva
 
 Base = declarative_base()
 
@@ -9,9 +14,9 @@ class Usuario(Base):
 
     id = Column(Integer, primary_key=True)
     telefono = Column(String(20), unique=True, nullable=False)
-    avisos_globales = Column(String(50), default="30,20,10,5")  # Valores por defecto
+    avisos_globales_mask = Column(Integer, nullable=False, default=MASCARA_DEFAULT)  # 30,20,10,5 por defecto
     usar_globales = Column(Boolean, default=True)
-    timezone = Column(String(50), default="America/Lima")  # <- Nueva columna para zona horaria
+    timezone = Column(String(50), default="America/Lima", index=True)  # <- Zona horaria (indexada para el scheduler)
 
     examenes = relationship("Examen", back_populates="usuario", cascade="all, delete-orphan")
 
@@ -21,19 +26,225 @@ class Examen(Base):
 
     id = Column(Integer, primary_key=True)
     curso = Column(String(100), nullable=False)
-    fecha = Column(String(10), nullable=False)  # formato YYYY-MM-DD
-    avisos = Column(String(50), default="")  # valores personalizados
+    fecha = Column(Date, nullable=False)
+    avisos_mask = Column(Integer, nullable=False, default=0)  # avisos personalizados; 0 = usa los globales
 
     usuario_id = Column(Integer, ForeignKey("usuarios.id"))
     usuario = relationship("Usuario", back_populates="examenes")
+    recordatorios = relationship("Recordatorio", back_populates="examen", cascade="all, delete-orphan")
 
-# Configuración de la base de datos
-DATABASE_URL = "sqlite:///data.db"
-engine = create_engine(DATABASE_URL, echo=False)
+    @validates("fecha")
+    def _validar_fecha(self, key, valor):
+        return parse_fecha(valor)
+
+# Tabla de Recordatorios (una fila por examen y día en que toca avisar)
+class Recordatorio(Base):
+    __tablename__ = "recordatorios"
+    __table_args__ = (UniqueConstraint("examen_id", "fecha_aviso"),)
+
+    id = Column(Integer, primary_key=True)
+    examen_id = Column(Integer, ForeignKey("examenes.id"), nullable=False, index=True)
+    fecha_aviso = Column(Date, nullable=False, index=True)
+    dias = Column(Integer, nullable=False)  # días que faltan para el examen ese día
+
+    examen = relationship("Examen", back_populates="recordatorios")
+
+# Outbox de envíos: un mensaje por (examen, días de aviso, fecha local); la clave evita reenvíos
+class Envio(Base):
+    __tablename__ = "envios"
+    __table_args__ = (
+        UniqueConstraint("examen_id", "dias", "fecha_local", name="uq_envios_idempotencia"),
+        Index("ix_envios_fecha_estado", "fecha_local", "estado"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    examen_id = Column(Integer, ForeignKey("examenes.id"), nullable=False)
+    dias = Column(Integer, nullable=False)
+    fecha_local = Column(Date, nullable=False)
+    telefono = Column(String(20), nullable=False)
+    cuerpo = Column(Text, nullable=False)
+    estado = Column(String(10), nullable=False, default="pendiente")  # pendiente | enviando | enviado | fallido
+    intentos = Column(Integer, nullable=False, default=0)
+    sid = Column(String(64))
+    error = Column(String(255))
+    reclamado_por = Column(String(64))  # token de la corrida que lo está enviando
+    reclamado_en = Column(DateTime)
+    enviado_en = Column(DateTime)
+
+# Leases: evitan que dos procesos (hosts, cron, run_scheduler.bat) trabajen el mismo shard a la vez
+class Lease(Base):
+    __tablename__ = "leases"
+
+    nombre = Column(String(64), primary_key=True)  # ej. "scheduler:3/8"
+    periodo = Column(String(32), nullable=False)   # hora de trabajo, ej. "2025-10-01T13"
+    titular = Column(String(128), nullable=False)  # host:pid:token del proceso
+    expira = Column(DateTime, nullable=False)
+    completado = Column(Boolean, nullable=False, default=False)
+
+# Avance de las tareas de mantenimiento por lotes (mantenimiento.py)
+class Checkpoint(Base):
+    __tablename__ = "checkpoints"
+
+    nombre = Column(String(100), primary_key=True)  # ej. "avisos", "fusionar:whatsapp:+51..."
+    ultimo_id = Column(Integer, nullable=False, default=0)  # último id procesado y confirmado
+    revisados = Column(Integer, nullable=False, default=0)
+    cambiados = Column(Integer, nullable=False, default=0)
+    completado = Column(Boolean, nullable=False, default=False)
+    actualizado = Column(DateTime)
+
+# Respuestas del webhook por MessageSid: un reintento de Twilio recibe la misma respuesta sin
+# volver a ejecutar el comando (duplicados.py, con WEBHOOK_DEDUPE_SQLITE=1 para varios workers)
+class RespuestaWebhook(Base):
+    __tablename__ = "respuestas_webhook"
+
+    message_sid = Column(String(64), primary_key=True)
+    respuesta = Column(Text)  # TwiML; NULL mientras el primer intento se está atendiendo
+    creado = Column(DateTime, nullable=False, index=True)
+
+# ---------------- Fechas y avisos ----------------
+def parse_fecha(valor) -> date:
+    """date o 'YYYY-MM-DD' -> date. ValueError si no es una fecha válida."""
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    try:
+        return datetime.strptime(str(valor).strip(), "%Y-%m-%d").date()
+    except ValueError:
+        raise ValueError(f"Fecha inválida: {valor}. Usa el formato YYYY-MM-DD")
+
+def avisos_efectivos(examen: Examen, usuario: Usuario | None):
+    """Avisos locales del examen; si no tiene, los globales del usuario; si no, los de por defecto."""
+    globales = usuario.avisos_globales_mask if usuario is not None else None
+    return de_mascara(mascara_efectiva(examen.avisos_mask, globales))
+
+def condicion_aviso_sql(hoy: date):
+    """
+    Condición SQL equivalente a "el examen tiene aviso hoy", evaluada en la base:
+    mascara & (1 << (fecha - hoy - MIN_DIA)). Requiere unir Examen con Usuario.
+    """
+    dias = cast(func.julianday(Examen.fecha) - func.julianday(hoy), Integer)
+    mascara = case(
+        (Examen.avisos_mask != 0, Examen.avisos_mask),
+        (Usuario.avisos_globales_mask != 0, Usuario.avisos_globales_mask),
+        else_=MASCARA_DEFAULT,
+    )
+    return and_(dias.between(MIN_DIA, MAX_DIA),
+                mascara.op("&")(literal(1).op("<<")(dias - MIN_DIA)) != 0)
+
+# ---------------- Recordatorios materializados ----------------
+def sincronizar_recordatorios(examen: Examen, usuario: Usuario | None = None):
+    """
+    Ajusta examen.recordatorios a su fecha y avisos actuales.
+    Reutiliza las filas cuya fecha no cambió, para no chocar con la restricción única.
+    """
+    if usuario is None:
+        usuario = examen.usuario
+        session = object_session(examen)
+        if usuario is None and examen.usuario_id is not None and session is not None:
+            usuario = session.get(Usuario, examen.usuario_id)
+
+    deseados = {}
+    if examen.fecha is not None:
+        deseados = {examen.fecha - timedelta(days=d): d for d in avisos_efectivos(examen, usuario)}
+
+    for rec in list(examen.recordatorios):
+        if rec.fecha_aviso in deseados:
+            rec.dias = deseados.pop(rec.fecha_aviso)
+        else:
+            examen.recordatorios.remove(rec)
+    for fecha_aviso, dias in deseados.items():
+        examen.recordatorios.append(Recordatorio(fecha_aviso=fecha_aviso, dias=dias))
+
+def reconstruir_recordatorios(session, lote: int = 500):
+    """Recalcula los recordatorios de todos los exámenes (backfill de bases antiguas)."""
+    total = 0
+    for examen in session.query(Examen).order_by(Examen.id).yield_per(lote):
+        sincronizar_recordatorios(examen)
+        total += 1
+    session.commit()
+    return total
+
+def _cambio(obj, *atributos):
+    estado = inspect(obj)
+    return any(estado.attrs[a].history.has_changes() for a in atributos)
+
+@event.listens_for(Session, "before_flush")
+def _sincronizar_antes_de_flush(session, flush_context, instances):
+    # Cualquier cambio de fecha/avisos (webhook, add_user, scripts de fix) recalcula sus recordatorios
+    pendientes = set()
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Examen):
+            if obj in session.new or _cambio(obj, "fecha", "avisos_mask", "usuario_id", "usuario"):
+                pendientes.add(obj)
+        elif isinstance(obj, Usuario) and obj not in session.new and _cambio(obj, "avisos_globales_mask"):
+            pendientes.update(ex for ex in obj.examenes if not ex.avisos_mask)
+    for examen in pendientes:
+        if examen not in session.deleted:
+            sincronizar_recordatorios(examen)
+
+# ---------------- Perfil de SQLite ----------------
+# WAL: el scheduler puede leer mientras el webhook escribe (y al revés, sin "database is locked").
+# busy_timeout: un escritor espera al otro en vez de fallar al instante.
+# synchronous=NORMAL: en WAL es seguro ante caídas del proceso; solo un corte de luz puede perder
+# la última transacción. cache_size negativo = KiB por conexión.
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000)),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "cache_size": int(os.getenv("SQLITE_CACHE_KIB", -20000)),
+}
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))          # hilos de Flask atendiendo a la vez
+POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", 10))
+POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))  # segundos esperando una conexión libre
+
+def _es_memoria(url) -> bool:
+    return url.database in (None, "", ":memory:") or "mode=memory" in str(url)
+
+def crear_engine(url: str, **kwargs):
+    """create_engine con el perfil de concurrencia para SQLite en archivo; otras bases, tal cual."""
+    url = make_url(url)
+    if url.get_backend_name() != "sqlite" or _es_memoria(url):
+        return create_engine(url, **kwargs)
+    engine = create_engine(
+        url,
+        pool_size=POOL_SIZE,
+        max_overflow=POOL_MAX_OVERFLOW,
+        pool_timeout=POOL_TIMEOUT,
+        connect_args={"timeout": SQLITE_PRAGMAS["busy_timeout"] / 1000, "check_same_thread": False},
+        **kwargs,
+    )
+
+    @event.listens_for(engine, "connect")
+    def _aplicar_pragmas(dbapi_conn, connection_record):
+        cursor = dbapi_conn.cursor()
+        for nombre, valor in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {nombre}={valor}")
+        cursor.close()
+
+    return engine
+
+# Configuración de la base de datos (DATABASE_URL permite apuntar a otra base, p. ej. en benchmarks)
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///data.db")
+engine = crear_engine(DATABASE_URL, echo=False)
 SessionLocal = sessionmaker(bind=engine)
 
 def init_db():
+    from migrar_esquema import verificar_esquema
+
+    # data.db con el esquema anterior (fecha texto, avisos "30,20,10,5"): se migra a mano
+    verificar_esquema(engine)
+    backfill = not inspect(engine).has_table(Recordatorio.__tablename__)
     Base.metadata.create_all(engine)
+    # create_all no agrega índices nuevos a tablas que ya existían (data.db antiguos)
+    for tabla in Base.metadata.sorted_tables:
+        for indice in tabla.indexes:
+            indice.create(engine, checkfirst=True)
+    if backfill:
+        session = SessionLocal()
+        total = reconstruir_recordatorios(session)
+        session.close()
+        print(f"[INFO] Recordatorios generados para {total} examen(es).")
 
 if __name__ == "__main__":
     print("Creando tablas en data.db...")
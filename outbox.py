@@ -0,0 +1,137 @@
+# outbox.py
+import uuid
+from datetime import datetime, date, timedelta, timezone
+from sqlalchemy import update, or_, and_, select, bindparam
+from sqlalchemy.dialects.sqlite import insert
+from models import Envio, Examen
+
+# ---------------- CONFIG ----------------
+LOTE_COMMIT = 100                      # envíos reclamados y marcados por commit
+RECLAMO_EXPIRA = timedelta(minutes=15) # un 'enviando' más viejo se considera de una corrida caída
+MAX_INTENTOS = 3                       # corridas que pueden reintentar un envío fallido
+
+
+def _ahora() -> datetime:
+    # UTC sin tzinfo, como se guarda en SQLite
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def nuevo_token() -> str:
+    """Identifica a una corrida del scheduler al reclamar envíos."""
+    return uuid.uuid4().hex
+
+
+def encolar(session, filas) -> int:
+    """
+    Inserta en bloque los envíos del día. Las filas ya encoladas (misma clave
+    examen_id/dias/fecha_local) se ignoran, así que repetir una corrida no duplica nada.
+    `filas`: dicts con examen_id, dias, fecha_local, telefono y cuerpo.
+    """
+    filas = list(filas)
+    if not filas:
+        return 0
+    stmt = insert(Envio.__table__).on_conflict_do_nothing(index_elements=["examen_id", "dias", "fecha_local"])
+    nuevos = 0
+    for i in range(0, len(filas), LOTE_COMMIT * 10):
+        nuevos += session.connection().execute(stmt, filas[i:i + LOTE_COMMIT * 10]).rowcount or 0
+    session.commit()
+    return nuevos
+
+
+def reclamar(session, fecha_local: date, token: str, ahora: datetime | None = None, shard=(0, 1),
+             limite: int | None = None):
+    """
+    Marca como 'enviando' (a nombre de `token`) hasta `limite` envíos del día: pendientes, los que
+    quedaron colgados de una corrida caída y los fallidos con intentos disponibles (salvo los que
+    falló esta misma corrida: esos esperan a la siguiente).
+    El UPDATE es atómico: dos corridas solapadas nunca reclaman el mismo envío.
+    Con `shard` (indice, total) solo se reclaman envíos de usuarios de ese shard.
+    """
+    ahora = ahora or _ahora()
+    reclamables = or_(
+        Envio.estado == "pendiente",
+        and_(Envio.estado == "enviando", Envio.reclamado_en < ahora - RECLAMO_EXPIRA),
+        and_(Envio.estado == "fallido", Envio.intentos < MAX_INTENTOS, Envio.reclamado_por != token),
+    )
+    condiciones = [Envio.fecha_local == fecha_local, reclamables]
+    indice, total = shard
+    if total > 1:
+        condiciones.append(Envio.examen_id.in_(
+            select(Examen.id).where(Examen.usuario_id % total == indice)
+        ))
+    if limite is not None:
+        condiciones = [Envio.id.in_(select(Envio.id).where(*condiciones).order_by(Envio.id).limit(limite))]
+    session.execute(
+        update(Envio)
+        .where(*condiciones)
+        .values(estado="enviando", reclamado_por=token, reclamado_en=ahora)
+    )
+    session.commit()
+    return (
+        session.query(Envio)
+        .filter(Envio.fecha_local == fecha_local, Envio.estado == "enviando", Envio.reclamado_por == token)
+        .order_by(Envio.id)
+        .all()
+    )
+
+
+_MARCAR = (
+    update(Envio.__table__)
+    .where(Envio.id == bindparam("b_id"), Envio.estado == "enviando", Envio.reclamado_por == bindparam("b_token"))
+    .values(estado=bindparam("b_estado"), sid=bindparam("b_sid"), error=bindparam("b_error"),
+            intentos=bindparam("b_intentos"), enviado_en=bindparam("b_enviado_en"))
+)
+
+
+def marcar(session, resultados, token: str, ahora: datetime | None = None):
+    """
+    Guarda el resultado de un lote de envíos en un solo commit. Solo toca los envíos que siguen
+    reclamados por `token`: si otra corrida los retomó, el resultado de esa corrida manda.
+    Devuelve cuántos se marcaron.
+    """
+    ahora = ahora or _ahora()
+    filas = []
+    for r in resultados:
+        enviado = r["estado"] in ("enviado", "simulado")
+        filas.append({
+            "b_id": r["envio_id"],
+            "b_token": token,
+            "b_estado": "enviado" if enviado else "fallido",
+            "b_sid": r.get("sid"),
+            "b_error": (r.get("error") or "")[:255] or None,
+            "b_intentos": r["intentos_previos"] + 1,
+            "b_enviado_en": ahora if enviado else None,
+        })
+    if not filas:
+        return 0
+    marcados = session.connection().execute(_MARCAR, filas).rowcount
+    session.commit()
+    if marcados != len(filas):
+        print(f"[WARN] Outbox: {len(filas) - marcados} envío(s) ya no eran de esta corrida; no se marcaron.")
+    return marcados
+
+
+def procesar(session, despachador, fecha_local: date, token: str | None = None, lote: int = LOTE_COMMIT,
+             shard=(0, 1), renovar=None):
+    """
+    Reclama los envíos del día de a `lote`, los despacha y marca cada lote en un commit, hasta que
+    no quede nada reclamable. Reclamar por lotes mantiene cada reclamo muy por debajo de
+    RECLAMO_EXPIRA aunque el día tenga miles de envíos, así otra corrida no los retoma a mitad.
+    Si el proceso muere, lo ya marcado no se reenvía y el resto se retoma.
+    `renovar()`, si se pasa, se llama tras cada lote (lease del shard); si devuelve False se para.
+    """
+    token = token or nuevo_token()
+    resultados = []
+    while True:
+        mensajes = [
+            {"to": e.telefono, "body": e.cuerpo, "envio_id": e.id, "intentos_previos": e.intentos}
+            for e in reclamar(session, fecha_local, token, shard=shard, limite=lote)
+        ]
+        if not mensajes:
+            return resultados
+        buffer = list(despachador.enviar_iter(mensajes))
+        marcar(session, buffer, token)
+        resultados.extend(buffer)
+        if renovar is not None and not renovar():
+            print("[WARN] Outbox: se perdió el lease del shard; lo pendiente queda para su nuevo titular.")
+            return resultados
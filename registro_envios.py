@@ -0,0 +1,98 @@
+# registro_envios.py
+# Registro de recordatorios ya enviados por app.py (reemplaza a sent_log.json, que se cargaba y
+# reescribía entero en cada corrida y crecía para siempre).
+#   sent_log/<fecha del examen>.log  -> una línea "nombre|curso|día de envío" por recordatorio
+# Un archivo por fecha de examen: cuando el examen ya pasó se borra el archivo entero, así que lo
+# que se guarda depende de los exámenes pendientes y no de cuántos meses lleva el bot corriendo.
+# Marcar es añadir una línea; consultar es buscar en un set en memoria, que solo lee del archivo
+# lo que otro proceso haya añadido desde la última vez.
+import json
+from datetime import date
+from pathlib import Path
+
+# ---------------- CONFIG ----------------
+DIRECTORIO_DEFAULT = Path("sent_log")
+LEGADO_DEFAULT = Path("sent_log.json")  # formato anterior: {"nombre|curso|fecha|hoy": true}
+
+
+class RegistroEnvios:
+    def __init__(self, directorio=DIRECTORIO_DEFAULT, legado=LEGADO_DEFAULT):
+        self.directorio = Path(directorio)
+        self._particiones = {}  # fecha examen -> (bytes leídos, set de "nombre|curso|hoy")
+        if not self.directorio.exists():
+            self.directorio.mkdir(parents=True)
+            if legado is not None and Path(legado).exists():
+                self._importar_legado(Path(legado))
+
+    def ya_enviado(self, nombre, curso, fecha_examen, hoy: date) -> bool:
+        return f"{nombre}|{curso}|{hoy.isoformat()}" in self._particion(str(fecha_examen))
+
+    def marcar(self, nombre, curso, fecha_examen, hoy: date):
+        clave = f"{nombre}|{curso}|{hoy.isoformat()}"
+        fecha = str(fecha_examen)
+        claves = self._particion(fecha)
+        if clave in claves:
+            return
+        linea = (clave + "\n").encode("utf-8")
+        with open(self._ruta(fecha), "ab") as f:
+            f.write(linea)
+        leidos, _ = self._particiones[fecha]
+        self._particiones[fecha] = (leidos + len(linea), claves)
+        claves.add(clave)
+
+    def podar(self, hoy: date) -> int:
+        """Borra las particiones de exámenes anteriores a `hoy`. Devuelve cuántas borró."""
+        borradas = 0
+        for ruta in self.directorio.glob("*.log"):
+            if ruta.stem < hoy.isoformat():  # fechas ISO: el orden de texto es el de las fechas
+                ruta.unlink(missing_ok=True)
+                self._particiones.pop(ruta.stem, None)
+                borradas += 1
+        return borradas
+
+    def __len__(self):
+        return sum(len(claves) for _, claves in self._particiones.values())
+
+    def _ruta(self, fecha: str) -> Path:
+        return self.directorio / f"{fecha}.log"
+
+    def _particion(self, fecha: str) -> set:
+        """Set de la partición, leyendo solo lo añadido al archivo desde la última lectura."""
+        leidos, claves = self._particiones.get(fecha, (0, None))
+        if claves is None:
+            claves = set()
+        ruta = self._ruta(fecha)
+        try:
+            tamano = ruta.stat().st_size
+        except FileNotFoundError:
+            tamano = 0
+        if tamano < leidos:  # lo borró podar() de otro proceso
+            leidos, claves = 0, set()
+        if tamano > leidos:
+            with open(ruta, "rb") as f:
+                f.seek(leidos)
+                nuevo = f.read()
+            completo = nuevo[:nuevo.rfind(b"\n") + 1]  # una línea a medio escribir se lee la próxima vez
+            claves.update(completo.decode("utf-8").splitlines())
+            leidos += len(completo)
+        self._particiones[fecha] = (leidos, claves)
+        return claves
+
+    def _importar_legado(self, legado: Path):
+        try:
+            with open(legado, "r", encoding="utf-8") as f:
+                viejo = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[WARN] No se pudo importar {legado}: {e}")
+            return
+        por_fecha = {}
+        for clave in viejo:
+            partes = clave.split("|")
+            if len(partes) != 4:
+                continue
+            nombre, curso, fecha_examen, hoy = partes
+            por_fecha.setdefault(fecha_examen, []).append(f"{nombre}|{curso}|{hoy}")
+        for fecha, claves in por_fecha.items():
+            with open(self._ruta(fecha), "ab") as f:
+                f.write("".join(c + "\n" for c in claves).encode("utf-8"))
+        print(f"[INFO] {len(viejo)} envíos importados de {legado} a {self.directorio}/")
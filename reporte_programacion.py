@@ -1,9 +1,8 @@
-import json
 from datetime import datetime, timedelta
+from diario_datos import cargar
 
-# Cargar datos de estudiantes y exámenes
-with open("data.json", "r", encoding="utf-8") as f:
-    estudiantes = json.load(f)
+# Cargar datos de estudiantes y exámenes (data.json con los cambios de su diario)
+estudiantes = cargar("data.json")
 
 hoy = datetime.today().date()
 dias_a_simular = 30  # Próximos 30 días
@@ -2,16 +2,23 @@
 import os
 import argparse
 import random
-from datetime import datetime, date, timezone
+import time
+from datetime import datetime, date, timedelta, timezone
 import pytz
 from dotenv import load_dotenv
-from twilio.rest import Client
-from models import SessionLocal, Usuario, Examen, init_db
+from sqlalchemy import or_, and_, false
+from models import SessionLocal, Usuario, Examen, Recordatorio, init_db, parse_fecha, condicion_aviso_sql
+import outbox
+import leases
+from despachador import Despachador, crear_cliente, resumen, MPS_DEFAULT, WORKERS_DEFAULT
 
 # ---------------- CONFIG ----------------
 DRY_RUN_DEFAULT = True
-AVISOS_DEFAULT = [30, 20, 10, 5]
 TWILIO_FROM_DEFAULT = "whatsapp:+14155238886"
+HORA_ENVIO = 8  # hora local en la que se envían los recordatorios
+TZ_DEFAULT = "America/Lima"
+DAEMON_MAX_SLEEP = 15 * 60  # el daemon revisa zonas nuevas al menos cada 15 min
+DAEMON_REINTENTO = 60       # tras un tick fallido, reintenta dentro de la misma hora de envío
 
 CITAS = [
     "El éxito es la suma de pequeños esfuerzos repetidos cada día. – Robert Collier",
@@ -20,27 +27,102 @@ CITAS = [
     "No dejes que el tiempo decida por ti, decide tú por el tiempo. – Anónimo"
 ]
 
-def parse_avisos(cadena: str | None):
-    if not cadena:
-        return []
-    return [int(x) for x in cadena.split(",") if x.strip().isdigit()]
+_ZONAS_CACHE = {}
 
-def enviar_whatsapp(client, to, body, dry_run: bool):
-    if dry_run:
-        print(f"[SIMULADO] -> {to}: {body}")
-        return "SIMULADO"
+def obtener_zona(nombre: str):
+    """pytz.timezone con caché: los objetos de zona se crean una sola vez por proceso."""
+    tz = _ZONAS_CACHE.get(nombre)
+    if tz is None:
+        tz = _ZONAS_CACHE[nombre] = pytz.timezone(nombre)
+    return tz
+
+def zona_canonica(valor):
+    """Valor de usuarios.timezone -> nombre IANA (vacío = TZ_DEFAULT). None si pytz no la conoce."""
+    nombre = (valor or "").strip() or TZ_DEFAULT
     try:
-        msg = client.messages.create(
-            from_=os.getenv("TWILIO_WHATSAPP_NUMBER", TWILIO_FROM_DEFAULT),
-            body=body,
-            to=to
-        )
-        print(f"[OK] Enviado a {to} (SID: {msg.sid})")
-        return msg.sid
-    except Exception as e:
-        print(f"[ERROR] Enviando a {to}: {e}")
+        return obtener_zona(nombre).zone  # pytz acepta 'america/lima' y devuelve 'America/Lima'
+    except pytz.UnknownTimeZoneError:
         return None
 
+_ZONAS_DESCONOCIDAS = set()
+
+def valores_por_zona(session):
+    """
+    {zona IANA: [valores tal como están guardados en usuarios.timezone]}, con un DISTINCT por el
+    índice. Las zonas desconocidas caen en TZ_DEFAULT (como NULL o vacío) y se avisa una vez.
+    """
+    grupos = {}
+    for (valor,) in session.query(Usuario.timezone).distinct():
+        zona = zona_canonica(valor)
+        if zona is None:
+            if valor not in _ZONAS_DESCONOCIDAS:
+                _ZONAS_DESCONOCIDAS.add(valor)
+                print(f"[WARN] Zona horaria desconocida '{valor}': esos usuarios reciben los avisos "
+                      f"a la hora de {TZ_DEFAULT}. Corrige usuarios.timezone.")
+            zona = TZ_DEFAULT
+        grupos.setdefault(zona, []).append(valor)
+    return grupos
+
+def condicion_valores(valores):
+    """usuarios.timezone IN (valores), con NULL incluido si está entre ellos."""
+    filtro = Usuario.timezone.in_([v for v in valores if v is not None])
+    if None in valores:
+        filtro = or_(filtro, Usuario.timezone.is_(None))
+    return filtro
+
+def dias_por_zona(session, now_utc: datetime, hoy: date | None = None, ignore_hour: bool = False,
+                  hora: int = HORA_ENVIO):
+    """
+    {fecha local: [valores de usuarios.timezone]} de las zonas registradas que están a la hora de
+    envío (todas con ignore_hour). La fecha es la local de cada zona; `hoy` la fija para todas (--sim).
+    """
+    por_fecha = {}
+    for zona, valores in valores_por_zona(session).items():
+        local = now_utc.astimezone(obtener_zona(zona))
+        if ignore_hour or local.hour == hora:
+            por_fecha.setdefault(hoy or local.date(), []).extend(valores)
+    return por_fecha
+
+def filtro_dia(por_fecha):
+    """Condición SQL sobre los índices de timezone y fecha_aviso: cada zona con su fecha local."""
+    if not por_fecha:
+        return false()
+    return or_(*(and_(Recordatorio.fecha_aviso == fecha, condicion_valores(valores))
+                 for fecha, valores in por_fecha.items()))
+
+def recordatorios_del_dia(session, hoy: date | None, now_utc: datetime, ignore_hour: bool, shard=(0, 1)):
+    """
+    Lo que toca enviar: una sola consulta por los índices de recordatorios.fecha_aviso y
+    usuarios.timezone. Cada usuario se evalúa en la fecha local de su zona (hoy=None, lo normal)
+    o en `hoy` si se fija, solo en las zonas a la hora de envío salvo ignore_hour y, si se pide,
+    por shard (usuarios con id % total == indice).
+    Devuelve tuplas (recordatorio, examen, usuario); recordatorio.fecha_aviso es la fecha local.
+    """
+    query = (
+        session.query(Recordatorio, Examen, Usuario)
+        .join(Recordatorio.examen)
+        .join(Examen.usuario)
+        .filter(filtro_dia(dias_por_zona(session, now_utc, hoy, ignore_hour)))
+    )
+    indice, total = shard
+    if total > 1:
+        query = query.filter(Usuario.id % total == indice)
+    return query.order_by(Usuario.id, Examen.id).all()
+
+def verificar_recordatorios(session, hoy: date):
+    """
+    Compara la tabla recordatorios con el cálculo directo en SQL (máscaras de avisos) para `hoy`.
+    Devuelve (faltantes, sobrantes): ids de examen que deberían tener aviso y no lo tienen, y al revés.
+    """
+    esperados = {i for (i,) in session.query(Examen.id).join(Examen.usuario).filter(condicion_aviso_sql(hoy))}
+    materializados = {i for (i,) in session.query(Recordatorio.examen_id).filter(Recordatorio.fecha_aviso == hoy)}
+    return sorted(esperados - materializados), sorted(materializados - esperados)
+
+def enviar_whatsapp(client, to, body, dry_run: bool):
+    """Envío individual; los lotes del scheduler pasan por Despachador.enviar."""
+    resultado = Despachador(client, dry_run=dry_run, workers=1).enviar([{"to": to, "body": body}])[0]
+    return resultado["sid"]
+
 def generar_mensajes_recordatorio(examenes, dias_faltantes, hoy: date | None = None):
     if hoy is None:
         hoy = date.today()
@@ -48,7 +130,7 @@ def generar_mensajes_recordatorio(examenes, dias_faltantes, hoy: date | None = N
     mensajes = []
     for ex in examenes:
         try:
-            fecha_examen = datetime.strptime(ex["fecha"], "%Y-%m-%d").date()
+            fecha_examen = parse_fecha(ex["fecha"])
         except ValueError:
             continue
         dias_restantes = (fecha_examen - hoy).days
@@ -61,80 +143,248 @@ def generar_mensajes_recordatorio(examenes, dias_faltantes, hoy: date | None = N
             )
     return mensajes
 
-def run_once(hoy: date, dry_run: bool, ignore_hour: bool):
-    init_db()
-    session = SessionLocal()
-
+def preparar_despachador(dry_run: bool, mps: float = MPS_DEFAULT, workers: int = WORKERS_DEFAULT):
+    """Carga .env y crea el cliente Twilio una vez; None si faltan credenciales para enviar."""
     load_dotenv()
-    account_sid = os.getenv("TWILIO_ACCOUNT_SID")
-    auth_token = os.getenv("TWILIO_AUTH_TOKEN")
-
     client = None
     if not dry_run:
+        account_sid = os.getenv("TWILIO_ACCOUNT_SID")
+        auth_token = os.getenv("TWILIO_AUTH_TOKEN")
         if not account_sid or not auth_token:
             print("[ERROR] No hay credenciales Twilio en .env.")
+            return None
+        client = crear_cliente(account_sid, auth_token)
+    return Despachador(client, dry_run=dry_run, mps=mps, workers=workers)
+
+def procesar_tick(despachador, hoy: date | None, now_utc: datetime, ignore_hour: bool,
+                  shard=(0, 1), periodo: str | None = None):
+    """
+    Un tick del scheduler: busca lo que toca hoy y lo despacha (vía outbox si es envío real).
+    hoy=None usa la fecha local de cada zona (la clave del outbox es esa fecha local).
+    Los envíos reales toman antes el lease del shard para `periodo` (por defecto, la hora UTC),
+    así dos hosts, o el cron y un run_scheduler.bat manual, no trabajan el mismo shard a la vez.
+    """
+    dry_run = despachador.dry_run
+    session = SessionLocal()
+    lease, titular = leases.nombre_lease(*shard), leases.titular_actual()
+    if not dry_run:
+        periodo = periodo or f"{now_utc:%Y-%m-%dT%H}"
+        if not leases.adquirir(session, lease, periodo, titular):
+            print(f"[INFO] {lease} está en curso en otro proceso o ya se completó para {periodo}. Nada que hacer.")
+            session.close()
+            return []
+        conflicto = leases.shards_en_conflicto(session, lease)
+        if conflicto:
+            print(f"[WARN] {lease} se solapa con {', '.join(conflicto)} (otro TOTAL de shards). "
+                  f"Usa el mismo --shard INDICE/TOTAL en todos los hosts. Nada que hacer.")
+            leases.liberar(session, lease, titular)
             session.close()
-            return
-        client = Client(account_sid, auth_token)
+            return []
 
-    now_utc = datetime.now(timezone.utc)
-    total_enviados = 0
-    usuarios = session.query(Usuario).all()
+    try:
+        filas = []
+        for rec, ex, u in recordatorios_del_dia(session, hoy, now_utc, ignore_hour, shard):
+            cita = random.choice(CITAS)
+            body = (
+                f"📢 *Recordatorio de examen*\n\n"
+                f"Hola! Tu examen de *{ex.curso}* es en *{rec.dias}* día(s) "
+                f"(fecha: {ex.fecha}).\n\n"
+                f"Es un buen momento para organizar tu estudio. 💪\n"
+                f"Frase: {cita}"
+            )
+            filas.append({"examen_id": ex.id, "dias": rec.dias, "fecha_local": rec.fecha_aviso,
+                          "telefono": u.telefono, "cuerpo": body})
+
+        if dry_run:
+            # La simulación no toca el outbox: no debe marcar nada como enviado
+            resultados = despachador.enviar({"to": f["telefono"], "body": f["cuerpo"]} for f in filas)
+        else:
+            nuevos = outbox.encolar(session, filas)
+            print(f"[INFO] Outbox: {nuevos} envío(s) nuevo(s) encolado(s) de {len(filas)} recordatorio(s).")
+            # También las fechas sin envíos nuevos: pueden tener fallidos por reintentar
+            fechas = {f["fecha_local"] for f in filas} | set(dias_por_zona(session, now_utc, hoy, ignore_hour))
+            resultados, vigente = [], True
+
+            def renovar():
+                # Cada lote enviado extiende el lease: un envío largo no lo deja vencer a mitad
+                nonlocal vigente
+                vigente = leases.renovar(session, lease, titular)
+                return vigente
+
+            for fecha in sorted(fechas):
+                resultados += outbox.procesar(session, despachador, fecha, shard=shard, renovar=renovar)
+                if not vigente:
+                    break
+            else:
+                leases.completar(session, lease, titular)
+    except Exception:
+        if not dry_run:
+            session.rollback()
+            leases.liberar(session, lease, titular)
+        raise
+    finally:
+        session.close()
+
+    conteo = resumen(resultados)
+    total_enviados = conteo.get("simulado", 0) + conteo.get("enviado", 0)
+    for r in resultados:
+        if r["estado"] == "fallido":
+            print(f"[WARN] No enviado a {r['to']} tras {r['intentos']} intento(s): {r['error']}")
+    print(f"[INFO] Proceso terminado. Mensajes {'simulados' if dry_run else 'reales'} enviados: {total_enviados}"
+          f" | fallidos: {conteo.get('fallido', 0)}")
+    return resultados
+
+def run_once(hoy: date | None, dry_run: bool, ignore_hour: bool,
+             mps: float = MPS_DEFAULT, workers: int = WORKERS_DEFAULT, shard=(0, 1)):
+    init_db()
+    despachador = preparar_despachador(dry_run, mps, workers)
+    if despachador is None:
+        return
+    return procesar_tick(despachador, hoy, datetime.now(timezone.utc), ignore_hour, shard=shard)
 
-    for u in usuarios:
-        avisos_globales = parse_avisos(u.avisos_globales) or AVISOS_DEFAULT
-        tz = pytz.timezone(u.timezone or "America/Lima")
-        fecha_actual_usuario = hoy
+# ---------------- Daemon ----------------
+def proxima_hora_envio(now_utc: datetime, zonas, hora: int = HORA_ENVIO):
+    """
+    Próximo instante UTC (estrictamente después de now_utc) en que alguna de `zonas`
+    llega a las `hora`:00 locales. None si no hay zonas.
+    """
+    proximo = None
+    for nombre in zonas:
+        tz = obtener_zona(nombre)
+        local = now_utc.astimezone(tz).replace(tzinfo=None)
+        objetivo = local.replace(hour=hora, minute=0, second=0, microsecond=0)
+        if objetivo <= local:
+            objetivo += timedelta(days=1)
+        instante = tz.localize(objetivo).astimezone(timezone.utc)
+        if proximo is None or instante < proximo:
+            proximo = instante
+    return proximo
 
-        # Chequeo de hora local 08:00
-        if not ignore_hour:
-            hora_local = now_utc.astimezone(tz).hour
-            if hora_local != 8:
-                continue
+def zonas_registradas(session):
+    """Zonas horarias (IANA) de los usuarios registrados (usa el índice de timezone)."""
+    return set(valores_por_zona(session))
 
-        for ex in u.examenes:
+def run_daemon(dry_run: bool, mps: float = MPS_DEFAULT, workers: int = WORKERS_DEFAULT, shard=(0, 1)):
+    """
+    Proceso de larga duración: init_db, .env, cliente Twilio (y su sesión HTTP) y las zonas
+    horarias se preparan una sola vez. Entre ticks duerme hasta la próxima frontera en que
+    alguna zona con usuarios llega a la hora de envío.
+    """
+    init_db()
+    despachador = preparar_despachador(dry_run, mps, workers)
+    if despachador is None:
+        return
+    print(f"[INFO] Daemon iniciado. DRY_RUN={dry_run}")
+
+    # Primer tick inmediato (por si arrancamos justo dentro de la hora de envío de alguna zona)
+    siguiente = datetime.now(timezone.utc)
+    try:
+        while True:
+            espera = (siguiente - datetime.now(timezone.utc)).total_seconds()
+            if espera > 0:
+                time.sleep(min(espera, DAEMON_MAX_SLEEP))
+                if espera > DAEMON_MAX_SLEEP:
+                    # Revisar si apareció una zona nueva con una frontera más cercana
+                    session = SessionLocal()
+                    try:
+                        nueva = proxima_hora_envio(datetime.now(timezone.utc), zonas_registradas(session))
+                    except Exception as e:
+                        print(f"[WARN] No se pudieron revisar las zonas registradas: {e}")
+                        nueva = None
+                    finally:
+                        session.close()
+                    if nueva is not None and nueva < siguiente:
+                        siguiente = nueva
+                    continue
+
+            inicio = time.perf_counter()
+            now_utc = datetime.now(timezone.utc)
             try:
-                fecha_examen = datetime.strptime(ex.fecha, "%Y-%m-%d").date()
-            except ValueError:
-                print(f"[WARN] Fecha inválida para {u.telefono} - {ex.curso}: {ex.fecha}")
-                continue
-
-            dias_restantes = (fecha_examen - fecha_actual_usuario).days
-            if dias_restantes < 0:
-                continue
-
-            avisos_locales = parse_avisos(ex.avisos)
-            avisos = avisos_locales or avisos_globales
-
-            if dias_restantes in avisos:
-                cita = random.choice(CITAS)
-                body = (
-                    f"📢 *Recordatorio de examen*\n\n"
-                    f"Hola! Tu examen de *{ex.curso}* es en *{dias_restantes}* día(s) "
-                    f"(fecha: {ex.fecha}).\n\n"
-                    f"Es un buen momento para organizar tu estudio. 💪\n"
-                    f"Frase: {cita}"
-                )
-                enviar_whatsapp(client, u.telefono, body, dry_run)
-                total_enviados += 1
-
-    session.close()
-    print(f"[INFO] Proceso terminado. Mensajes {'simulados' if dry_run else 'reales'} enviados: {total_enviados}")
+                # Periodo por minuto: zonas de media hora (p. ej. Asia/Kolkata) tienen su propio tick
+                procesar_tick(despachador, None, now_utc, ignore_hour=False,
+                              shard=shard, periodo=f"{now_utc:%Y-%m-%dT%H:%M}")
+                print(f"[INFO] Tick {now_utc:%Y-%m-%d %H:%M} UTC completado en {time.perf_counter() - inicio:.2f}s")
+
+                session = SessionLocal()
+                try:
+                    siguiente = proxima_hora_envio(now_utc, zonas_registradas(session))
+                finally:
+                    session.close()
+                if siguiente is None:
+                    siguiente = now_utc + timedelta(seconds=DAEMON_MAX_SLEEP)
+            except Exception as e:
+                # "database is locked", un error de Twilio... no deben tumbar el daemon. El lease se
+                # liberó, así que el reintento (aún dentro de la hora de envío) retoma lo pendiente.
+                print(f"[ERROR] Tick {now_utc:%Y-%m-%d %H:%M} UTC falló: {type(e).__name__}: {e}")
+                siguiente = now_utc + timedelta(seconds=DAEMON_REINTENTO)
+            print(f"[INFO] Próximo tick: {siguiente:%Y-%m-%d %H:%M} UTC")
+    except KeyboardInterrupt:
+        print("[INFO] Daemon detenido.")
 
 def main():
     parser = argparse.ArgumentParser(description="Scheduler de recordatorios académicos.")
     parser.add_argument("--sim", help="Fecha simulada (YYYY-MM-DD).", default=None)
+    parser.add_argument("--sim-range", nargs=2, metavar=("INICIO", "FIN"), default=None,
+                        help="Simular todos los recordatorios entre dos fechas (YYYY-MM-DD), sin enviar.")
+    parser.add_argument("--mensajes", action="store_true", help="Con --sim-range, listar cada mensaje por día.")
     parser.add_argument("--send", action="store_true", help="Enviar realmente por Twilio.")
     parser.add_argument("--ignore-hour", action="store_true", help="Ignorar el filtro de hora local 08:00.")
+    parser.add_argument("--mps", type=float, default=float(os.getenv("TWILIO_MPS", MPS_DEFAULT)),
+                        help=f"Mensajes por segundo permitidos por el proveedor (default {MPS_DEFAULT}).")
+    parser.add_argument("--workers", type=int, default=WORKERS_DEFAULT,
+                        help=f"Envíos simultáneos (default {WORKERS_DEFAULT}).")
+    parser.add_argument("--shard", default=None, metavar="INDICE/TOTAL",
+                        help="Procesar solo los usuarios con id %% TOTAL == INDICE (ej: 3/8).")
+    parser.add_argument("--daemon", action="store_true",
+                        help="Mantener el proceso vivo y despertar en cada frontera de hora de envío.")
+    parser.add_argument("--verificar", action="store_true",
+                        help="Comparar la tabla recordatorios con el cálculo en SQL para la fecha (hoy o --sim).")
     args = parser.parse_args()
+    if args.daemon and (args.sim or args.ignore_hour):
+        parser.error("--daemon no se combina con --sim ni --ignore-hour.")
+    try:
+        shard = leases.parse_shard(args.shard)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.sim_range:
+        # Import diferido: numpy solo se carga para simulaciones, no en cada tick horario
+        from simulacion_rango import cargar_examenes, imprimir_simulacion
+        inicio, fin = (datetime.strptime(f, "%Y-%m-%d").date() for f in args.sim_range)
+        init_db()
+        session = SessionLocal()
+        filas = cargar_examenes(session)
+        session.close()
+        imprimir_simulacion(filas, inicio, fin, mostrar_mensajes=args.mensajes)
+        return
 
-    hoy = date.today()
+    hoy = None  # fecha local de cada zona
     if args.sim:
         hoy = datetime.strptime(args.sim, "%Y-%m-%d").date()
 
+    if args.verificar:
+        hoy = hoy or date.today()
+        init_db()
+        session = SessionLocal()
+        faltantes, sobrantes = verificar_recordatorios(session, hoy)
+        session.close()
+        if not faltantes and not sobrantes:
+            print(f"[INFO] Recordatorios consistentes para {hoy}.")
+        if faltantes:
+            print(f"[WARN] Exámenes con aviso el {hoy} sin recordatorio materializado: {faltantes}")
+        if sobrantes:
+            print(f"[WARN] Recordatorios del {hoy} que ya no corresponden: {sobrantes}")
+        return
+
     dry_run = not args.send
-    print(f"[INFO] Ejecutando scheduler. Hoy={hoy}  DRY_RUN={dry_run}  IGNORE_HOUR={args.ignore_hour}")
-    run_once(hoy, dry_run, args.ignore_hour)
+    if args.daemon:
+        run_daemon(dry_run, mps=args.mps, workers=args.workers, shard=shard)
+        return
+
+    print(f"[INFO] Ejecutando scheduler. Hoy={hoy or 'fecha local de cada zona'}  DRY_RUN={dry_run}"
+          f"  IGNORE_HOUR={args.ignore_hour}"
+          f"  SHARD={shard[0]}/{shard[1]}")
+    run_once(hoy, dry_run, args.ignore_hour, mps=args.mps, workers=args.workers, shard=shard)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,81 @@
+# simulacion_rango.py
+from datetime import date
+import numpy as np
+from models import Usuario, Examen
+from avisos import MIN_DIA, MAX_DIA, MASCARA_DEFAULT
+
+
+def cargar_examenes(session):
+    """Una sola consulta con lo necesario para simular: sin objetos ORM ni lazy loads."""
+    return (
+        session.query(Usuario.telefono, Usuario.avisos_globales_mask, Examen.curso, Examen.fecha, Examen.avisos_mask)
+        .join(Examen.usuario)
+        .order_by(Examen.id)
+        .all()
+    )
+
+
+def _fechas_a_array(fechas):
+    """Convierte date (o 'YYYY-MM-DD') a datetime64[D]; las fechas inválidas quedan como NaT."""
+    try:
+        return np.array(fechas, dtype="datetime64[D]")
+    except ValueError:
+        salida = np.empty(len(fechas), dtype="datetime64[D]")
+        for i, f in enumerate(fechas):
+            try:
+                salida[i] = np.datetime64(f if isinstance(f, date) else date.fromisoformat(f), "D")
+            except (TypeError, ValueError):
+                salida[i] = np.datetime64("NaT")
+        return salida
+
+
+def simular_rango(filas, inicio: date, fin: date):
+    """
+    Calcula de una vez todos los recordatorios entre `inicio` y `fin` (inclusive).
+    `filas`: tuplas (telefono, avisos_globales_mask, curso, fecha, avisos_mask) como las de cargar_examenes.
+
+    Devuelve (dias, conteos, eventos):
+      - dias: array datetime64[D] con cada día del rango
+      - conteos: recordatorios por día
+      - eventos: (indice_dia, indice_fila, dias_restantes) ordenados por día
+    """
+    inicio64, fin64 = np.datetime64(inicio, "D"), np.datetime64(fin, "D")
+    n_dias = int((fin64 - inicio64).astype(int)) + 1
+    dias = inicio64 + np.arange(max(n_dias, 0))
+    if n_dias <= 0 or not filas:
+        vacio = np.empty(0, dtype=np.int64)
+        return dias, np.zeros(len(dias), dtype=np.int64), (vacio, vacio, vacio)
+
+    telefonos, globales, cursos, fechas, avisos = zip(*filas)
+    fechas64 = _fechas_a_array(list(fechas))
+
+    # Máscara efectiva por examen y expansión de bits: una fila por (examen, aviso)
+    locales = np.asarray(avisos, dtype=np.int64)
+    glob = np.asarray(globales, dtype=np.int64)
+    mascaras = np.where(locales != 0, locales, np.where(glob != 0, glob, MASCARA_DEFAULT))
+    bits = (mascaras[:, None] >> np.arange(MAX_DIA - MIN_DIA + 1)) & 1
+    filas_idx, bit = np.nonzero(bits)
+    offsets = bit.astype(np.int64) + MIN_DIA
+    fecha_aviso = fechas64[filas_idx] - offsets.astype("timedelta64[D]")
+
+    validos = ~np.isnat(fecha_aviso) & (fecha_aviso >= inicio64) & (fecha_aviso <= fin64)
+    dia_idx = (fecha_aviso[validos] - inicio64).astype(np.int64)
+    filas_idx, offsets = filas_idx[validos], offsets[validos]
+
+    orden = np.argsort(dia_idx, kind="stable")
+    conteos = np.bincount(dia_idx, minlength=n_dias)
+    return dias, conteos, (dia_idx[orden], filas_idx[orden], offsets[orden])
+
+
+def imprimir_simulacion(filas, inicio: date, fin: date, mostrar_mensajes: bool = False):
+    dias, conteos, (dia_idx, filas_idx, restantes) = simular_rango(filas, inicio, fin)
+    print(f"=== Simulación de recordatorios del {inicio} al {fin} ({len(filas)} examen(es)) ===")
+    for d, (dia, conteo) in enumerate(zip(dias, conteos)):
+        print(f"{dia}: {conteo} recordatorio(s)")
+        if mostrar_mensajes and conteo:
+            desde, hasta = np.searchsorted(dia_idx, [d, d + 1])
+            for i, restante in zip(filas_idx[desde:hasta], restantes[desde:hasta]):
+                telefono, _, curso, fecha, _ = filas[i]
+                print(f"   -> {telefono}: {curso} en {restante} día(s) (fecha: {fecha})")
+    print(f"[INFO] Total de recordatorios en el rango: {int(conteos.sum())}")
+    return dias, conteos
@@ -0,0 +1,311 @@
+# sincronizar_json.py
+# Pasa estudiantes entre data.json (app.py, gestor_avisos.py) y data.db (scheduler.py, webhook).
+#   importar: lee data.json de a un estudiante (json.JSONDecoder.raw_decode sobre bloques del
+#             archivo, nunca json.load del archivo entero), normaliza teléfonos y avisos y hace
+#             upsert de Usuario/Examen (y sus Recordatorio) por lotes de inserts en bloque.
+#   exportar: escribe data.json desde la base, un usuario por línea, en un temporal + os.replace().
+# La memoria depende del tamaño del lote, no del archivo. Los cambios pendientes del diario de
+# data.json (diario_datos.py) se aplican al vuelo al importar.
+import argparse
+import json
+import os
+import time
+from datetime import timedelta
+from pathlib import Path
+from sqlalchemy import select, update, delete
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import selectinload
+from models import SessionLocal, Usuario, Examen, Recordatorio, parse_fecha, init_db
+from avisos import a_mascara, de_mascara, mascara_efectiva, normalizar_avisos, MASCARA_DEFAULT
+from mantenimiento import normalizar_telefono
+from diario_datos import DiarioDatos
+
+# ---------------- CONFIG ----------------
+DATA_PATH = Path("data.json")
+LOTE_DEFAULT = 500             # estudiantes por transacción
+BLOQUE_LECTURA = 1 << 20       # caracteres leídos de data.json por vez
+AVISOS_JSON_DEFAULT = [30, 10, 5]  # lo que usan app.py y gestor_avisos.py si no hay avisos válidos
+
+
+# ---------------- LECTURA EN STREAMING ----------------
+def leer_estudiantes(ruta, bloque=BLOQUE_LECTURA):
+    """Genera los elementos de la lista JSON de `ruta` de a uno, leyendo el archivo por bloques."""
+    decodificador = json.JSONDecoder()
+    with open(ruta, "r", encoding="utf-8") as f:
+        buf, pos, fin_archivo = "", 0, False
+        esperado = "["
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            if pos == len(buf):
+                if fin_archivo:
+                    raise ValueError(f"{ruta}: el archivo termina antes de cerrar la lista")
+                buf, pos = f.read(bloque), 0
+                fin_archivo = not buf
+                continue
+            c = buf[pos]
+            if esperado == "[":
+                if c != "[":
+                    raise ValueError(f"{ruta}: se esperaba una lista de estudiantes")
+                pos, esperado = pos + 1, "valor o ]"
+            elif c == "]" and esperado in ("valor o ]", ","):
+                return
+            elif c == "," and esperado == ",":
+                pos, esperado = pos + 1, "valor"
+            elif esperado in ("valor", "valor o ]"):
+                try:
+                    valor, pos = decodificador.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if fin_archivo:
+                        raise
+                    # El estudiante quedó cortado al final del bloque: se junta con el siguiente.
+                    mas = f.read(bloque)
+                    fin_archivo = not mas
+                    buf, pos = buf[pos:] + mas, 0
+                    continue
+                esperado = ","
+                yield valor
+            else:
+                raise ValueError(f"{ruta}: se esperaba {esperado!r} y hay {c!r}")
+
+
+def leer_datos(ruta=DATA_PATH, bloque=BLOQUE_LECTURA):
+    """Como leer_estudiantes, con los cambios pendientes del diario de data.json aplicados."""
+    pendientes = {}
+    for cambio in DiarioDatos(ruta).cambios():
+        pendientes[cambio["nombre"]] = cambio["estudiante"]
+    if Path(ruta).exists():
+        for st in leer_estudiantes(ruta, bloque):
+            nombre = st.get("nombre")
+            if nombre in pendientes:
+                st = pendientes.pop(nombre)
+                if st is None:
+                    continue
+            yield st
+    for st in pendientes.values():  # estudiantes que solo están en el diario
+        if st is not None:
+            yield st
+
+
+def _lotes(iterable, n):
+    lote = []
+    for x in iterable:
+        lote.append(x)
+        if len(lote) >= n:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+# ---------------- NORMALIZACIÓN ----------------
+def normalizar_estudiante(st):
+    """
+    Estudiante de data.json -> (telefono, usar_globales, mascara_globales, {curso: (fecha, mascara)}).
+    Respeta la regla de app.py: con usar_globales mandan los globales; si no, los avisos de cada
+    examen (mascara 0 en la base = usar los del usuario). Lanza ValueError si falta el teléfono.
+    """
+    telefono = "".join(str(st.get("telefono") or "").split())
+    if not telefono:
+        raise ValueError("sin teléfono")
+    telefono = normalizar_telefono(telefono)
+    usar_globales = bool(st.get("usar_globales", False))
+    globales = a_mascara(normalizar_avisos(st.get("avisos_globales"), AVISOS_JSON_DEFAULT))
+    examenes = {}
+    for ex in st.get("examenes") or []:
+        fecha = parse_fecha(ex["fecha"])
+        mascara = 0 if usar_globales else a_mascara(normalizar_avisos(ex.get("avisos"), AVISOS_JSON_DEFAULT))
+        examenes[str(ex["curso"]).strip()] = (fecha, mascara)
+    return telefono, usar_globales, globales, examenes
+
+
+# ---------------- IMPORTAR ----------------
+def importar(ruta=DATA_PATH, sesiones=SessionLocal, lote=LOTE_DEFAULT, bloque=BLOQUE_LECTURA):
+    """
+    Upsert de data.json en la base, `lote` estudiantes por transacción.
+    Devuelve {"estudiantes", "omitidos", "usuarios", "examenes", "recordatorios", "segundos"}.
+    """
+    stats = {"estudiantes": 0, "omitidos": 0, "usuarios": 0, "examenes": 0, "recordatorios": 0}
+    inicio = time.perf_counter()
+    for n_lote, estudiantes in enumerate(_lotes(leer_datos(ruta, bloque), lote), 1):
+        t0 = time.perf_counter()
+        por_telefono = {}
+        for st in estudiantes:
+            stats["estudiantes"] += 1
+            try:
+                telefono, usar_globales, globales, examenes = normalizar_estudiante(st)
+            except (KeyError, ValueError) as e:
+                stats["omitidos"] += 1
+                print(f"[WARN] Estudiante '{st.get('nombre')}' omitido: {e}")
+                continue
+            previo = por_telefono.get(telefono)
+            if previo is not None:  # mismo número dos veces en el lote: se juntan sus exámenes
+                examenes = {**previo[2], **examenes}
+            por_telefono[telefono] = (usar_globales, globales, examenes)
+
+        session = sesiones()
+        try:
+            filas = _importar_lote(session, por_telefono)
+            session.commit()
+        finally:
+            session.close()
+        for clave, n in filas.items():
+            stats[clave] += n
+        segundos = time.perf_counter() - t0
+        escritas = sum(filas.values())
+        print(f"[INFO] lote {n_lote}: {len(estudiantes)} estudiantes, {escritas} filas "
+              f"({escritas / segundos:.0f} filas/s)")
+    stats["segundos"] = time.perf_counter() - inicio
+    return stats
+
+
+def _importar_lote(session, por_telefono):
+    if not por_telefono:
+        return {"usuarios": 0, "examenes": 0, "recordatorios": 0}
+    # Usuarios: INSERT ... ON CONFLICT(telefono) DO UPDATE, todos en un executemany.
+    sentencia = insert(Usuario)
+    sentencia = sentencia.on_conflict_do_update(
+        index_elements=[Usuario.telefono],
+        set_={"usar_globales": sentencia.excluded.usar_globales,
+              "avisos_globales_mask": sentencia.excluded.avisos_globales_mask},
+    )
+    session.execute(sentencia, [
+        {"telefono": telefono, "usar_globales": usar_globales, "avisos_globales_mask": globales}
+        for telefono, (usar_globales, globales, _) in por_telefono.items()
+    ])
+    ids = dict(session.execute(
+        select(Usuario.telefono, Usuario.id).where(Usuario.telefono.in_(list(por_telefono)))
+    ).all())
+
+    # Exámenes: (usuario, curso) que ya existe -> UPDATE por id; si no, INSERT.
+    existentes = {}
+    for ex_id, usuario_id, curso in session.execute(
+        select(Examen.id, Examen.usuario_id, Examen.curso)
+        .where(Examen.usuario_id.in_(list(ids.values()))).order_by(Examen.id)
+    ):
+        existentes.setdefault((usuario_id, curso), ex_id)
+    nuevos, cambios = [], []
+    for telefono, (_, _, examenes) in por_telefono.items():
+        usuario_id = ids[telefono]
+        for curso, (fecha, mascara) in examenes.items():
+            ex_id = existentes.get((usuario_id, curso))
+            if ex_id is None:
+                nuevos.append({"usuario_id": usuario_id, "curso": curso, "fecha": fecha, "avisos_mask": mascara})
+            else:
+                cambios.append({"id": ex_id, "fecha": fecha, "avisos_mask": mascara})
+    if nuevos:
+        session.execute(insert(Examen), nuevos)
+    if cambios:
+        session.execute(update(Examen), cambios)  # UPDATE ... WHERE id = :id en executemany
+
+    # Recordatorios: los inserts en bloque no pasan por el before_flush de models.py, así que se
+    # rehacen aquí para todos los exámenes de estos usuarios (los globales pueden haber cambiado).
+    mascaras_usuario = {ids[t]: globales for t, (_, globales, _) in por_telefono.items()}
+    examenes_db = session.execute(
+        select(Examen.id, Examen.usuario_id, Examen.fecha, Examen.avisos_mask)
+        .where(Examen.usuario_id.in_(list(ids.values())))
+    ).all()
+    session.execute(delete(Recordatorio).where(Recordatorio.examen_id.in_([e.id for e in examenes_db])))
+    recordatorios = [
+        {"examen_id": e.id, "fecha_aviso": e.fecha - timedelta(days=d), "dias": d}
+        for e in examenes_db
+        for d in de_mascara(mascara_efectiva(e.avisos_mask, mascaras_usuario[e.usuario_id]))
+    ]
+    if recordatorios:
+        session.execute(insert(Recordatorio), recordatorios)
+    return {"usuarios": len(por_telefono), "examenes": len(nuevos) + len(cambios),
+            "recordatorios": len(recordatorios)}
+
+
+# ---------------- EXPORTAR ----------------
+def estudiante_desde_usuario(usuario, nombre=None):
+    """Usuario de la base -> estudiante de data.json con los mismos avisos efectivos."""
+    globales = usuario.avisos_globales_mask or MASCARA_DEFAULT
+    propios = any(ex.avisos_mask for ex in usuario.examenes)
+    return {
+        "nombre": nombre or usuario.telefono,
+        "telefono": usuario.telefono,
+        "usar_globales": not propios,
+        "avisos_globales": de_mascara(globales),
+        "examenes": [
+            {"curso": ex.curso, "fecha": ex.fecha.isoformat(),
+             "avisos": de_mascara(mascara_efectiva(ex.avisos_mask, globales)) if propios else []}
+            for ex in sorted(usuario.examenes, key=lambda ex: ex.id)
+        ],
+    }
+
+
+def exportar(ruta=DATA_PATH, sesiones=SessionLocal, lote=LOTE_DEFAULT):
+    """
+    Reescribe data.json desde la base (la base no guarda nombres: se conservan los del data.json
+    actual por teléfono; los números nuevos quedan con el teléfono como nombre).
+    Devuelve {"usuarios", "examenes", "segundos"}.
+    """
+    ruta = Path(ruta)
+    inicio = time.perf_counter()
+    nombres = {}
+    if ruta.exists() or DiarioDatos(ruta).cambios():
+        for st in leer_datos(ruta):
+            telefono = "".join(str(st.get("telefono") or "").split())
+            if telefono:
+                nombres.setdefault(normalizar_telefono(telefono), st.get("nombre"))
+
+    stats = {"usuarios": 0, "examenes": 0}
+    tmp = ruta.with_name(f"{ruta.name}.tmp-{os.getpid()}")
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write("[")
+            ultimo_id = 0
+            while True:
+                session = sesiones()
+                usuarios = session.scalars(
+                    select(Usuario).options(selectinload(Usuario.examenes))
+                    .where(Usuario.id > ultimo_id).order_by(Usuario.id).limit(lote)
+                ).all()
+                for usuario in usuarios:
+                    st = estudiante_desde_usuario(usuario, nombres.get(usuario.telefono))
+                    f.write(("\n" if not stats["usuarios"] else ",\n") + json.dumps(st, ensure_ascii=False))
+                    stats["usuarios"] += 1
+                    stats["examenes"] += len(st["examenes"])
+                session.close()
+                if not usuarios:
+                    break
+                ultimo_id = usuarios[-1].id
+            f.write("\n]\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, ruta)
+    finally:
+        tmp.unlink(missing_ok=True)
+    diario = DiarioDatos(ruta)
+    descartados = len(diario.cambios())
+    if descartados:
+        print(f"[WARN] Se descartan {descartados} cambios del diario de {ruta}: data.json queda igual "
+              f"a la base (importa antes de exportar para no perderlos)")
+    diario.descartar_cambios()
+    stats["segundos"] = time.perf_counter() - inicio
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa data.json a data.db o exporta data.db a data.json.")
+    parser.add_argument("accion", choices=["importar", "exportar"])
+    parser.add_argument("--archivo", default=str(DATA_PATH), help="Archivo JSON (default data.json).")
+    parser.add_argument("--lote", type=int, default=LOTE_DEFAULT, help=f"Estudiantes por lote (default {LOTE_DEFAULT}).")
+    args = parser.parse_args()
+
+    init_db()
+    if args.accion == "importar":
+        stats = importar(args.archivo, lote=args.lote)
+        filas = stats["usuarios"] + stats["examenes"] + stats["recordatorios"]
+        print(f"[INFO] {stats['estudiantes']} estudiantes leídos ({stats['omitidos']} omitidos): "
+              f"{stats['usuarios']} usuarios, {stats['examenes']} exámenes y {stats['recordatorios']} "
+              f"recordatorios en {stats['segundos']:.1f} s ({filas / max(stats['segundos'], 1e-9):.0f} filas/s)")
+    else:
+        stats = exportar(args.archivo, lote=args.lote)
+        print(f"[INFO] {stats['usuarios']} usuarios y {stats['examenes']} exámenes exportados a {args.archivo} "
+              f"en {stats['segundos']:.1f} s ({stats['usuarios'] / max(stats['segundos'], 1e-9):.0f} usuarios/s)")
+
+
+if __name__ == "__main__":
+    main()
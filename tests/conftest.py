@@ -0,0 +1,25 @@
+# tests/conftest.py
+import os
+import sys
+import tempfile
+import pytest
+
+# Los módulos que llaman init_db() al importarse (p. ej. whatsapp_webhook) usan una base
+# temporal, nunca el data.db del repositorio. Debe fijarse antes de importar models.
+_TMP = tempfile.mkdtemp(prefix="bot_academico_tests_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_TMP, 'test.db')}")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+@pytest.fixture
+def db_session():
+    """Sesión sobre una base SQLite en memoria con todas las tablas."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from models import Base
+
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
@@ -0,0 +1,41 @@
+# tests/test_app.py
+import json
+import os
+from datetime import date
+import app
+
+
+def _escribir(ruta, estudiantes, mtime_ns):
+    ruta.write_text(json.dumps(estudiantes, ensure_ascii=False), encoding="utf-8")
+    os.utime(ruta, ns=(mtime_ns, mtime_ns))
+
+
+def test_relee_data_json_solo_si_cambia(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "_datos", {"firma": None, "por_dia": {}})
+    ruta = tmp_path / "data.json"
+    ana = {"nombre": "Ana", "telefono": "whatsapp:+51900000001", "usar_globales": False,
+           "examenes": [{"curso": "Física", "fecha": "2025-08-10", "avisos": [10, 5, 2]}]}
+    _escribir(ruta, [ana], 1_000_000_000)
+    assert app.recordatorios_del_dia(date(2025, 7, 31), ruta) == [(ana, ana["examenes"][0], 10)]
+    assert app.recordatorios_del_dia(date(2025, 8, 8), ruta) == []  # 2 no es un aviso válido
+
+    lecturas = []
+    monkeypatch.setattr(app, "indexar_recordatorios", lambda e: lecturas.append(e) or {})
+    app.recordatorios_del_dia(date(2025, 8, 5), ruta)
+    assert lecturas == []  # mismo mtime y tamaño: no se vuelve a leer
+
+    ana["examenes"][0]["fecha"] = "2025-08-11"
+    _escribir(ruta, [ana], 2_000_000_000)
+    app.recordatorios_del_dia(date(2025, 8, 5), ruta)
+    assert len(lecturas) == 1
+
+
+def test_data_json_roto_mantiene_lo_ultimo_leido(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "_datos", {"firma": None, "por_dia": {}})
+    ruta = tmp_path / "data.json"
+    luis = {"nombre": "Luis", "telefono": "whatsapp:+51900000002", "usar_globales": True,
+            "avisos_globales": [7], "examenes": [{"curso": "Arte", "fecha": "2025-08-10"}]}
+    _escribir(ruta, [luis], 1_000_000_000)
+    assert len(app.recordatorios_del_dia(date(2025, 8, 3), ruta)) == 1
+    ruta.write_text('[{"nombre": "Lu', encoding="utf-8")  # escritura a medias
+    assert app.recordatorios_del_dia(date(2025, 8, 3), ruta) == [(luis, luis["examenes"][0], 7)]
@@ -0,0 +1,78 @@
+# tests/test_cache_usuarios.py
+import uuid
+from datetime import date
+from sqlalchemy import event
+from models import Usuario, Examen
+import cache_usuarios
+from cache_usuarios import CacheUsuarios, snapshot
+
+
+class Reloj:
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+
+def _snap(i):
+    return cache_usuarios.UsuarioSnapshot(i, f"whatsapp:+5190000000{i}", True, 0, "America/Lima", ())
+
+
+def test_lru_y_ttl():
+    reloj = Reloj()
+    cache = CacheUsuarios(max_entradas=2, ttl=10, reloj=reloj)
+    for i in (1, 2):
+        cache.guardar(_snap(i), cache.epoca)
+    assert cache.obtener(_snap(1).telefono) is not None  # 1 pasa a ser el más reciente
+    cache.guardar(_snap(3), cache.epoca)
+    assert cache.obtener(_snap(2).telefono) is None
+    reloj.t = 11
+    assert cache.obtener(_snap(1).telefono) is None
+
+    epoca = cache.epoca
+    cache.invalidar(usuario_ids=[99])
+    cache.guardar(_snap(4), epoca)  # leído antes de una invalidación: no se guarda
+    assert cache.obtener(_snap(4).telefono) is None
+
+
+def test_commit_invalida_la_entrada(db_session):
+    session = db_session
+    u = Usuario(telefono="whatsapp:+51900000001")
+    u.examenes.append(Examen(curso="Física", fecha=date(2030, 5, 10)))
+    session.add(u)
+    session.commit()
+
+    cache_usuarios.CACHE.guardar(snapshot(u), cache_usuarios.CACHE.epoca)
+    assert cache_usuarios.CACHE.obtener(u.telefono).examenes[0].curso == "Física"
+    session.query(Examen).one().fecha = date(2030, 6, 1)
+    session.commit()
+    assert cache_usuarios.CACHE.obtener(u.telefono) is None
+
+
+def test_webhook_lecturas_sin_sql():
+    import whatsapp_webhook
+    from models import engine
+
+    client = whatsapp_webhook.app.test_client()
+    telefono = f"whatsapp:+519{uuid.uuid4().int % 10**8:08d}"
+
+    def enviar(texto):
+        return client.post("/whatsapp", data={"Body": texto, "From": telefono}).get_data(as_text=True)
+
+    enviar("hola")
+    enviar("AGREGAR EXAMEN Física 2030-05-10")
+    enviar("MIS EXAMENES")  # carga el snapshot
+
+    sentencias = []
+    contar = lambda *args: sentencias.append(args[2])
+    event.listen(engine, "before_cursor_execute", contar)
+    try:
+        assert "Física: 2030-05-10" in enviar("MIS EXAMENES")
+        assert "Menú" in enviar("MENU")
+        assert sentencias == []
+        enviar("CAMBIAR FECHA Física 2030-06-01")
+        assert sentencias
+    finally:
+        event.remove(engine, "before_cursor_execute", contar)
+    assert "Física: 2030-06-01" in enviar("MIS EXAMENES")
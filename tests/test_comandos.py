@@ -0,0 +1,63 @@
+# tests/test_comandos.py
+from datetime import date
+import pytest
+from models import Usuario
+import cache_usuarios
+import comandos
+
+
+def test_resolver_por_palabras_clave():
+    comando, args = comandos.resolver("set curso  Cálculo II 20 10")
+    assert (comando.nombre, args) == ("SET CURSO", ["Cálculo", "II", "20", "10"])
+    assert comandos.resolver("ayuda")[0].nombre == "MENU"
+    assert comandos.resolver("SET")[0] is None
+    assert comandos.resolver("hola que tal") == (None, ["hola", "que", "tal"])
+
+
+def test_parse_sin_base_de_datos():
+    agregar = comandos.COMANDOS[("AGREGAR", "EXAMEN")]
+    assert agregar.parse(["Física", "I", "2030-05-10", "40", "10"]) == ("Física I", date(2030, 5, 10), [10])
+    with pytest.raises(comandos.ErrorComando, match="Fecha inválida"):
+        agregar.parse(["Física", "2030-02-30"])
+    assert comandos.COMANDOS[("USAR", "GLOBALES")].parse(["no"]) is False
+
+
+def test_atender_mide_etapas_y_devuelve_errores_como_texto(db_session):
+    session = db_session
+    usuario = Usuario(telefono="whatsapp:+51900000001")
+    session.add(usuario)
+    session.commit()
+
+    tiempos = {}
+    comando, args = comandos.resolver("AGREGAR EXAMEN Física 2030-05-10")
+    assert "Examen agregado" in comandos.atender(session, usuario, comando, args, tiempos)
+    assert set(tiempos) == {"parse", "ejecutar", "render"}
+    assert "Ya existe" in comandos.atender(session, usuario, comando, args)
+
+    comando, args = comandos.resolver("ELIMINAR EXAMEN Química")
+    assert comandos.atender(session, usuario, comando, args) == "❌ No encontré el curso 'Química'."
+
+
+def test_varias_lineas_se_validan_juntas_y_se_guardan_de_una_vez(db_session):
+    session = db_session
+    usuario = Usuario(telefono="whatsapp:+51900000002")
+    session.add(usuario)
+    session.commit()
+    snap = cache_usuarios.snapshot(usuario)
+
+    pasos = comandos.resolver_lineas("Cálculo II 2030-05-10 20 10\n\nFísica 2030-06-01\n"
+                                     "física 2030-06-02\nFísica 2030-06-03\nCAMBIAR FECHA Física 2030-07-01\n"
+                                     "MIS EXAMENES\nhola")
+    assert [c.nombre if c else None for c, _ in pasos] == [
+        "AGREGAR EXAMEN", "AGREGAR EXAMEN", "AGREGAR EXAMEN", "AGREGAR EXAMEN", "CAMBIAR FECHA", "MIS EXAMENES", None]
+    texto, final, aplicados = comandos.planificar(snap, pasos)
+    assert texto.splitlines()[0] == "📋 *4 de 5 cambios guardados*"
+    assert "4. ❌ Ya existe" in texto and "7. ❓ No entendí: hola" in texto
+    assert "- Física: 2030-07-01" in texto  # la lectura ve las líneas anteriores
+    assert len(aplicados) == 4
+
+    comandos.persistir(session, usuario, final)
+    session.commit()
+    session.expire_all()
+    assert sorted((ex.curso, str(ex.fecha)) for ex in usuario.examenes) == [
+        ("Cálculo II", "2030-05-10"), ("Física", "2030-07-01"), ("física", "2030-06-02")]
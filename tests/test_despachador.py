@@ -0,0 +1,70 @@
+# tests/test_despachador.py
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+import pytest
+from despachador import Despachador, TokenBucket, crear_cliente, resumen
+
+
+class _TwilioFalso(BaseHTTPRequestHandler):
+    """Responde como la API de mensajes de Twilio; 'fallos' define errores por destinatario."""
+    fallos = {}
+    recibidos = []
+    lock = threading.Lock()
+
+    def do_POST(self):
+        datos = parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode())
+        to = datos["To"][0]
+        with self.lock:
+            self.recibidos.append(to)
+            pendientes = self.fallos.get(to, [])
+            status = pendientes.pop(0) if pendientes else 201
+        cuerpo = {"sid": f"SM{len(self.recibidos):032d}", "to": to, "status": "queued"}
+        if status != 201:
+            cuerpo = {"code": 20000 + status, "message": "error simulado", "status": status}
+        payload = json.dumps(cuerpo).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def twilio_falso():
+    _TwilioFalso.fallos = {}
+    _TwilioFalso.recibidos = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _TwilioFalso)
+    hilo = threading.Thread(target=server.serve_forever, daemon=True)
+    hilo.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def test_despachador_reintenta_429_y_5xx(twilio_falso):
+    _TwilioFalso.fallos = {
+        "whatsapp:+51900000002": [429, 500],
+        "whatsapp:+51900000003": [400],
+    }
+    client = crear_cliente("AC" + "0" * 32, "token", base_url=twilio_falso)
+    despachador = Despachador(client, mps=1000, workers=4, reintentos=3, backoff_base=0.01)
+
+    mensajes = [{"to": f"whatsapp:+5190000000{i}", "body": f"hola {i}"} for i in range(1, 6)]
+    resultados = despachador.enviar(mensajes)
+
+    assert [r["to"] for r in resultados] == [m["to"] for m in mensajes]
+    assert resumen(resultados) == {"enviado": 4, "fallido": 1}
+    por_destino = {r["to"]: r for r in resultados}
+    assert por_destino["whatsapp:+51900000002"]["intentos"] == 3
+    assert por_destino["whatsapp:+51900000003"]["intentos"] == 1  # 400 no se reintenta
+    assert por_destino["whatsapp:+51900000001"]["sid"].startswith("SM")
+
+
+def test_token_bucket_limita_la_tasa():
+    bucket = TokenBucket(tasa=5, capacidad=1)
+    assert bucket.intentar()
+    assert not bucket.intentar()
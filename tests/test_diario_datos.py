@@ -0,0 +1,69 @@
+# tests/test_diario_datos.py
+import json
+import os
+from diario_datos import DiarioDatos
+
+
+def _ana(fecha="2025-08-01"):
+    return {"nombre": "Ana", "telefono": "whatsapp:+51900000001", "examenes": [{"curso": "Física", "fecha": fecha}]}
+
+
+def test_diario_se_aplica_al_cargar_y_se_compacta(tmp_path):
+    ruta = tmp_path / "data.json"
+    luis = {"nombre": "Luis", "telefono": "whatsapp:+51900000002", "examenes": []}
+    ruta.write_text(json.dumps([_ana(), luis]), encoding="utf-8")
+    diario = DiarioDatos(ruta, compactar_min_bytes=1)
+
+    diario.registrar(_ana("2025-09-01"))
+    diario.registrar_varios([("Luis", None), ("Eva", {"nombre": "Eva", "examenes": []})])
+    esperado = [_ana("2025-09-01"), {"nombre": "Eva", "examenes": []}]
+    assert diario.cargar() == esperado
+    assert json.loads(ruta.read_text(encoding="utf-8"))[0] == _ana()  # la foto no se tocó
+
+    assert diario.compactar_si_hace_falta() == 3
+    assert not diario.diario.exists() and not diario.compactando.exists()
+    assert json.loads(ruta.read_text(encoding="utf-8")) == esperado
+    assert diario.cargar() == esperado
+
+
+def test_compactacion_cortada_y_linea_a_medias(tmp_path):
+    ruta = tmp_path / "data.json"
+    ruta.write_text(json.dumps([_ana()]), encoding="utf-8")
+    diario = DiarioDatos(ruta)
+    # un corte dejó el .compactando (ya aplicado o no a la foto) y un diario nuevo con una línea rota
+    diario.compactando.write_text(json.dumps({"nombre": "Ana", "estudiante": _ana("2025-09-01")}) + "\n", encoding="utf-8")
+    diario.diario.write_bytes(b'{"nombre": "Ana", "estud\n')
+    diario.registrar(_ana("2025-10-01"))
+    assert diario.cargar() == [_ana("2025-10-01")]
+
+
+def test_gestor_avisos_escribe_en_el_diario(tmp_path, monkeypatch, capsys):
+    import gestor_avisos
+    ruta = tmp_path / "data.json"
+    ruta.write_text(json.dumps([_ana()]), encoding="utf-8")
+    monkeypatch.setattr(gestor_avisos, "DATA_PATH", ruta)
+    monkeypatch.setattr(gestor_avisos, "DIARIO", DiarioDatos(ruta))
+    monkeypatch.setattr("sys.argv", ["gestor_avisos.py", "update-fecha", "--estudiante", "Ana",
+                                     "--curso", "Física", "--nueva-fecha", "2025-08-15"])
+    gestor_avisos.main()
+    assert "Fecha actualizada" in capsys.readouterr().out
+    assert json.loads(ruta.read_text(encoding="utf-8")) == [_ana()]
+    assert DiarioDatos(ruta).cargar() == [_ana("2025-08-15")]
+
+
+def test_compactando_recien_renombrado_no_se_toma_como_abandonado(tmp_path, monkeypatch):
+    ruta = tmp_path / "data.json"
+    ruta.write_text(json.dumps([_ana()]), encoding="utf-8")
+    diario = DiarioDatos(ruta)
+    diario.registrar(_ana("2025-09-01"))
+    os.utime(diario.diario, (0, 0))  # diario escrito hace mucho
+    otro = []
+    escribir_foto = DiarioDatos._escribir_foto
+
+    def escribir_y_probar_otro(self, datos):
+        otro.append(DiarioDatos(ruta).compactar())  # otro proceso a mitad de esta compactación
+        escribir_foto(self, datos)
+
+    monkeypatch.setattr(DiarioDatos, "_escribir_foto", escribir_y_probar_otro)
+    assert diario.compactar() == 1
+    assert otro == [0]
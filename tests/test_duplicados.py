@@ -0,0 +1,72 @@
+# tests/test_duplicados.py
+import uuid
+import threading
+from datetime import timedelta
+from models import SessionLocal, RespuestaWebhook
+import duplicados
+from duplicados import Deduplicador
+import whatsapp_webhook
+
+
+def _sid():
+    return f"SM{uuid.uuid4().hex}"
+
+
+def test_reintento_espera_al_primer_intento_y_recibe_su_respuesta():
+    dedupe = Deduplicador(espera=5)
+    sid = _sid()
+    assert dedupe.reclamar(sid) is None
+    assert dedupe.reclamar(sid, bloquear=False) is duplicados.EN_CURSO
+
+    recibido = []
+    hilo = threading.Thread(target=lambda: recibido.append(dedupe.reclamar(sid)))
+    hilo.start()
+    dedupe.guardar(sid, "<Response>ok</Response>")
+    hilo.join(5)
+    assert recibido == ["<Response>ok</Response>"]
+
+
+def test_fallo_suelta_el_sid_y_el_store_esta_acotado():
+    dedupe = Deduplicador(max_entradas=2, espera=0.1)
+    sid = _sid()
+    assert dedupe.reclamar(sid) is None
+    dedupe.soltar(sid)
+    assert dedupe.reclamar(sid) is None  # el reintento se atiende de nuevo
+    assert Deduplicador(espera=0).reclamar(sid) is None
+
+    for s in (sid, _sid(), _sid()):
+        dedupe.guardar(s, "x")
+    assert len(dedupe) == 2 and dedupe.reclamar(sid) is None
+
+
+def test_sqlite_comparte_respuestas_entre_workers():
+    uno, otro = (Deduplicador(sesiones=SessionLocal, espera=0.3, vencimiento=5) for _ in range(2))
+    sid = _sid()
+    assert uno.reclamar(sid) is None
+    assert otro.reclamar(sid) == duplicados.SIN_RESPUESTA  # el primero no terminó a tiempo
+    uno.guardar(sid, "<Response>uno</Response>")
+    assert otro.reclamar(sid) == "<Response>uno</Response>"
+
+    # la marca de un worker que murió se toma pasado el vencimiento
+    muerto = _sid()
+    assert uno.reclamar(muerto) is None
+    with SessionLocal() as session:
+        fila = session.get(RespuestaWebhook, muerto)
+        fila.creado -= timedelta(seconds=10)
+        session.commit()
+    assert otro.reclamar(muerto) is None
+
+
+def test_webhook_no_reejecuta_un_reintento(monkeypatch):
+    monkeypatch.setattr(duplicados, "DEDUPE", Deduplicador())
+    client = whatsapp_webhook.app.test_client()
+    telefono = f"whatsapp:+519{uuid.uuid4().int % 10**8:08d}"
+    client.post("/whatsapp", data={"Body": "hola", "From": telefono, "MessageSid": _sid()})
+
+    datos = {"Body": "AGREGAR EXAMEN Física 2030-05-10", "From": telefono, "MessageSid": _sid()}
+    primera = client.post("/whatsapp", data=datos).get_data(as_text=True)
+    assert "Examen agregado" in primera
+    assert client.post("/whatsapp", data=datos).get_data(as_text=True) == primera  # no "Ya existe"
+    assert "Ya existe" in client.post("/whatsapp", data={**datos, "MessageSid": _sid()}).get_data(as_text=True)
+    texto = client.get("/metrics").get_data(as_text=True)
+    assert 'webhook_duplicados_total{resultado="respondido"}' in texto
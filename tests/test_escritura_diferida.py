@@ -0,0 +1,100 @@
+# tests/test_escritura_diferida.py
+import uuid
+import pytest
+from models import SessionLocal, Usuario
+import cache_usuarios
+import comandos
+import escritura_diferida
+import whatsapp_webhook
+
+
+class Sesiones:
+    """SessionLocal que cuenta cuántas transacciones abre el escritor (una por lote)."""
+
+    def __init__(self):
+        self.abiertas = 0
+
+    def __call__(self):
+        self.abiertas += 1
+        return SessionLocal()
+
+
+@pytest.fixture
+def cola(monkeypatch):
+    cola = escritura_diferida.ColaEscrituras(sesiones=Sesiones(), espera=0.2)
+    monkeypatch.setattr(escritura_diferida, "COLA", cola)
+    yield cola
+    assert cola.vaciar(timeout=5)
+
+
+def _telefono():
+    return f"whatsapp:+519{uuid.uuid4().int % 10**8:08d}"
+
+
+def enviar(client, telefono, texto):
+    r = client.post("/whatsapp", data={"Body": texto, "From": telefono})
+    assert r.status_code == 200
+    return r.get_data(as_text=True)
+
+
+def test_responde_al_instante_y_agrupa_commits(cola):
+    client = whatsapp_webhook.app.test_client()
+    telefonos = [_telefono() for _ in range(3)]
+    for telefono in telefonos:
+        enviar(client, telefono, "hola")
+        enviar(client, telefono, "MIS EXAMENES")  # deja el snapshot en caché
+    for telefono in telefonos:
+        assert "Examen agregado" in enviar(client, telefono, "AGREGAR EXAMEN Física 2030-05-10 20")
+        # read-your-writes antes de que el escritor confirme
+        assert "Física: 2030-05-10" in enviar(client, telefono, "MIS EXAMENES")
+    assert "Ya existe" in enviar(client, telefonos[0], "AGREGAR EXAMEN Física 2030-05-10")
+    assert "No encontré" in enviar(client, telefonos[0], "CAMBIAR FECHA Química 2030-06-01")
+
+    assert cola.vaciar(timeout=5)
+    assert cola.sesiones.abiertas == 1  # tres mensajes, un solo commit
+    with SessionLocal() as session:
+        for telefono in telefonos:
+            usuario = session.query(Usuario).filter_by(telefono=telefono).one()
+            assert [(ex.curso, str(ex.fecha)) for ex in usuario.examenes] == [("Física", "2030-05-10")]
+
+    # caché fría: la lectura espera al escritor y ve lo confirmado
+    enviar(client, telefonos[1], "CAMBIAR FECHA Física 2030-07-01")
+    cache_usuarios.CACHE.limpiar()
+    assert "Física: 2030-07-01" in enviar(client, telefonos[1], "MIS EXAMENES")
+
+
+def test_una_mutacion_fallida_no_tumba_el_lote(cola):
+    bueno, borrado = _telefono(), _telefono()
+    with SessionLocal() as session:
+        session.add(Usuario(telefono=bueno))
+        session.commit()
+    cola.encolar(borrado, comandos.COMANDOS[("USAR", "GLOBALES")], False)
+    cola.encolar(bueno, comandos.COMANDOS[("USAR", "GLOBALES")], False)
+
+    assert cola.vaciar(timeout=5)
+    with SessionLocal() as session:
+        assert session.query(Usuario).filter_by(telefono=bueno).one().usar_globales is False
+
+
+def test_dos_mensajes_del_mismo_snapshot_no_se_pisan(cola):
+    telefono = _telefono()
+    with SessionLocal() as session:
+        session.add(Usuario(telefono=telefono))
+        session.commit()
+    client = whatsapp_webhook.app.test_client()
+    enviar(client, telefono, "MIS EXAMENES")  # deja el snapshot en caché
+    visto = cache_usuarios.CACHE.obtener(telefono)  # lo que leyeron dos mensajes llegados a la vez
+
+    agregar = comandos.COMANDOS[("AGREGAR", "EXAMEN")]
+    assert "Examen agregado" in escritura_diferida.atender(visto, agregar, "Física 2030-05-10".split())
+    assert "Examen agregado" in escritura_diferida.atender(visto, agregar, "Química 2030-05-11".split())
+    assert "Ya existe" in escritura_diferida.atender(visto, agregar, "Física 2030-05-12".split())
+    pasos = comandos.resolver_lineas("AGREGAR EXAMEN Arte 2030-05-12\nAGREGAR EXAMEN Física 2030-05-13")
+    escritura_diferida.encolar_plan(visto, lambda actual: comandos.planificar(actual, pasos))
+
+    cursos = ["Física", "Química", "Arte"]
+    assert [ex.curso for ex in cache_usuarios.CACHE.obtener(telefono).examenes] == cursos
+    assert cola.vaciar(timeout=5)
+    with SessionLocal() as session:
+        usuario = session.query(Usuario).filter_by(telefono=telefono).one()
+        assert [ex.curso for ex in usuario.examenes] == cursos
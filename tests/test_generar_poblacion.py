@@ -0,0 +1,19 @@
+# tests/test_generar_poblacion.py
+from datetime import date
+import pytz
+from models import Usuario, Examen, Recordatorio
+from generar_poblacion import generar_poblacion
+
+
+def test_generar_poblacion(db_session):
+    session = db_session
+
+    generar_poblacion(session, 50, 200, semilla=1, inicio=date(2025, 9, 1), verbose=False)
+
+    assert session.query(Usuario).count() == 50
+    assert session.query(Examen).count() == 200
+    assert session.query(Recordatorio).count() > 0
+    zonas = {tz for (tz,) in session.query(Usuario.timezone).distinct()}
+    assert zonas <= set(pytz.all_timezones)
+    fechas = [f for (f,) in session.query(Examen.fecha)]
+    assert min(fechas) >= date(2025, 9, 1)
@@ -0,0 +1,56 @@
+# tests/test_gestor_avisos.py
+import io
+import json
+import gestor_avisos
+from diario_datos import DiarioDatos
+
+
+def _datos():
+    return [
+        {"nombre": "Ana", "telefono": "whatsapp:+51900000001", "usar_globales": False,
+         "examenes": [{"curso": "Física", "fecha": "2025-08-01", "avisos": [10]}]},
+        {"nombre": "Luis", "telefono": "whatsapp:+51900000002", "usar_globales": False, "examenes": []},
+    ]
+
+
+def test_indexada_sigue_renombres_y_borrados():
+    examenes = gestor_avisos.Indexada([{"curso": "A"}, {"curso": "B"}, {"curso": "A"}], "curso")
+    assert examenes.buscar("A") == (0, {"curso": "A"})
+    examenes[0]["curso"] = "C"
+    assert examenes.buscar("C")[0] == 0 and examenes.buscar("A")[0] == 2
+    examenes.pop(0)
+    assert examenes.buscar("B")[0] == 0 and examenes.buscar("X") == (None, None)
+
+
+def test_batch_aplica_todo_y_guarda_una_vez(tmp_path, monkeypatch, capsys):
+    ruta = tmp_path / "data.json"
+    ruta.write_text(json.dumps(_datos()), encoding="utf-8")
+    monkeypatch.setattr(gestor_avisos, "DATA_PATH", ruta)
+    monkeypatch.setattr(gestor_avisos, "DIARIO", DiarioDatos(ruta))
+    escrituras = []
+    registrar_varios = gestor_avisos.DIARIO.registrar_varios
+    monkeypatch.setattr(gestor_avisos.DIARIO, "registrar_varios", lambda c: escrituras.append(c) or registrar_varios(c))
+    operaciones = "\n".join([
+        "# comentario",
+        'add-examen --estudiante Luis --curso "Arte I" --fecha 2025-09-01 --avisos 20 10',
+        "rename-examen --estudiante Luis --curso 'Arte I' --nuevo-curso Arte",
+        "update-fecha --estudiante Luis --curso Arte --nueva-fecha 2025-09-02",
+        "set-curso --estudiante Ana --curso Física --avisos 7",
+        "set-curso --estudiante Eva --curso Física --avisos 7",
+        "update-fecha --estudiante Ana --curso Física --nueva-fecha mañana",
+        "listar",
+        "set-curso --estudiante Ana",
+    ])
+    monkeypatch.setattr("sys.stdin", io.StringIO(operaciones))
+    monkeypatch.setattr("sys.argv", ["gestor_avisos.py", "batch"])
+    gestor_avisos.main()
+
+    salida = capsys.readouterr().out.splitlines()
+    estados = [linea.split()[1] for linea in salida if linea[:5].strip().isdigit()]
+    assert estados == ["OK", "OK", "OK", "OK", "ERROR", "ERROR", "ERROR", "ERROR"]
+    assert "8 operaciones: 4 OK, 4 con error" in salida[-1]
+    assert len(escrituras) == 1 and [nombre for nombre, _ in escrituras[0]] == ["Luis", "Ana"]
+    assert json.loads(ruta.read_text(encoding="utf-8")) == _datos()  # data.json no se reescribió
+    ana, luis = DiarioDatos(ruta).cargar()
+    assert luis["examenes"] == [{"curso": "Arte", "fecha": "2025-09-02", "avisos": [20, 10]}]
+    assert ana["examenes"][0]["avisos"] == [7]
@@ -0,0 +1,65 @@
+# tests/test_leases.py
+from datetime import date, datetime, timedelta
+import pytest
+from models import Usuario, Examen
+from avisos import a_mascara
+import leases
+import outbox
+
+AHORA = datetime(2025, 10, 1, 13, 0)
+
+
+def test_parse_shard():
+    assert leases.parse_shard("3/8") == (3, 8)
+    assert leases.parse_shard(None) == (0, 1)
+    with pytest.raises(ValueError):
+        leases.parse_shard("8/8")
+
+
+def test_lease_evita_solapamiento(db_session):
+    assert leases.adquirir(db_session, "scheduler:0/1", "2025-10-01T13", "cron", ahora=AHORA)
+    # Un run manual mientras el cron sigue activo no entra (aunque sea de otro periodo)
+    assert not leases.adquirir(db_session, "scheduler:0/1", "2025-10-01T13", "manual", ahora=AHORA)
+    assert not leases.adquirir(db_session, "scheduler:0/1", "2025-10-01T14", "manual", ahora=AHORA)
+    # Otro shard es independiente
+    assert leases.adquirir(db_session, "scheduler:1/2", "2025-10-01T13", "host-b", ahora=AHORA)
+
+
+def test_lease_completado_y_vencido(db_session):
+    assert leases.adquirir(db_session, "scheduler:0/1", "2025-10-01T13", "cron", ahora=AHORA)
+    leases.completar(db_session, "scheduler:0/1", "cron")
+    # Misma hora ya trabajada: se salta; la hora siguiente sí se toma
+    assert not leases.adquirir(db_session, "scheduler:0/1", "2025-10-01T13", "manual")
+    assert leases.adquirir(db_session, "scheduler:0/1", "2025-10-01T14", "cron2", ahora=AHORA)
+    # Si el titular muere sin completar, otro lo toma al vencer
+    despues = AHORA + leases.DURACION_DEFAULT + timedelta(seconds=1)
+    assert leases.adquirir(db_session, "scheduler:0/1", "2025-10-01T14", "host-b", ahora=despues)
+
+
+def test_outbox_reclama_solo_su_shard(db_session):
+    for i in range(1, 5):
+        u = Usuario(id=i, telefono=f"whatsapp:+5190000000{i}")
+        u.examenes.append(Examen(id=i, curso="Física", fecha=date(2025, 10, 11), avisos_mask=a_mascara([10])))
+        db_session.add(u)
+    db_session.commit()
+    outbox.encolar(db_session, [
+        {"examen_id": i, "dias": 10, "fecha_local": date(2025, 10, 1),
+         "telefono": f"whatsapp:+5190000000{i}", "cuerpo": "x"} for i in range(1, 5)
+    ])
+    pares = outbox.reclamar(db_session, date(2025, 10, 1), "t0", shard=(0, 2))
+    impares = outbox.reclamar(db_session, date(2025, 10, 1), "t1", shard=(1, 2))
+    assert sorted(e.examen_id for e in pares) == [2, 4]
+    assert sorted(e.examen_id for e in impares) == [1, 3]
+
+
+def test_renovar_y_shards_en_conflicto(db_session):
+    assert leases.adquirir(db_session, "scheduler:0/2", "2025-10-01T13", "a", ahora=AHORA)
+    # Un envío largo renueva el lease: pasados los 30 min iniciales nadie puede tomarlo
+    assert leases.renovar(db_session, "scheduler:0/2", "a", ahora=AHORA + timedelta(minutes=25))
+    despues = AHORA + timedelta(minutes=40)
+    assert not leases.adquirir(db_session, "scheduler:0/2", "2025-10-01T13", "b", ahora=despues)
+    assert not leases.renovar(db_session, "scheduler:0/2", "b", ahora=despues)
+
+    # Una corrida sin --shard (0/1) se solapa con 0/2; 1/2 no
+    assert leases.shards_en_conflicto(db_session, "scheduler:0/1", ahora=despues) == ["scheduler:0/2"]
+    assert leases.shards_en_conflicto(db_session, "scheduler:1/2", ahora=despues) == []
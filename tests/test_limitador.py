@@ -0,0 +1,43 @@
+# tests/test_limitador.py
+import uuid
+import limitador
+from limitador import Limitador
+import whatsapp_webhook
+
+
+def test_bucket_por_telefono_no_afecta_a_los_demas():
+    lim = Limitador(tasa=0.01, rafaga=3, max_en_curso=0)
+    for _ in range(3):
+        assert lim.admitir("whatsapp:+51900000001") is None
+        lim.salir()
+    assert lim.admitir("whatsapp:+51900000001") == limitador.RESPUESTA_TELEFONO
+    assert lim.admitir("whatsapp:+51900000002") is None
+    assert lim.en_curso == 1
+
+
+def test_tope_global_y_lru_de_buckets():
+    lim = Limitador(tasa=0, max_en_curso=2, max_telefonos=2)
+    assert lim.admitir("a") is None and lim.admitir("b") is None
+    assert lim.admitir("c") == limitador.RESPUESTA_SATURADO
+    lim.salir()
+    assert lim.admitir("c") is None
+
+    lim = Limitador(tasa=1, rafaga=1, max_telefonos=2)
+    for telefono in ("a", "b", "c"):
+        lim.admitir(telefono)
+    assert lim.telefonos() == 2
+
+
+def test_webhook_responde_fijo_y_expone_limites(monkeypatch):
+    monkeypatch.setattr(limitador, "LIMITADOR", Limitador(tasa=0.01, rafaga=2, max_en_curso=8))
+    client = whatsapp_webhook.app.test_client()
+    telefono = f"whatsapp:+519{uuid.uuid4().int % 10**8:08d}"
+    for _ in range(2):
+        client.post("/whatsapp", data={"Body": "MENU", "From": telefono})
+    r = client.post("/whatsapp", data={"Body": "MENU", "From": telefono})
+    assert r.status_code == 200 and "muchos mensajes seguidos" in r.get_data(as_text=True)
+    assert limitador.LIMITADOR.en_curso == 0
+
+    texto = client.get("/metrics").get_data(as_text=True)
+    assert 'webhook_rechazos_total{motivo="telefono"}' in texto
+    assert "webhook_en_curso_max 8" in texto and "# TYPE webhook_en_curso gauge" in texto
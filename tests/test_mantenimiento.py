@@ -0,0 +1,82 @@
+# tests/test_mantenimiento.py
+from datetime import date
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import Base, Usuario, Examen, Checkpoint
+from avisos import a_mascara
+from mantenimiento import TAREAS, Tarea, ejecutar, corregir_numero
+
+
+@pytest.fixture
+def sesiones(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'mant.db'}")
+    Base.metadata.create_all(engine)
+    fabrica = sessionmaker(bind=engine)
+    session = fabrica()
+    for i in range(1, 6):
+        u = Usuario(id=i, telefono=f"+5190000000{i}" if i % 2 else f"whatsapp:+5190000000{i}")
+        u.examenes.append(Examen(curso="Física", fecha=date(2025, 10, 11), avisos_mask=a_mascara([30, 20, 15, 10, 5])))
+        session.add(u)
+    session.commit()
+    session.close()
+    return fabrica
+
+
+def _telefonos(fabrica):
+    session = fabrica()
+    telefonos = [t for (t,) in session.query(Usuario.telefono).order_by(Usuario.id)]
+    session.close()
+    return telefonos
+
+
+def test_dry_run_no_guarda_nada(sesiones):
+    stats = ejecutar(TAREAS["numeros"], sesiones, lote=2, dry_run=True, pausa=0)
+    assert (stats["revisados"], stats["cambiados"], stats["lotes"]) == (5, 3, 3)
+    assert _telefonos(sesiones)[0] == "+51900000001"
+    session = sesiones()
+    assert session.get(Checkpoint, "numeros") is None
+    session.close()
+
+    stats = ejecutar(TAREAS["avisos"], sesiones, lote=2, pausa=0)
+    assert (stats["revisados"], stats["cambiados"]) == (5, 0)
+    session = sesiones()
+    assert {m for (m,) in session.query(Examen.avisos_mask)} == {a_mascara([30, 20, 15, 10, 5])}
+    session.close()
+
+
+def test_reanuda_despues_de_interrupcion(sesiones):
+    def corregir_y_cortar(session, u):
+        if u.id == 3:
+            raise KeyboardInterrupt
+        return corregir_numero(session, u)
+
+    with pytest.raises(KeyboardInterrupt):
+        ejecutar(Tarea("numeros", Usuario, corregir_y_cortar, ""), sesiones, lote=2, pausa=0)
+    assert _telefonos(sesiones)[:3] == ["whatsapp:+51900000001", "whatsapp:+51900000002", "+51900000003"]
+
+    stats = ejecutar(TAREAS["numeros"], sesiones, lote=2, pausa=0)
+    assert stats["revisados"] == 3  # solo los ids 3..5
+    assert all(t.startswith("whatsapp:") for t in _telefonos(sesiones))
+    session = sesiones()
+    cp = session.get(Checkpoint, "numeros")
+    assert (cp.completado, cp.ultimo_id, cp.revisados, cp.cambiados) == (True, 5, 5, 3)
+    session.close()
+
+
+def test_fusionar_usuarios_duplicados(sesiones):
+    session = sesiones()
+    dup = Usuario(id=10, telefono="whatsapp:+51900000001")
+    dup.examenes.append(Examen(curso="Química", fecha=date(2025, 11, 1)))
+    session.add(dup)
+    session.commit()
+    session.close()
+
+    stats = ejecutar(TAREAS["fusionar"], sesiones, lote=4, pausa=0)
+    assert stats["cambiados"] == 3  # 1 fusión + 2 números normalizados
+    session = sesiones()
+    u = session.query(Usuario).filter_by(telefono="whatsapp:+51900000001").one()
+    assert u.id == 1
+    assert sorted(e.curso for e in u.examenes) == ["Física", "Química"]
+    assert session.get(Usuario, 10) is None
+    session.close()
@@ -0,0 +1,60 @@
+# tests/test_migrar_esquema.py
+from datetime import date
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from models import Base, Usuario, Examen
+from avisos import a_mascara, MASCARA_DEFAULT
+from migrar_esquema import necesita_migracion, migrar, verificar_esquema, respaldar
+
+ESQUEMA_ANTIGUO = [
+    "CREATE TABLE usuarios (id INTEGER PRIMARY KEY, telefono VARCHAR(20) NOT NULL UNIQUE, "
+    "avisos_globales VARCHAR(50), usar_globales BOOLEAN, timezone VARCHAR(50))",
+    "CREATE TABLE examenes (id INTEGER PRIMARY KEY, curso VARCHAR(100) NOT NULL, fecha VARCHAR(10) NOT NULL, "
+    "avisos VARCHAR(50), usuario_id INTEGER REFERENCES usuarios (id))",
+]
+
+
+def _base_antigua(tmp_path, fechas):
+    engine = create_engine(f"sqlite:///{tmp_path / 'antigua.db'}")
+    with engine.begin() as conn:
+        for sql in ESQUEMA_ANTIGUO:
+            conn.execute(text(sql))
+        conn.execute(text("INSERT INTO usuarios VALUES (1, 'whatsapp:+51900000001', '20,10', 1, 'America/Lima')"))
+        conn.execute(text("INSERT INTO usuarios VALUES (2, 'whatsapp:+51900000002', '', 1, 'America/Lima')"))
+        for i, (fecha, avisos) in enumerate(fechas, start=1):
+            conn.execute(text("INSERT INTO examenes VALUES (:i, 'Física', :f, :a, 1)"), {"i": i, "f": fecha, "a": avisos})
+    return engine
+
+
+def test_migrar_esquema(tmp_path):
+    engine = _base_antigua(tmp_path, [("2025-09-30", "10,5,40"), ("2025/10/5", "")])
+    assert necesita_migracion(engine)
+    with pytest.raises(RuntimeError, match="python migrar_esquema.py"):
+        verificar_esquema(engine)  # init_db() no arranca con el esquema antiguo
+    copia = create_engine(f"sqlite:///{respaldar(engine)}")
+    migrar(engine)
+    assert not necesita_migracion(engine)
+    assert migrar(engine) is None  # otro proceso que llega tarde no hace nada
+    assert necesita_migracion(copia)  # el respaldo conserva el esquema antiguo
+
+    session = sessionmaker(bind=engine)()
+    ex1, ex2 = session.query(Examen).order_by(Examen.id)
+    assert (ex1.fecha, ex1.avisos_mask) == (date(2025, 9, 30), a_mascara([10, 5]))
+    assert (ex2.fecha, ex2.avisos_mask) == (date(2025, 10, 5), 0)
+    u1, u2 = session.query(Usuario).order_by(Usuario.id)
+    assert (u1.avisos_globales_mask, u2.avisos_globales_mask) == (a_mascara([20, 10]), MASCARA_DEFAULT)
+    session.close()
+
+
+def test_migrar_esquema_fechas_invalidas(tmp_path):
+    engine = _base_antigua(tmp_path, [("2025-09-30", ""), ("pronto", "")])
+    with pytest.raises(RuntimeError, match="borrar-invalidas"):
+        migrar(engine)
+    assert necesita_migracion(engine)
+
+    migrar(engine, borrar_invalidas=True)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    assert [e.id for e in session.query(Examen)] == [1]
+    session.close()
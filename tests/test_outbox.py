@@ -0,0 +1,78 @@
+# tests/test_outbox.py
+from datetime import date, datetime, timedelta
+from models import Envio
+import outbox
+
+HOY = date(2025, 10, 1)
+
+
+class DespachadorFalso:
+    """Registra lo que 'envía'; los destinos en `fallan` devuelven error."""
+
+    def __init__(self, fallan=()):
+        self.enviados = []
+        self.fallan = set(fallan)
+
+    def enviar_iter(self, mensajes):
+        for m in mensajes:
+            self.enviados.append(m["to"])
+            ok = m["to"] not in self.fallan
+            yield dict(m, sid="SM1" if ok else None, estado="enviado" if ok else "fallido",
+                       intentos=1, error=None if ok else "500")
+
+
+def _filas(n):
+    return [{"examen_id": i, "dias": 10, "fecha_local": HOY,
+             "telefono": f"whatsapp:+5190000000{i}", "cuerpo": f"examen {i}"} for i in range(1, n + 1)]
+
+
+def test_encolar_es_idempotente(db_session):
+    assert outbox.encolar(db_session, _filas(3)) == 3
+    assert outbox.encolar(db_session, _filas(3)) == 0
+    assert db_session.query(Envio).count() == 3
+
+
+def test_procesar_no_reenvia_lo_ya_enviado(db_session):
+    outbox.encolar(db_session, _filas(3))
+    primero = DespachadorFalso()
+    outbox.procesar(db_session, primero, HOY, lote=2)
+    assert len(primero.enviados) == 3
+
+    # Una corrida repetida (o solapada) no encuentra nada que reenviar
+    outbox.encolar(db_session, _filas(3))
+    segundo = DespachadorFalso()
+    assert outbox.procesar(db_session, segundo, HOY) == []
+    assert segundo.enviados == []
+
+
+def test_retoma_reclamos_vencidos_y_fallidos(db_session):
+    outbox.encolar(db_session, _filas(2))
+    # Una corrida que murió después de reclamar: sus envíos siguen 'enviando'
+    hace_rato = datetime(2025, 10, 1, 13, 0)
+    assert len(outbox.reclamar(db_session, HOY, "caida", ahora=hace_rato)) == 2
+    assert outbox.reclamar(db_session, HOY, "otra", ahora=hace_rato + timedelta(minutes=1)) == []
+
+    despachador = DespachadorFalso(fallan={"whatsapp:+51900000002"})
+    outbox.procesar(db_session, despachador, HOY)
+    assert sorted(despachador.enviados) == ["whatsapp:+51900000001", "whatsapp:+51900000002"]
+
+    # El fallido se reintenta en la siguiente corrida; el enviado no
+    reintento = DespachadorFalso()
+    outbox.procesar(db_session, reintento, HOY)
+    assert reintento.enviados == ["whatsapp:+51900000002"]
+    assert {e.estado for e in db_session.query(Envio)} == {"enviado"}
+
+
+def test_reclamo_por_lotes_y_marcar_solo_lo_propio(db_session):
+    outbox.encolar(db_session, _filas(5))
+    inicio = datetime(2025, 10, 1, 13, 0)
+    lote_a = outbox.reclamar(db_session, HOY, "a", ahora=inicio, limite=2)
+    assert [e.id for e in lote_a] == [1, 2]
+
+    # Mucho después, la corrida "a" sigue viva pero su reclamo venció: "b" lo retoma
+    despues = inicio + outbox.RECLAMO_EXPIRA + timedelta(minutes=1)
+    assert [e.id for e in outbox.reclamar(db_session, HOY, "b", ahora=despues, limite=3)] == [1, 2, 3]
+    resultado = {"estado": "enviado", "sid": "SM1", "intentos_previos": 0}
+    assert outbox.marcar(db_session, [dict(resultado, envio_id=1)], "a") == 0
+    assert outbox.marcar(db_session, [dict(resultado, envio_id=1)], "b") == 1
+    assert db_session.get(Envio, 4).estado == "pendiente"
@@ -0,0 +1,71 @@
+# tests/test_recordatorios.py
+from datetime import date
+import pytest
+from models import Usuario, Examen, Recordatorio, condicion_aviso_sql
+from avisos import a_mascara, de_mascara, normalizar_avisos
+
+
+def _fechas(session, examen):
+    filas = session.query(Recordatorio).filter_by(examen_id=examen.id).all()
+    return sorted((r.fecha_aviso, r.dias) for r in filas)
+
+
+def test_recordatorios_al_crear_examen(db_session):
+    u = Usuario(telefono="whatsapp:+51900000001", avisos_globales_mask=a_mascara([20, 10]))
+    u.examenes.append(Examen(curso="Física", fecha=date(2025, 9, 30), avisos_mask=a_mascara([5])))
+    u.examenes.append(Examen(curso="Química", fecha="2025-09-30"))
+    db_session.add(u)
+    db_session.commit()
+
+    fisica, quimica = u.examenes
+    assert _fechas(db_session, fisica) == [(date(2025, 9, 25), 5)]
+    assert _fechas(db_session, quimica) == [(date(2025, 9, 10), 20), (date(2025, 9, 20), 10)]
+
+
+def test_recordatorios_se_actualizan_con_cambios(db_session):
+    u = Usuario(telefono="whatsapp:+51900000001", avisos_globales_mask=a_mascara([20, 10]))
+    ex = Examen(curso="Química", fecha=date(2025, 9, 30))
+    u.examenes.append(ex)
+    db_session.add(u)
+    db_session.commit()
+
+    ex.fecha = date(2025, 10, 10)
+    db_session.commit()
+    assert _fechas(db_session, ex) == [(date(2025, 9, 20), 20), (date(2025, 9, 30), 10)]
+
+    u.avisos_globales_mask = a_mascara([10, 5])
+    db_session.commit()
+    assert _fechas(db_session, ex) == [(date(2025, 9, 30), 10), (date(2025, 10, 5), 5)]
+
+    with pytest.raises(ValueError):
+        ex.fecha = "2025-02-30"
+
+
+def test_recordatorios_se_borran_con_el_examen(db_session):
+    u = Usuario(telefono="whatsapp:+51900000001")
+    u.examenes.append(Examen(curso="Física", fecha=date(2025, 9, 30), avisos_mask=a_mascara([10, 5])))
+    db_session.add(u)
+    db_session.commit()
+
+    db_session.delete(u.examenes[0])
+    db_session.commit()
+    assert db_session.query(Recordatorio).count() == 0
+
+
+def test_mascaras_de_avisos():
+    assert de_mascara(a_mascara([5, 30, 10])) == [30, 10, 5]
+    assert a_mascara([3, 31, 10]) == a_mascara([10])
+    assert normalizar_avisos(["7", "40", "7", "20", "15", "10"]) == [20, 15, 10, 7]
+
+
+def test_condicion_sql_coincide_con_tabla(db_session):
+    u = Usuario(telefono="whatsapp:+51900000001", avisos_globales_mask=a_mascara([20, 10]))
+    u.examenes.append(Examen(curso="Física", fecha=date(2025, 9, 30), avisos_mask=a_mascara([5])))
+    u.examenes.append(Examen(curso="Química", fecha=date(2025, 9, 30)))
+    db_session.add(u)
+    db_session.commit()
+
+    for dia in (date(2025, 9, 10), date(2025, 9, 20), date(2025, 9, 25), date(2025, 9, 26)):
+        sql = {e.id for e in db_session.query(Examen).join(Examen.usuario).filter(condicion_aviso_sql(dia))}
+        tabla = {r.examen_id for r in db_session.query(Recordatorio).filter_by(fecha_aviso=dia)}
+        assert sql == tabla
@@ -0,0 +1,37 @@
+# tests/test_registro_envios.py
+import json
+from datetime import date
+from registro_envios import RegistroEnvios
+
+
+def test_marca_consulta_y_poda_por_fecha_de_examen(tmp_path):
+    registro = RegistroEnvios(tmp_path / "sent_log", legado=None)
+    hoy = date(2025, 7, 25)
+    assert not registro.ya_enviado("Ana", "Física", "2025-08-01", hoy)
+    registro.marcar("Ana", "Física", "2025-08-01", hoy)
+    registro.marcar("Ana", "Física", "2025-08-01", hoy)  # repetido: no añade otra línea
+    registro.marcar("Luis", "Química", "2025-07-30", hoy)
+    assert registro.ya_enviado("Ana", "Física", "2025-08-01", hoy)
+    assert not registro.ya_enviado("Ana", "Física", "2025-08-01", date(2025, 7, 26))
+    assert (tmp_path / "sent_log" / "2025-08-01.log").read_text(encoding="utf-8") == "Ana|Física|2025-07-25\n"
+
+    # otro proceso (u otra corrida) ve lo ya marcado
+    otro = RegistroEnvios(tmp_path / "sent_log", legado=None)
+    assert otro.ya_enviado("Luis", "Química", "2025-07-30", hoy)
+    otro.marcar("Luis", "Química", "2025-07-30", date(2025, 7, 26))
+    assert registro.ya_enviado("Luis", "Química", "2025-07-30", date(2025, 7, 26))
+
+    assert registro.podar(date(2025, 7, 31)) == 1
+    assert [p.name for p in (tmp_path / "sent_log").iterdir()] == ["2025-08-01.log"]
+    assert not registro.ya_enviado("Luis", "Química", "2025-07-30", hoy)
+
+
+def test_importa_sent_log_json_una_vez(tmp_path):
+    legado = tmp_path / "sent_log.json"
+    legado.write_text(json.dumps({"Ana|Física|2025-08-01|2025-07-25": True, "roto": True}), encoding="utf-8")
+    registro = RegistroEnvios(tmp_path / "sent_log", legado)
+    assert registro.ya_enviado("Ana", "Física", "2025-08-01", date(2025, 7, 25))
+
+    legado.write_text(json.dumps({"Luis|Arte|2025-08-01|2025-07-25": True}), encoding="utf-8")
+    registro = RegistroEnvios(tmp_path / "sent_log", legado)  # el directorio ya existe: no reimporta
+    assert not registro.ya_enviado("Luis", "Arte", "2025-08-01", date(2025, 7, 25))
@@ -17,3 +17,114 @@ def test_generar_mensajes_recordatorio():
 
     # Debe haber al menos un mensaje con 'Matemáticas'
     assert any("Matemáticas" in m for m in mensajes)
+
+
+def test_dias_por_zona_solo_zonas_en_hora_envio(db_session):
+    from datetime import date, datetime, timezone
+    from models import Usuario
+    from scheduler import dias_por_zona
+
+    for tel, tz in [("whatsapp:+51900000001", "America/Lima"), ("whatsapp:+51900000002", "america/lima"),
+                    ("whatsapp:+34900000003", "Europe/Madrid")]:
+        db_session.add(Usuario(telefono=tel, timezone=tz))
+    db_session.commit()
+
+    # 13:00 UTC en octubre -> 08:00 en Lima (UTC-5), 15:00 en Madrid
+    ahora = datetime(2025, 10, 1, 13, 0, tzinfo=timezone.utc)
+    assert {f: sorted(v) for f, v in dias_por_zona(db_session, ahora).items()} == {
+        date(2025, 10, 1): ["America/Lima", "america/lima"]}
+    assert dias_por_zona(db_session, datetime(2025, 10, 1, 14, 0, tzinfo=timezone.utc)) == {}
+
+
+def test_recordatorios_del_dia_por_zona(db_session):
+    from datetime import date, datetime, timezone
+    from models import Usuario, Examen
+    from avisos import a_mascara
+    from scheduler import recordatorios_del_dia
+
+    session = db_session
+    for tel, tz in [("whatsapp:+51900000001", "America/Lima"),
+                    ("whatsapp:+34900000002", "Europe/Madrid"),
+                    ("whatsapp:+81900000003", "Asia/Tokyo")]:
+        u = Usuario(telefono=tel, timezone=tz)
+        u.examenes.append(Examen(curso="Física", fecha=date(2025, 10, 11), avisos_mask=a_mascara([10, 5])))
+        session.add(u)
+    session.commit()
+
+    ahora = datetime(2025, 10, 1, 13, 0, tzinfo=timezone.utc)
+    filas = recordatorios_del_dia(session, date(2025, 10, 1), ahora, ignore_hour=False)
+    assert [(u.telefono, rec.dias) for rec, _, u in filas] == [("whatsapp:+51900000001", 10)]
+
+    todas = recordatorios_del_dia(session, date(2025, 10, 1), ahora, ignore_hour=True)
+    assert len(todas) == 3
+    assert recordatorios_del_dia(session, date(2025, 10, 2), ahora, ignore_hour=True) == []
+
+
+def test_proxima_hora_envio():
+    from datetime import datetime, timezone
+    from scheduler import proxima_hora_envio
+
+    ahora = datetime(2025, 10, 1, 12, 30, tzinfo=timezone.utc)
+    # Lima (UTC-5) llega a las 08:00 a las 13:00 UTC; Kolkata (UTC+5:30) mañana a las 02:30 UTC
+    assert proxima_hora_envio(ahora, ["America/Lima"]) == datetime(2025, 10, 1, 13, 0, tzinfo=timezone.utc)
+    assert proxima_hora_envio(ahora, ["Asia/Kolkata", "America/Lima"]) == datetime(2025, 10, 1, 13, 0, tzinfo=timezone.utc)
+    assert proxima_hora_envio(ahora, ["Asia/Kolkata"]) == datetime(2025, 10, 2, 2, 30, tzinfo=timezone.utc)
+    assert proxima_hora_envio(ahora, []) is None
+
+
+def test_zonas_vacias_o_mal_escritas_van_a_su_zona(db_session):
+    from datetime import date, datetime, timezone
+    from models import Usuario, Examen
+    from avisos import a_mascara
+    from scheduler import recordatorios_del_dia, zonas_registradas
+
+    for i, tz in enumerate([None, "", "america/lima", "Marte/Olympus", "Europe/Madrid"]):
+        u = Usuario(telefono=f"whatsapp:+5190000000{i}", timezone=tz)
+        u.examenes.append(Examen(curso="Física", fecha=date(2025, 10, 11), avisos_mask=a_mascara([10])))
+        db_session.add(u)
+    db_session.commit()
+
+    ahora = datetime(2025, 10, 1, 13, 0, tzinfo=timezone.utc)  # 08:00 en Lima
+    filas = recordatorios_del_dia(db_session, date(2025, 10, 1), ahora, ignore_hour=False)
+    assert [u.telefono[-1] for _, _, u in filas] == ["0", "1", "2", "3"]
+    assert zonas_registradas(db_session) == {"America/Lima", "Europe/Madrid"}
+
+
+def test_fecha_local_por_zona(db_session):
+    from datetime import date, datetime, timezone
+    from models import Usuario, Examen
+    from avisos import a_mascara
+    from scheduler import recordatorios_del_dia
+
+    for tel, tz in [("whatsapp:+51900000001", "America/Lima"), ("whatsapp:+81900000002", "Asia/Tokyo")]:
+        u = Usuario(telefono=tel, timezone=tz)
+        u.examenes.append(Examen(curso="Física", fecha=date(2025, 10, 11), avisos_mask=a_mascara([10])))
+        db_session.add(u)
+    db_session.commit()
+
+    # 23:00 UTC del 30/09 = 08:00 del 01/10 en Tokio; en el servidor (UTC) todavía es 30/09
+    ahora = datetime(2025, 9, 30, 23, 0, tzinfo=timezone.utc)
+    filas = recordatorios_del_dia(db_session, None, ahora, ignore_hour=False)
+    assert [(u.telefono, rec.fecha_aviso) for rec, _, u in filas] == [("whatsapp:+81900000002", date(2025, 10, 1))]
+    # Sin filtro de hora, Lima (18:00 del 30/09) todavía no tiene aviso
+    assert len(recordatorios_del_dia(db_session, None, ahora, ignore_hour=True)) == 1
+
+
+def test_daemon_sobrevive_a_un_tick_fallido(monkeypatch, capsys):
+    import scheduler
+
+    llamadas = []
+
+    def tick(*args, **kwargs):
+        llamadas.append(kwargs["periodo"])
+        if len(llamadas) == 1:
+            raise RuntimeError("database is locked")
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(scheduler, "procesar_tick", tick)
+    monkeypatch.setattr(scheduler.time, "sleep", lambda segundos: None)
+    scheduler.run_daemon(dry_run=True)
+    assert len(llamadas) == 2
+    salida = capsys.readouterr().out
+    assert "falló: RuntimeError: database is locked" in salida
+    assert "Daemon detenido" in salida
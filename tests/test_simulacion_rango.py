@@ -0,0 +1,42 @@
+# tests/test_simulacion_rango.py
+from datetime import date, timedelta
+from simulacion_rango import simular_rango
+from avisos import a_mascara, de_mascara, mascara_efectiva
+
+
+FILAS = [
+    ("whatsapp:+51900000001", a_mascara([30, 20, 10, 5]), "Física", date(2025, 10, 20), 0),
+    ("whatsapp:+51900000001", a_mascara([30, 20, 10, 5]), "Química", date(2025, 10, 15), a_mascara([10, 5])),
+    ("whatsapp:+51900000002", 0, "Historia", date(2025, 10, 1), a_mascara([5])),
+    ("whatsapp:+51900000003", 0, "Arte", date(2025, 10, 18), 0),
+]
+
+
+def _esperado(filas, inicio, fin):
+    """Versión día a día (como el scheduler original) para comparar."""
+    conteos = []
+    dia = inicio
+    while dia <= fin:
+        total = 0
+        for _, glob, _, fecha, locales in filas:
+            restantes = (fecha - dia).days
+            if restantes in de_mascara(mascara_efectiva(locales, glob)):
+                total += 1
+        conteos.append(total)
+        dia += timedelta(days=1)
+    return conteos
+
+
+def test_simular_rango_coincide_con_el_calculo_diario():
+    inicio, fin = date(2025, 9, 15), date(2025, 10, 20)
+    dias, conteos, (dia_idx, filas_idx, restantes) = simular_rango(FILAS, inicio, fin)
+    assert len(dias) == 36
+    assert conteos.tolist() == _esperado(FILAS, inicio, fin)
+    # Química (10,5) -> 2025-10-05 y 2025-10-10
+    quimica = sorted(int(d) for d, f in zip(dia_idx, filas_idx) if f == 1)
+    assert quimica == [(date(2025, 10, 5) - inicio).days, (date(2025, 10, 10) - inicio).days]
+
+
+def test_simular_rango_vacio():
+    _, conteos, _ = simular_rango([], date(2025, 10, 1), date(2025, 10, 3))
+    assert conteos.tolist() == [0, 0, 0]
@@ -0,0 +1,88 @@
+# tests/test_sincronizar_json.py
+import json
+from datetime import date
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import Base, Usuario, Examen, Recordatorio, sincronizar_recordatorios
+from avisos import a_mascara, de_mascara
+from diario_datos import DiarioDatos
+import sincronizar_json
+
+
+@pytest.fixture
+def sesiones(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'sync.db'}")
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)
+
+
+def _estudiantes():
+    return [
+        {"nombre": "Ana", "telefono": "+51 900 000 001", "usar_globales": True, "avisos_globales": [20, 10, 3],
+         "examenes": [{"curso": "Física", "fecha": "2025-10-11", "avisos": [30]}]},
+        {"nombre": "Luis", "telefono": "whatsapp:+51900000002", "usar_globales": False,
+         "examenes": [{"curso": "Arte", "fecha": "2025-10-20", "avisos": []},
+                      {"curso": "Química", "fecha": "2025-10-21", "avisos": [25, 15, 40]}]},
+        {"nombre": "Sin número", "examenes": []},
+    ]
+
+
+def test_leer_estudiantes_por_bloques_chicos(tmp_path):
+    ruta = tmp_path / "data.json"
+    ruta.write_text(json.dumps(_estudiantes(), ensure_ascii=False, indent=2), encoding="utf-8")
+    assert list(sincronizar_json.leer_estudiantes(ruta, bloque=7)) == _estudiantes()
+    ruta.write_text("[ ]", encoding="utf-8")
+    assert list(sincronizar_json.leer_estudiantes(ruta, bloque=1)) == []
+    ruta.write_text('[{"nombre": "Ana"}, {"nom', encoding="utf-8")
+    with pytest.raises(ValueError):
+        list(sincronizar_json.leer_estudiantes(ruta, bloque=4))
+
+
+def test_importar_upsert_con_recordatorios_y_diario(tmp_path, sesiones):
+    ruta = tmp_path / "data.json"
+    ruta.write_text(json.dumps(_estudiantes(), ensure_ascii=False), encoding="utf-8")
+    stats = sincronizar_json.importar(ruta, sesiones, lote=2)
+    assert (stats["estudiantes"], stats["omitidos"], stats["usuarios"], stats["examenes"]) == (3, 1, 2, 3)
+
+    # un cambio que solo está en el diario, y una segunda importación que actualiza en vez de duplicar
+    luis = _estudiantes()[1]
+    luis["examenes"][0]["fecha"] = "2025-11-01"
+    DiarioDatos(ruta).registrar(luis)
+    sincronizar_json.importar(ruta, sesiones, lote=2)
+
+    session = sesiones()
+    ana = session.query(Usuario).filter_by(telefono="whatsapp:+51900000001").one()
+    assert ana.usar_globales and de_mascara(ana.avisos_globales_mask) == [20, 10]
+    assert ana.examenes[0].avisos_mask == 0
+    luis = session.query(Usuario).filter_by(telefono="whatsapp:+51900000002").one()
+    assert [(e.curso, e.fecha, de_mascara(e.avisos_mask)) for e in luis.examenes] == [
+        ("Arte", date(2025, 11, 1), [30, 10, 5]), ("Química", date(2025, 10, 21), [25, 15])]
+    # los recordatorios son los mismos que habría calculado el ORM
+    for examen in session.query(Examen):
+        antes = sorted((r.fecha_aviso, r.dias) for r in examen.recordatorios)
+        sincronizar_recordatorios(examen)
+        assert antes == sorted((r.fecha_aviso, r.dias) for r in examen.recordatorios)
+    assert session.query(Recordatorio).count() == 2 + 3 + 2
+    session.close()
+
+
+def test_exportar_conserva_nombres_y_avisos(tmp_path, sesiones):
+    ruta = tmp_path / "data.json"
+    ruta.write_text(json.dumps(_estudiantes()[:2], ensure_ascii=False), encoding="utf-8")
+    session = sesiones()
+    nuevo = Usuario(telefono="whatsapp:+51900000003", avisos_globales_mask=a_mascara([15]))
+    nuevo.examenes.append(Examen(curso="Arte", fecha=date(2025, 12, 1)))
+    session.add(nuevo)
+    session.commit()
+    session.close()
+    sincronizar_json.importar(ruta, sesiones)
+    DiarioDatos(ruta).registrar({"nombre": "Eva", "telefono": "+51900000009", "examenes": []})
+
+    stats = sincronizar_json.exportar(ruta, sesiones, lote=2)
+    assert (stats["usuarios"], stats["examenes"]) == (3, 4)
+    assert not DiarioDatos(ruta).diario.exists()
+    datos = json.loads(ruta.read_text(encoding="utf-8"))
+    assert [st["nombre"] for st in datos] == ["whatsapp:+51900000003", "Ana", "Luis"]
+    assert datos[0]["usar_globales"] and datos[0]["avisos_globales"] == [15]
+    assert datos[2]["examenes"][0] == {"curso": "Arte", "fecha": "2025-10-20", "avisos": [30, 10, 5]}
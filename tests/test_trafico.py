@@ -0,0 +1,43 @@
+# tests/test_trafico.py
+import trafico
+import whatsapp_webhook
+
+
+def test_generar_es_reproducible_y_registra_primero():
+    peticiones = trafico.generar(telefonos=20, mensajes=300, tasa=100, semilla=7, reintentos=0.05)
+    assert peticiones == trafico.generar(telefonos=20, mensajes=300, tasa=100, semilla=7, reintentos=0.05)
+    assert len(peticiones) > 300  # los reintentos repiten MessageSid
+    assert [p["ts"] for p in peticiones] == sorted(p["ts"] for p in peticiones)
+    primero = {}
+    for p in peticiones:
+        primero.setdefault(p["From"], p["Body"])
+    assert set(primero.values()) == {"hola"}
+
+
+def test_reproducir_en_proceso_sin_errores(monkeypatch):
+    import limitador
+    monkeypatch.setattr(limitador, "LIMITADOR", limitador.Limitador(tasa=0))
+    peticiones = trafico.generar(telefonos=15, mensajes=200, tasa=1000, semilla=3, reintentos=0.05)
+    resultados = trafico.reproducir(peticiones, trafico.enviar_local(), concurrencia=4, velocidad=0)
+    informe = trafico.resumir(resultados, pared=1.0)
+    assert informe["n"] == len(peticiones)
+    assert informe["errores"] == {}
+    assert informe["histograma_ms"]["+Inf"] == len(peticiones)
+    assert informe["por_comando"]["MIS EXAMENES"]["n"] > 0
+
+
+def test_grabar_y_comparar_respuestas(tmp_path, monkeypatch):
+    ruta = tmp_path / "grabado.jsonl"
+    monkeypatch.setattr(trafico, "GRABADORA", trafico.Grabadora(ruta))
+    client = whatsapp_webhook.app.test_client()
+    telefono = "whatsapp:+51970009999"
+    for i, body in enumerate(["hola", "MENU"]):
+        client.post("/whatsapp", data={"Body": body, "From": telefono, "MessageSid": f"SMgrabado{i}"})
+    trafico.GRABADORA.cerrar()
+
+    grabado = trafico.leer(ruta)
+    assert [(p["Body"], p["MessageSid"]) for p in grabado] == [("hola", "SMgrabado0"), ("MENU", "SMgrabado1")]
+    assert "Te acabo de registrar" in grabado[0]["respuesta"]
+    # mismos MessageSid: el webhook devuelve la respuesta guardada, idéntica a la grabada
+    resultados = trafico.reproducir(grabado, trafico.enviar_local(), concurrencia=2, velocidad=0, comparar=True)
+    assert [error for _, _, error, _ in resultados] == [None, None]
@@ -0,0 +1,52 @@
+# tests/test_webhook.py
+import uuid
+import pytest
+import whatsapp_webhook
+
+
+@pytest.fixture
+def client():
+    return whatsapp_webhook.app.test_client()
+
+
+@pytest.fixture
+def telefono():
+    return f"whatsapp:+519{uuid.uuid4().int % 10**8:08d}"
+
+
+def enviar(client, telefono, texto):
+    r = client.post("/whatsapp", data={"Body": texto, "From": telefono})
+    assert r.status_code == 200
+    return r.get_data(as_text=True)
+
+
+def test_flujo_basico(client, telefono):
+    assert "Te acabo de registrar" in enviar(client, telefono, "hola")
+    assert "Examen agregado" in enviar(client, telefono, "AGREGAR EXAMEN Física 2030-05-10 20 10")
+    assert "Física: 2030-05-10" in enviar(client, telefono, "MIS EXAMENES")
+    assert "Fecha actualizada" in enviar(client, telefono, "CAMBIAR FECHA Física 2030-06-01")
+    assert "No entendí" in enviar(client, telefono, "qué tal")
+
+
+def test_metrics_expone_tiempos_por_comando(client, telefono):
+    enviar(client, telefono, "hola")
+    enviar(client, telefono, "MENU")
+    enviar(client, telefono, "MIS EXAMENES")
+
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.content_type.startswith("text/plain")
+    texto = r.get_data(as_text=True)
+    assert 'webhook_peticiones_total{comando="MENU"}' in texto
+    assert 'webhook_db_segundos_count{comando="MIS EXAMENES"}' in texto
+    assert 'webhook_render_segundos_bucket{comando="MENU",le="+Inf"}' in texto
+    assert 'webhook_consulta_segundos_count{comando="REGISTRO",consulta="INSERT usuarios"}' in texto
+
+
+def test_mensaje_de_varias_lineas(client, telefono):
+    enviar(client, telefono, "hola")
+    texto = enviar(client, telefono, "Física 2030-05-10 20 10\nQuímica 2030-05-12\nELIMINAR EXAMEN Arte")
+    assert "2 de 3 cambios guardados" in texto and "No encontré el curso" in texto
+    texto = enviar(client, telefono, "MIS EXAMENES\nCAMBIAR FECHA Química 2030-06-01")
+    assert "1 de 1 cambios guardados" in texto
+    assert "Química: 2030-06-01" in enviar(client, telefono, "MIS EXAMENES")
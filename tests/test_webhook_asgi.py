@@ -0,0 +1,71 @@
+# tests/test_webhook_asgi.py
+import uuid
+import asyncio
+from urllib.parse import urlencode
+import webhook_asgi
+
+
+async def llamar(metodo, ruta, cuerpo=b""):
+    """Una petición HTTP directa a la app ASGI; devuelve (status, texto)."""
+    recibido = []
+    mensajes = [{"type": "http.request", "body": cuerpo, "more_body": False}]
+
+    async def receive():
+        return mensajes.pop(0)
+
+    async def send(mensaje):
+        recibido.append(mensaje)
+
+    scope = {"type": "http", "method": metodo, "path": ruta, "query_string": b"", "headers": []}
+    await webhook_asgi.app(scope, receive, send)
+    return recibido[0]["status"], recibido[1]["body"].decode("utf-8")
+
+
+async def con_lifespan(prueba):
+    """Corre `prueba` entre el startup y el shutdown de la app, como uvicorn."""
+    entrada, salida = asyncio.Queue(), asyncio.Queue()
+    tarea = asyncio.create_task(webhook_asgi.app({"type": "lifespan"}, entrada.get, salida.put))
+    await entrada.put({"type": "lifespan.startup"})
+    assert (await salida.get())["type"] == "lifespan.startup.complete"
+    try:
+        await prueba()
+    finally:
+        await entrada.put({"type": "lifespan.shutdown"})
+        await tarea
+
+
+def test_flujo_asgi():
+    telefono = f"whatsapp:+519{uuid.uuid4().int % 10**8:08d}"
+
+    async def enviar(texto):
+        status, xml = await llamar("POST", "/whatsapp", urlencode({"Body": texto, "From": telefono}).encode())
+        assert status == 200
+        return xml
+
+    async def prueba():
+        assert "Te acabo de registrar" in await enviar("hola")
+        assert "Examen agregado" in await enviar("AGREGAR EXAMEN Física 2030-05-10 20 10")
+        assert "Física: 2030-05-10" in await enviar("MIS EXAMENES")
+        webhook_asgi.cache_usuarios.CACHE.limpiar()
+        assert "Física: 2030-05-10" in await enviar("MIS EXAMENES")  # caché fría: pasa por el pool de hilos
+        assert "Fecha inválida" in await enviar("CAMBIAR FECHA Física 2030-13-01")
+        assert (await llamar("GET", "/whatsapp"))[0] == 405
+        assert (await llamar("POST", "/whatsapp", b"x" * (webhook_asgi.MAX_CUERPO + 1)))[0] == 413
+        metricas = (await llamar("GET", "/metrics"))[1]
+        assert 'webhook_consulta_segundos_count{comando="MIS EXAMENES",consulta="SELECT usuarios"}' in metricas
+
+    asyncio.run(con_lifespan(prueba))
+
+
+def test_error_responde_500_y_cuenta(monkeypatch):
+    def falla(*args):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(webhook_asgi, "_atender_en_hilo", falla)
+
+    async def prueba():
+        cuerpo = urlencode({"Body": "SET GLOBALES 20 10", "From": "whatsapp:+51900000000"}).encode()
+        assert (await llamar("POST", "/whatsapp", cuerpo))[0] == 500
+        assert 'webhook_peticiones_total{comando="ERROR"}' in (await llamar("GET", "/metrics"))[1]
+
+    asyncio.run(con_lifespan(prueba))
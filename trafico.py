@@ -0,0 +1,326 @@
+# trafico.py
+# Graba, genera y reproduce tráfico del webhook /whatsapp (los POST de Twilio: Body, From, MessageSid),
+# para probar capacidad antes de los picos de matrícula sin mandar mensajes reales.
+#   Grabar: WEBHOOK_GRABAR=trafico.jsonl python whatsapp_webhook.py  (o uvicorn webhook_asgi:app)
+#   Generar: python trafico.py generar trafico.jsonl --telefonos 500 --mensajes 20000 --tasa 50
+#   Reproducir: python trafico.py reproducir trafico.jsonl [--url http://127.0.0.1:5000/whatsapp]
+#               [--concurrencia 32] [--velocidad 2]
+# Una línea JSONL por mensaje: {"ts", "Body", "From", "MessageSid", "respuesta"?}; "ts" en segundos.
+# Sin --url se reproduce en este proceso contra whatsapp_webhook.app, sobre una base temporal
+# vacía (o --base): no hace falta red ni servidor.
+import os
+import sys
+import json
+import time
+import queue
+import random
+import argparse
+import tempfile
+import threading
+import zlib
+import urllib.error
+import urllib.parse
+import urllib.request
+from pathlib import Path
+
+# ---------------- CONFIG ----------------
+RUTA_GRABACION = os.getenv("WEBHOOK_GRABAR")
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+CAMPOS = ("Body", "From", "MessageSid")
+LIMITADO = "limitado"  # respuesta fija de limitador.py: no es un error, se informa aparte
+
+# Tráfico sintético: (peso, plantilla); {k} es un número de curso del teléfono
+MEZCLA_SINTETICA = [
+    (30, "MIS EXAMENES"),
+    (10, "MENU"),
+    (15, "AGREGAR EXAMEN Curso {k} 2030-{mes:02d}-{dia:02d} 20 10"),
+    (10, "CAMBIAR FECHA Curso {k} 2030-{mes:02d}-{dia:02d}"),
+    (10, "SET GLOBALES {d} 10 5"),
+    (5, "SET CURSO Curso {k} 15 5"),
+    (5, "USAR GLOBALES SI"),
+    (5, "ELIMINAR EXAMEN Curso {k}"),
+    (5, "Curso {k} 2030-{mes:02d}-{dia:02d}\nCurso {k2} 2030-{mes:02d}-{dia2:02d} 10\nMIS EXAMENES"),
+    (5, "hola que tal"),
+]
+
+
+# ---------------- Grabación ----------------
+class Grabadora:
+    """Añade cada mensaje atendido (y su respuesta) a un JSONL; segura entre hilos."""
+
+    def __init__(self, ruta):
+        self.ruta = Path(ruta)
+        self._lock = threading.Lock()
+        self._archivo = open(self.ruta, "a", encoding="utf-8")
+
+    def anotar(self, valores, respuesta: str):
+        linea = {"ts": round(time.time(), 6), **{c: valores.get(c) for c in CAMPOS}, "respuesta": respuesta}
+        texto = json.dumps(linea, ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._archivo is None:  # ya cerrada: grabar nunca debe tumbar el webhook
+                return
+            self._archivo.write(texto)
+            self._archivo.flush()
+
+    def cerrar(self):
+        with self._lock:
+            if self._archivo is not None:
+                self._archivo.close()
+                self._archivo = None
+
+
+GRABADORA = Grabadora(RUTA_GRABACION) if RUTA_GRABACION else None
+
+
+def leer(ruta):
+    with open(ruta, encoding="utf-8") as f:
+        return [json.loads(linea) for linea in f if linea.strip()]
+
+
+def escribir(ruta, peticiones):
+    with open(ruta, "w", encoding="utf-8") as f:
+        for p in peticiones:
+            f.write(json.dumps(p, ensure_ascii=False) + "\n")
+
+
+# ---------------- Tráfico sintético ----------------
+def generar(telefonos: int, mensajes: int, tasa: float, semilla: int = 42, reintentos: float = 0.0):
+    """
+    Llegadas de Poisson a `tasa` mensajes/s repartidas entre `telefonos`; el primer mensaje de cada
+    teléfono es un saludo (registro). `reintentos`: fracción de mensajes que Twilio repite con el
+    mismo MessageSid unos segundos después.
+    """
+    rnd = random.Random(semilla)
+    pesos = [peso for peso, _ in MEZCLA_SINTETICA]
+    plantillas = [plantilla for _, plantilla in MEZCLA_SINTETICA]
+    nuevos = [f"whatsapp:+5197{i:07d}" for i in range(telefonos)]
+    rnd.shuffle(nuevos)
+    vistos = []
+    peticiones, ts = [], 0.0
+    for _ in range(mensajes):
+        ts += rnd.expovariate(tasa)
+        if nuevos and (not vistos or rnd.random() < len(nuevos) / telefonos):
+            telefono, body = nuevos.pop(), "hola"
+            vistos.append(telefono)
+        else:
+            telefono = rnd.choice(vistos)
+            k = rnd.randrange(8)
+            body = rnd.choices(plantillas, pesos)[0].format(
+                k=k, k2=(k + 1) % 8, mes=rnd.randint(1, 12), dia=rnd.randint(1, 28), dia2=rnd.randint(1, 28),
+                d=rnd.randint(5, 30))
+        sid = f"SM{rnd.getrandbits(128):032x}"
+        peticiones.append({"ts": round(ts, 6), "Body": body, "From": telefono, "MessageSid": sid})
+        if rnd.random() < reintentos:
+            peticiones.append({"ts": round(ts + rnd.uniform(1, 15), 6), "Body": body, "From": telefono,
+                               "MessageSid": sid})
+    peticiones.sort(key=lambda p: p["ts"])
+    return peticiones
+
+
+# ---------------- Reproducción ----------------
+def enviar_http(url):
+    def enviar(valores):
+        cuerpo = urllib.parse.urlencode(valores).encode()
+        try:
+            with urllib.request.urlopen(url, data=cuerpo, timeout=30) as r:
+                return r.status, r.read().decode("utf-8", "replace")
+        except urllib.error.HTTPError as e:
+            return e.code, ""
+    return enviar
+
+
+def enviar_local():
+    """Contra whatsapp_webhook.app en este proceso (importarlo después de fijar DATABASE_URL)."""
+    import whatsapp_webhook
+    locales = threading.local()
+
+    def enviar(valores):
+        client = getattr(locales, "client", None)
+        if client is None:
+            client = locales.client = whatsapp_webhook.app.test_client()
+        r = client.post("/whatsapp", data=valores)
+        return r.status_code, r.get_data(as_text=True)
+    return enviar
+
+
+def clasificar(body: str) -> str:
+    """Nombre del comando para el informe, sin tocar la base."""
+    import comandos
+    if "\n" in body.strip():
+        return "VARIAS"
+    comando, args = comandos.resolver(body)
+    return comando.nombre if comando is not None else ("VACIO" if not args else "OTRO")
+
+
+def verificar(estado: int, cuerpo: str, esperado: str | None = None):
+    """None si la respuesta está bien, LIMITADO si la frenó limitador.py; si no, el motivo."""
+    import limitador
+    if cuerpo in (limitador.RESPUESTA_TELEFONO, limitador.RESPUESTA_SATURADO):
+        return LIMITADO
+    if estado != 200:
+        return f"HTTP {estado}"
+    if "<Response" not in cuerpo:
+        return "no es TwiML"
+    if "Error procesando" in cuerpo:
+        return "error del comando"
+    if esperado is not None and cuerpo != esperado:
+        return "respuesta distinta a la grabada"
+    return None
+
+
+def reproducir(peticiones, enviar, concurrencia: int = 16, velocidad: float = 1.0, comparar: bool = False):
+    """
+    Envía las peticiones respetando sus tiempos (divididos por `velocidad`; 0 = sin esperas) con
+    `concurrencia` hilos. Cada teléfono va siempre al mismo hilo: sus mensajes llegan en orden.
+    Devuelve [(peticion, segundos, error o None, retraso en s respecto a su hora)].
+    """
+    if not peticiones:
+        return []
+    t0 = peticiones[0]["ts"]
+    colas = [queue.Queue() for _ in range(concurrencia)]
+    for p in peticiones:
+        colas[zlib.crc32((p["From"] or "").encode()) % concurrencia].put(p)
+    resultados, lock = [], threading.Lock()
+    inicio = time.perf_counter()
+
+    def trabajar(cola):
+        propios = []
+        while True:
+            try:
+                p = cola.get_nowait()
+            except queue.Empty:
+                break
+            retraso = 0.0
+            if velocidad > 0:
+                debido = inicio + (p["ts"] - t0) / velocidad
+                espera = debido - time.perf_counter()
+                if espera > 0:
+                    time.sleep(espera)
+                else:
+                    retraso = -espera
+            t = time.perf_counter()
+            try:
+                estado, cuerpo = enviar({c: p[c] for c in CAMPOS if p.get(c) is not None})
+            except OSError as e:
+                estado, cuerpo = 0, str(e)
+            duracion = time.perf_counter() - t
+            esperado = p.get("respuesta") if comparar else None
+            propios.append((p, duracion, verificar(estado, cuerpo, esperado), retraso))
+        with lock:
+            resultados.extend(propios)
+
+    hilos = [threading.Thread(target=trabajar, args=(cola,)) for cola in colas]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    return resultados
+
+
+def _percentil(ordenadas, p):
+    if not ordenadas:
+        return 0.0
+    return ordenadas[max(0, min(len(ordenadas) - 1, int(round(p / 100 * len(ordenadas))) - 1))]
+
+
+def resumir(resultados, pared: float) -> dict:
+    duraciones = sorted(d * 1000 for _, d, _, _ in resultados)
+    histograma = {str(b): sum(1 for d in duraciones if d <= b) for b in BUCKETS_MS}
+    histograma["+Inf"] = len(duraciones)
+    errores = {}
+    for _, _, error, _ in resultados:
+        if error and error != LIMITADO:
+            errores[error] = errores.get(error, 0) + 1
+    por_comando = {}
+    for p, d, _, _ in resultados:
+        por_comando.setdefault(clasificar(p["Body"] or ""), []).append(d * 1000)
+    return {
+        "n": len(duraciones),
+        "pared_s": round(pared, 3),
+        "throughput_por_s": round(len(duraciones) / pared, 1) if pared else 0.0,
+        "p50_ms": round(_percentil(duraciones, 50), 3),
+        "p90_ms": round(_percentil(duraciones, 90), 3),
+        "p99_ms": round(_percentil(duraciones, 99), 3),
+        "max_ms": round(duraciones[-1], 3) if duraciones else 0.0,
+        "retraso_max_s": round(max((r for _, _, _, r in resultados), default=0.0), 3),
+        "limitados": sum(1 for _, _, error, _ in resultados if error == LIMITADO),
+        "errores": errores,
+        "histograma_ms": histograma,
+        "por_comando": {nombre: {"n": len(ds), "p50_ms": round(_percentil(sorted(ds), 50), 3),
+                                 "p99_ms": round(_percentil(sorted(ds), 99), 3)}
+                        for nombre, ds in sorted(por_comando.items())},
+    }
+
+
+def imprimir(informe: dict):
+    print(f"[INFO] {informe['n']} mensajes en {informe['pared_s']}s ({informe['throughput_por_s']}/s); "
+          f"p50={informe['p50_ms']}ms p90={informe['p90_ms']}ms p99={informe['p99_ms']}ms max={informe['max_ms']}ms")
+    if informe["limitados"]:
+        print(f"[INFO] {informe['limitados']} mensajes recibieron la respuesta fija del limitador")
+    if informe["retraso_max_s"] > 1:
+        print(f"[WARN] El reproductor se atrasó hasta {informe['retraso_max_s']}s: sube --concurrencia "
+              f"o baja --velocidad")
+    anterior, total = 0, informe["n"] or 1
+    for limite, acumulado in informe["histograma_ms"].items():
+        cuenta = acumulado - anterior
+        anterior = acumulado
+        print(f"  <= {limite:>6} ms {cuenta:7d} {'#' * round(50 * cuenta / total)}")
+    for nombre, r in informe["por_comando"].items():
+        print(f"  {nombre:16s} n={r['n']:6d} p50={r['p50_ms']}ms p99={r['p99_ms']}ms")
+    for error, cuenta in informe["errores"].items():
+        print(f"[ERROR] {cuenta} respuestas: {error}")
+
+
+# ---------------- CLI ----------------
+def main():
+    parser = argparse.ArgumentParser(description="Genera y reproduce tráfico del webhook /whatsapp.")
+    sub = parser.add_subparsers(dest="accion", required=True)
+    gen = sub.add_parser("generar", help="Tráfico sintético a un JSONL.")
+    gen.add_argument("salida")
+    gen.add_argument("--telefonos", type=int, default=500)
+    gen.add_argument("--mensajes", type=int, default=10000)
+    gen.add_argument("--tasa", type=float, default=50, help="Mensajes por segundo (llegadas de Poisson).")
+    gen.add_argument("--reintentos", type=float, default=0.0, help="Fracción repetida con el mismo MessageSid.")
+    gen.add_argument("--semilla", type=int, default=42)
+    rep = sub.add_parser("reproducir", help="Reproduce un JSONL grabado o generado.")
+    rep.add_argument("archivo")
+    rep.add_argument("--url", default=None, help="Webhook ya levantado; sin esto, whatsapp_webhook.app en este proceso.")
+    rep.add_argument("--base", default=None, help="Sin --url: DATABASE_URL a usar (por defecto, una base temporal vacía).")
+    rep.add_argument("--concurrencia", type=int, default=16)
+    rep.add_argument("--velocidad", type=float, default=1.0, help="Multiplicador de tiempo; 0 = lo más rápido posible.")
+    rep.add_argument("--comparar", action="store_true", help="Exigir la misma respuesta que la grabada.")
+    rep.add_argument("--salida", default=None, help="Archivo JSON con el informe.")
+    args = parser.parse_args()
+
+    if args.accion == "generar":
+        peticiones = generar(args.telefonos, args.mensajes, args.tasa, args.semilla, args.reintentos)
+        escribir(args.salida, peticiones)
+        print(f"[INFO] {len(peticiones)} mensajes de {args.telefonos} teléfonos en {args.salida} "
+              f"({peticiones[-1]['ts']:.1f}s a velocidad 1)")
+        return
+
+    peticiones = leer(args.archivo)
+    tmp = None
+    if args.url:
+        enviar = enviar_http(args.url)
+    else:
+        if args.base:
+            os.environ["DATABASE_URL"] = args.base
+        else:
+            tmp = tempfile.TemporaryDirectory()
+            os.environ["DATABASE_URL"] = f"sqlite:///{Path(tmp.name) / 'trafico.db'}"
+        enviar = enviar_local()
+    inicio = time.perf_counter()
+    resultados = reproducir(peticiones, enviar, args.concurrencia, args.velocidad, args.comparar)
+    informe = resumir(resultados, time.perf_counter() - inicio)
+    imprimir(informe)
+    if args.salida:
+        Path(args.salida).write_text(json.dumps(informe, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"[INFO] Informe guardado en {args.salida}")
+    if tmp is not None:
+        tmp.cleanup()
+    sys.exit(1 if informe["errores"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 from models import SessionLocal, Usuario, Examen
+from avisos import a_texto
 
 session = SessionLocal()
 
@@ -6,8 +7,8 @@ usuarios = session.query(Usuario).all()
 
 print("=== USUARIOS Y EXÁMENES ===")
 for u in usuarios:
-    print(f"Usuario: {u.telefono}, avisos_globales: {u.avisos_globales}, usar_globales: {u.usar_globales}")
+    print(f"Usuario: {u.telefono}, avisos_globales: {a_texto(u.avisos_globales_mask)}, usar_globales: {u.usar_globales}")
     for ex in u.examenes:
-        print(f"   - Examen: {ex.curso}, fecha: {ex.fecha}, avisos: {ex.avisos}")
+        print(f"   - Examen: {ex.curso}, fecha: {ex.fecha}, avisos: {a_texto(ex.avisos_mask)}")
 
 session.close()
@@ -1,5 +1,6 @@
 # ver_usuarios.py
 from models import SessionLocal, Usuario, Examen, init_db
+from avisos import a_texto
 
 def main():
     init_db()
@@ -12,9 +13,9 @@ def main():
     else:
         for u in usuarios:
             print(f"\nUsuario: {u.telefono} | Zona horaria: {u.timezone}")
-            print(f"   Avisos globales: {u.avisos_globales} | Usar globales: {u.usar_globales}")
+            print(f"   Avisos globales: {a_texto(u.avisos_globales_mask)} | Usar globales: {u.usar_globales}")
             for ex in u.examenes:
-                print(f"      - Examen: {ex.curso} | Fecha: {ex.fecha} | Avisos: {ex.avisos or 'Por defecto'}")
+                print(f"      - Examen: {ex.curso} | Fecha: {ex.fecha} | Avisos: {a_texto(ex.avisos_mask) or 'Por defecto'}")
 
     session.close()
 
@@ -0,0 +1,192 @@
+# webhook_asgi.py
+# Variante ASGI del webhook: mismas rutas (/whatsapp, /, /metrics) y mismos comandos que
+# whatsapp_webhook.py, pero sobre asyncio.
+#   - Lecturas con el usuario en cache_usuarios (MENU, MIS EXAMENES, vacío, desconocido): se
+#     responden en el loop, sin hilos ni base. Con WEBHOOK_ESCRITURA_DIFERIDA=1 también las
+#     escrituras de usuarios cacheados: solo validan y encolan (escritura_diferida.py).
+#   - Todo lo que toca SQLite (escrituras, registro, cachés frías) corre en un pool acotado de hilos
+#     (DB_CONCURRENCIA), así una escritura lenta no frena el loop ni a las lecturas cacheadas.
+#
+#   uvicorn webhook_asgi:app --host 0.0.0.0 --port 5000
+import os
+import time
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from datetime import datetime
+from urllib.parse import parse_qs
+from twilio.twiml.messaging_response import MessagingResponse
+from models import POOL_SIZE, SessionLocal
+import cache_usuarios
+import comandos
+import metricas
+import escritura_diferida
+import duplicados
+import limitador
+import trafico
+import whatsapp_webhook  # init_db, métricas y _atender compartidos con la versión Flask
+
+# ---------------- CONFIG ----------------
+DB_CONCURRENCIA = int(os.getenv("DB_CONCURRENCIA", POOL_SIZE))  # hilos con conexión a la base
+MAX_CUERPO = 64 * 1024  # los webhooks de Twilio pesan unos pocos KB
+
+_ejecutor = ThreadPoolExecutor(DB_CONCURRENCIA, thread_name_prefix="webhook-db")
+
+
+# ---------------- Webhook ----------------
+def _atender_en_hilo(incoming, from_phone, resp):
+    session = SessionLocal()
+    try:
+        return whatsapp_webhook._atender(session, incoming, from_phone, resp)
+    finally:
+        session.close()
+
+
+async def _atender(incoming, from_phone, resp):
+    diferida = escritura_diferida.COLA is not None
+    pasos = comandos.resolver_lineas(incoming) if "\n" in incoming else [comandos.resolver(incoming)]
+    if all(comando is None or comando.lectura or (diferida and comando.aplicar is not None)
+           for comando, _ in pasos):
+        snap = cache_usuarios.CACHE.obtener(from_phone)
+        if snap is not None:
+            metricas.REGISTRO.incrementar(whatsapp_webhook.M_CACHE, "acierto")
+            return whatsapp_webhook._atender_usuario(None, snap, None, incoming, from_phone, resp)
+    # copy_context: las consultas del hilo se suman a las métricas de esta petición
+    contexto = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        _ejecutor, contexto.run, _atender_en_hilo, incoming, from_phone, resp)
+
+
+async def atender_whatsapp(valores):
+    """Devuelve (status, cuerpo): 200 con el TwiML, o 500 si el mensaje falló."""
+    rechazo = limitador.LIMITADOR.admitir(valores.get("From"))
+    if rechazo is not None:
+        estado, cuerpo = 200, rechazo
+    else:
+        try:
+            estado, cuerpo = await _atender_sin_reintentos(valores)
+        finally:
+            limitador.LIMITADOR.salir()
+    if trafico.GRABADORA is not None and estado == 200:
+        trafico.GRABADORA.anotar(valores, cuerpo)
+    return estado, cuerpo
+
+
+async def _atender_sin_reintentos(valores):
+    sid = valores.get("MessageSid")
+    if not sid:
+        return await _atender_mensaje(valores)
+    dedupe, loop = duplicados.DEDUPE, asyncio.get_running_loop()
+    if dedupe.sesiones is not None:
+        previa = await loop.run_in_executor(_ejecutor, dedupe.reclamar, sid)
+    else:
+        previa = dedupe.reclamar(sid, bloquear=False)
+        if previa is duplicados.EN_CURSO:  # el primer intento sigue: se espera fuera del loop
+            previa = await loop.run_in_executor(None, dedupe.reclamar, sid)
+    if previa is not None:
+        whatsapp_webhook._registrar_duplicado(previa)
+        return 200, previa
+
+    estado, cuerpo = await _atender_mensaje(valores)
+    terminar = partial(dedupe.guardar, sid, cuerpo) if estado == 200 else partial(dedupe.soltar, sid)
+    if dedupe.sesiones is not None:
+        await loop.run_in_executor(_ejecutor, terminar)
+    else:
+        terminar()
+    return estado, cuerpo
+
+
+async def _atender_mensaje(valores):
+    inicio = time.perf_counter()
+    metricas.iniciar_peticion()
+    incoming = valores.get("Body", "").strip()
+    from_phone = valores.get("From")
+    resp = MessagingResponse()
+    try:
+        comando = await _atender(incoming, from_phone, resp)
+    except Exception as e:
+        print(f"[ERROR] Webhook ASGI: {from_phone}: {e}")
+        whatsapp_webhook._registrar_metricas("ERROR", time.perf_counter() - inicio, metricas.terminar_peticion(), 0.0)
+        return 500, "Internal Server Error"
+    consultas = metricas.terminar_peticion()
+
+    t_render = time.perf_counter()
+    xml = str(resp)
+    fin = time.perf_counter()
+    whatsapp_webhook._registrar_metricas(comando, fin - inicio, consultas, fin - t_render)
+    return 200, xml
+
+
+# ---------------- ASGI ----------------
+async def _leer_cuerpo(receive) -> bytes:
+    cuerpo = bytearray()
+    while True:
+        mensaje = await receive()
+        cuerpo += mensaje.get("body", b"")
+        if len(cuerpo) > MAX_CUERPO:
+            raise ValueError("cuerpo demasiado grande")
+        if not mensaje.get("more_body"):
+            return bytes(cuerpo)
+
+
+def _valores(scope, cuerpo: bytes) -> dict:
+    """Como request.values de Flask: query string + formulario (gana el primer valor)."""
+    valores = {}
+    for fuente in (scope.get("query_string", b""), cuerpo):
+        for clave, lista in parse_qs(fuente.decode("utf-8", "replace"), keep_blank_values=True).items():
+            valores.setdefault(clave, lista[0])
+    return valores
+
+
+async def _responder(send, estado: int, texto: str, content_type="text/plain; charset=utf-8"):
+    datos = texto.encode("utf-8")
+    await send({"type": "http.response.start", "status": estado,
+                "headers": [(b"content-type", content_type.encode()), (b"content-length", str(len(datos)).encode())]})
+    await send({"type": "http.response.body", "body": datos})
+
+
+async def _lifespan(receive, send):
+    while True:
+        mensaje = await receive()
+        if mensaje["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif mensaje["type"] == "lifespan.shutdown":
+            loop = asyncio.get_running_loop()
+            if escritura_diferida.COLA is not None:
+                await loop.run_in_executor(None, escritura_diferida.COLA.vaciar, escritura_diferida.ESPERA_BARRERA)
+            await loop.run_in_executor(None, whatsapp_webhook.engine.dispose)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+
+    ruta, metodo = scope["path"], scope["method"]
+    if ruta == "/whatsapp" and metodo == "POST":
+        try:
+            cuerpo = await _leer_cuerpo(receive)
+        except ValueError:
+            return await _responder(send, 413, "Payload demasiado grande")
+        estado, xml = await atender_whatsapp(_valores(scope, cuerpo))
+        if estado != 200:
+            return await _responder(send, estado, xml)
+        return await _responder(send, 200, xml, "text/xml; charset=utf-8")
+    if ruta == "/" and metodo == "GET":
+        return await _responder(send, 200, "WhatsApp Academic Bot OK")
+    if ruta == "/metrics" and metodo == "GET":
+        return await _responder(send, 200, metricas.REGISTRO.exponer(), metricas.CONTENT_TYPE)
+    if ruta in ("/whatsapp", "/", "/metrics"):
+        return await _responder(send, 405, "Method Not Allowed")
+    return await _responder(send, 404, "Not Found")
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    print(f"[{datetime.now()}] Iniciando webhook ASGI en http://127.0.0.1:5000 ...")
+    uvicorn.run(app, host="0.0.0.0", port=5000)
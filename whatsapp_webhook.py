@@ -1,262 +1,210 @@
+import time
 from datetime import datetime
 from flask import Flask, request
 from twilio.twiml.messaging_response import MessagingResponse
-from models import SessionLocal, Usuario, Examen, init_db
-
-# ---------------- CONFIG ----------------
-MIN_DIA = 5
-MAX_DIA = 30
-MAX_AVISOS = 4
-AVISOS_DEFAULT = [30, 20, 10, 5]
+from sqlalchemy.orm import selectinload
+from models import SessionLocal, Usuario, init_db, engine
+from avisos import MASCARA_DEFAULT
+import cache_usuarios
+import comandos
+import metricas
+import escritura_diferida
+import duplicados
+import limitador
+import trafico
 
 app = Flask(__name__)
 init_db()
 
-# ---------------- Utils ----------------
-def normalizar_avisos(avisos):
-    if not avisos:
-        return AVISOS_DEFAULT
-    try:
-        avisos = [int(x) for x in avisos]
-    except ValueError:
-        return AVISOS_DEFAULT
-    filtrados = sorted({d for d in avisos if MIN_DIA <= d <= MAX_DIA}, reverse=True)
-    return filtrados[:MAX_AVISOS] if filtrados else AVISOS_DEFAULT
-
-def avisos_to_list(avisos_str):
-    if not avisos_str:
-        return []
-    return [int(x) for x in avisos_str.split(",") if x.strip().isdigit()]
-
-def avisos_to_str(lst):
-    return ",".join(map(str, lst))
-
-def pretty_examenes(usuario: Usuario):
-    if not usuario.examenes:
-        return "No tienes exámenes registrados."
-    lines = []
-    for ex in usuario.examenes:
-        avisos = avisos_to_list(ex.avisos)
-        if (not avisos) and usuario.usar_globales:
-            avisos_str = f"(usa globales: {usuario.avisos_globales})"
-        else:
-            avisos_str = str(avisos if avisos else AVISOS_DEFAULT)
-        lines.append(f"- {ex.curso}: {ex.fecha} | avisos: {avisos_str}")
-    return "\n".join(lines)
-
-def help_text():
-    return (
-        "📚 *Menú de configuración*\n\n"
-        "• *MENU* → ver este menú\n"
-        "• *MIS EXAMENES* → lista tus exámenes\n"
-        "• *SET GLOBALES 30 20 10 5* → define avisos globales (5–30 días, máx 4)\n"
-        "• *USAR GLOBALES SI* o *USAR GLOBALES NO*\n"
-        "• *SET CURSO <curso> 20 10 5* → avisos solo para ese curso\n"
-        "• *AGREGAR EXAMEN <curso> <YYYY-MM-DD> [avisos...]*\n"
-        "• *CAMBIAR FECHA <curso> <YYYY-MM-DD>*\n"
-        "• *ELIMINAR EXAMEN <curso>*\n"
-    )
+# ---------------- Métricas ----------------
+metricas.instrumentar_engine(engine)
+M_PETICIONES = metricas.REGISTRO.contador(
+    "webhook_peticiones_total", "Mensajes atendidos por comando.", ("comando",))
+M_DURACION = metricas.REGISTRO.histograma(
+    "webhook_duracion_segundos", "Tiempo total del handler /whatsapp por comando.", ("comando",))
+M_DB = metricas.REGISTRO.histograma(
+    "webhook_db_segundos", "Tiempo en SQL por mensaje, por comando.", ("comando",))
+M_RENDER = metricas.REGISTRO.histograma(
+    "webhook_render_segundos", "Tiempo generando el TwiML de respuesta, por comando.", ("comando",))
+M_CONSULTA = metricas.REGISTRO.histograma(
+    "webhook_consulta_segundos", "Tiempo de cada sentencia SQL, por comando y tipo de consulta.",
+    ("comando", "consulta"))
+M_CACHE = metricas.REGISTRO.contador(
+    "webhook_cache_usuarios_total", "Búsquedas de usuario por teléfono: acierto o fallo de la caché.", ("resultado",))
+M_ETAPA = metricas.REGISTRO.histograma(
+    "webhook_etapa_segundos", "Tiempo de cada etapa del comando (parse, ejecutar, render).", ("comando", "etapa"))
+M_DUPLICADOS = metricas.REGISTRO.contador(
+    "webhook_duplicados_total", "Reintentos de Twilio (MessageSid repetido) contestados sin ejecutar el comando.",
+    ("resultado",))
 
 # ---------------- Webhook ----------------
 @app.route("/whatsapp", methods=["POST"])
 def whatsapp_webhook():
-    session = SessionLocal()
+    # Un remitente que inunda o un pico de carga reciben una respuesta fija, sin tocar la base
+    xml = limitador.LIMITADOR.admitir(request.values.get("From"))
+    if xml is None:
+        try:
+            xml = _whatsapp_sin_reintentos()
+        finally:
+            limitador.LIMITADOR.salir()
+    if trafico.GRABADORA is not None:
+        trafico.GRABADORA.anotar(request.values, xml)
+    return xml
+
+def _whatsapp_sin_reintentos():
+    # Reintento de Twilio (mismo MessageSid): misma respuesta, sin volver a ejecutar el comando
+    sid = request.values.get("MessageSid")
+    if not sid:
+        return _whatsapp()
+    previa = duplicados.DEDUPE.reclamar(sid)
+    if previa is not None:
+        _registrar_duplicado(previa)
+        return previa
+    try:
+        xml = _whatsapp()
+    except Exception:
+        duplicados.DEDUPE.soltar(sid)
+        raise
+    duplicados.DEDUPE.guardar(sid, xml)
+    return xml
+
+def _registrar_duplicado(respuesta):
+    resultado = "sin_respuesta" if respuesta == duplicados.SIN_RESPUESTA else "respondido"
+    metricas.REGISTRO.incrementar(M_DUPLICADOS, resultado)
+
+def _whatsapp():
+    inicio = time.perf_counter()
+    metricas.iniciar_peticion()
     incoming = request.values.get("Body", "").strip()
     from_phone = request.values.get("From")  # formato: whatsapp:+51XXXXXXXXX
     resp = MessagingResponse()
 
-    # buscar/crear usuario
-    usuario = session.query(Usuario).filter_by(telefono=from_phone).first()
+    session = SessionLocal()
+    try:
+        comando = _atender(session, incoming, from_phone, resp)
+    finally:
+        session.close()
+        consultas = metricas.terminar_peticion()
+
+    t_render = time.perf_counter()
+    xml = str(resp)
+    fin = time.perf_counter()
+    _registrar_metricas(comando, fin - inicio, consultas, fin - t_render)
+    return xml
+
+def _registrar_metricas(comando, total, consultas, render):
+    registro = metricas.REGISTRO
+    registro.incrementar(M_PETICIONES, comando)
+    registro.observar(M_DURACION, total, comando)
+    registro.observar(M_RENDER, render, comando)
+    registro.observar(M_DB, sum(d for _, d in consultas), comando)
+    for consulta, duracion in consultas:
+        registro.observar(M_CONSULTA, duracion, comando, consulta)
+
+def _buscar_usuario(session, from_phone):
+    """
+    (snapshot, usuario ORM o None). Con la caché caliente no hay consulta: el ORM solo se carga
+    después, si el comando escribe. None si el teléfono no está registrado.
+    """
+    snap = cache_usuarios.CACHE.obtener(from_phone)
+    if snap is not None:
+        metricas.REGISTRO.incrementar(M_CACHE, "acierto")
+        return snap, None
+    metricas.REGISTRO.incrementar(M_CACHE, "fallo")
+    if escritura_diferida.COLA is not None and not escritura_diferida.COLA.esperar(from_phone):
+        print(f"[WARN] {from_phone}: escrituras diferidas sin confirmar, se lee la base igual")
+    epoca = cache_usuarios.CACHE.epoca
+    usuario = (session.query(Usuario).options(selectinload(Usuario.examenes))
+               .filter_by(telefono=from_phone).first())
     if usuario is None:
+        return None, None
+    return cache_usuarios.CACHE.guardar(cache_usuarios.snapshot(usuario), epoca), usuario
+
+def _atender(session, incoming, from_phone, resp):
+    """Ejecuta el mensaje entrante sobre `resp` y devuelve el nombre del comando (para métricas)."""
+    # buscar/crear usuario
+    snap, usuario = _buscar_usuario(session, from_phone)
+    if snap is None:
         usuario = Usuario(
             telefono=from_phone,
-            avisos_globales=avisos_to_str(AVISOS_DEFAULT),
+            avisos_globales_mask=MASCARA_DEFAULT,
             usar_globales=True
         )
         session.add(usuario)
         session.commit()
         resp.message("¡Hola! Te acabo de registrar. Escribe *MENU* para ver las opciones. 📲")
-        session.close()
-        return str(resp)
-
+        return "REGISTRO"
+    return _atender_usuario(session, snap, usuario, incoming, from_phone, resp)
+
+def _atender_usuario(session, snap, usuario, incoming, from_phone, resp):
+    """
+    Usuario ya registrado. Si el mensaje no escribe (lectura, vacío, desconocido) no usa `session`;
+    con escritura diferida activa, las escrituras tampoco (ver escritura_diferida.py).
+    """
     if not incoming:
         resp.message("Envía *MENU* para ver tus opciones.")
-        session.close()
-        return str(resp)
-
-    parts = incoming.split()
-    cmd = parts[0].upper()
-
-    # --- MENU
-    if cmd in ("MENU", "AYUDA", "HELP"):
-        resp.message(help_text())
-        session.close()
-        return str(resp)
-
-    # --- MIS EXAMENES
-    if incoming.upper().startswith("MIS EXAMENES"):
-        lista = pretty_examenes(usuario)
-        resp.message(f"🗓 *Tus exámenes:*\n{lista}")
-        session.close()
-        return str(resp)
-
-    # --- SET GLOBALES
-    if incoming.upper().startswith("SET GLOBALES"):
-        try:
-            valores = incoming.upper().replace("SET GLOBALES", "").strip().split()
-            avisos = normalizar_avisos(valores)
-            usuario.avisos_globales = avisos_to_str(avisos)
-            usuario.usar_globales = True
-            session.commit()
-            resp.message(f"✅ Avisos globales guardados: {avisos}\nSe aplicarán a todos tus cursos.")
-        except Exception as e:
-            resp.message(f"❌ Error procesando: {e}")
-        session.close()
-        return str(resp)
-
-    # --- USAR GLOBALES SI/NO
-    if incoming.upper().startswith("USAR GLOBALES"):
-        palabra = parts[-1].upper()
-        if palabra in ("SI", "SÍ", "YES"):
-            usuario.usar_globales = True
-            session.commit()
-            resp.message("✅ Activado: se usarán tus avisos globales.")
-        elif palabra in ("NO", "N"):
-            usuario.usar_globales = False
-            session.commit()
-            resp.message("✅ Desactivado: cada curso tendrá sus propios avisos.")
-        else:
-            resp.message("Escribe: *USAR GLOBALES SI* o *USAR GLOBALES NO*.")
-        session.close()
-        return str(resp)
-
-    # --- SET CURSO <curso> d1 d2 d3 d4
-    if incoming.upper().startswith("SET CURSO"):
-        try:
-            resto = incoming[len("SET CURSO"):].strip()
-            tokens = resto.split()
-            curso_tokens, dias_tokens = [], []
-            for t in tokens:
-                if t.isdigit():
-                    dias_tokens.append(t)
-                else:
-                    curso_tokens.append(t)
-
-            curso = " ".join(curso_tokens).strip()
-            avisos = normalizar_avisos(dias_tokens)
-
-            ex = session.query(Examen).filter_by(usuario_id=usuario.id, curso=curso).first()
-            if ex is None:
-                resp.message(f"❌ No encontré el curso '{curso}'.")
-                session.close()
-                return str(resp)
-
-            ex.avisos = avisos_to_str(avisos)
-            usuario.usar_globales = False
-            session.commit()
-            resp.message(f"✅ Avisos del curso *{curso}* actualizados a: {avisos}")
-        except Exception as e:
-            resp.message(f"❌ Error procesando SET CURSO: {e}")
-        session.close()
-        return str(resp)
-
-    # --- AGREGAR EXAMEN <curso> <fecha> [avisos...]
-    if incoming.upper().startswith("AGREGAR EXAMEN"):
-        try:
-            resto = incoming[len("AGREGAR EXAMEN"):].strip()
-            tokens = resto.split()
-            if len(tokens) < 2:
-                resp.message("Formato: AGREGAR EXAMEN <curso> <YYYY-MM-DD> [avisos...]")
-                session.close()
-                return str(resp)
-
-            fecha_idx = None
-            for i, t in enumerate(tokens):
-                if len(t) == 10 and t.count("-") == 2:
-                    fecha_idx = i
-                    break
-            if fecha_idx is None:
-                resp.message("Falta la fecha. Usa formato: YYYY-MM-DD")
-                session.close()
-                return str(resp)
-
-            curso = " ".join(tokens[:fecha_idx])
-            fecha = tokens[fecha_idx]
-            dias_tokens = tokens[fecha_idx + 1:]
-            avisos = normalizar_avisos(dias_tokens) if dias_tokens else []
-
-            existente = session.query(Examen).filter_by(usuario_id=usuario.id, curso=curso).first()
-            if existente:
-                resp.message(f"❌ Ya existe un examen para el curso '{curso}'. Usa CAMBIAR FECHA o SET CURSO.")
-                session.close()
-                return str(resp)
-
-            nuevo = Examen(
-                curso=curso,
-                fecha=fecha,
-                avisos=avisos_to_str(avisos)
-            )
-            usuario.examenes.append(nuevo)
-            session.commit()
-            resp.message(f"✅ Examen agregado: *{curso}* el {fecha} (avisos: {avisos if avisos else '(usará globales/default)'})")
-        except Exception as e:
-            resp.message(f"❌ Error procesando AGREGAR EXAMEN: {e}")
-        session.close()
-        return str(resp)
-
-    # --- CAMBIAR FECHA <curso> <YYYY-MM-DD>
-    if incoming.upper().startswith("CAMBIAR FECHA"):
-        try:
-            resto = incoming[len("CAMBIAR FECHA"):].strip()
-            tokens = resto.split()
-            if len(tokens) < 2:
-                resp.message("Formato: CAMBIAR FECHA <curso> <YYYY-MM-DD>")
-                session.close()
-                return str(resp)
-
-            fecha = tokens[-1]
-            curso = " ".join(tokens[:-1])
-
-            ex = session.query(Examen).filter_by(usuario_id=usuario.id, curso=curso).first()
-            if ex is None:
-                resp.message(f"❌ No encontré el curso '{curso}'.")
-                session.close()
-                return str(resp)
-
-            ex.fecha = fecha
-            session.commit()
-            resp.message(f"✅ Fecha actualizada para *{curso}*: {fecha}")
-        except Exception as e:
-            resp.message(f"❌ Error procesando CAMBIAR FECHA: {e}")
-        session.close()
-        return str(resp)
-
-    # --- ELIMINAR EXAMEN <curso>
-    if incoming.upper().startswith("ELIMINAR EXAMEN"):
-        try:
-            curso = incoming[len("ELIMINAR EXAMEN"):].strip()
-            ex = session.query(Examen).filter_by(usuario_id=usuario.id, curso=curso).first()
-            if ex is None:
-                resp.message(f"❌ No encontré el curso '{curso}'.")
-                session.close()
-                return str(resp)
-
-            session.delete(ex)
-            session.commit()
-            resp.message(f"✅ Examen eliminado: *{curso}*")
-        except Exception as e:
-            resp.message(f"❌ Error procesando ELIMINAR EXAMEN: {e}")
-        session.close()
-        return str(resp)
-
-    resp.message("No entendí tu mensaje. Escribe *MENU* para ver las opciones.")
-    session.close()
-    return str(resp)
+        return "VACIO"
+
+    if "\n" in incoming:
+        pasos = comandos.resolver_lineas(incoming)
+        if len(pasos) > 1:
+            return _atender_varias(session, snap, usuario, pasos, from_phone, resp)
+
+    comando, args = comandos.resolver(incoming)
+    if comando is None:
+        resp.message("No entendí tu mensaje. Escribe *MENU* para ver las opciones.")
+        return "DESCONOCIDO"
+
+    tiempos = {}
+    if comando.lectura:
+        texto = comandos.atender(session, snap, comando, args, tiempos)
+    elif escritura_diferida.COLA is not None and comando.aplicar is not None:
+        texto = escritura_diferida.atender(snap, comando, args, tiempos)
+    else:
+        if usuario is None:
+            usuario = session.query(Usuario).filter_by(telefono=from_phone).first()
+        texto = comandos.atender(session, usuario, comando, args, tiempos)
+    resp.message(texto)
+    for etapa, duracion in tiempos.items():
+        metricas.REGISTRO.observar(M_ETAPA, duracion, comando.nombre, etapa)
+    return comando.nombre
+
+def _atender_varias(session, snap, usuario, pasos, from_phone, resp):
+    """
+    Mensaje de varias líneas: se validan todas juntas contra un solo conjunto de exámenes y las
+    escrituras válidas se guardan en una transacción (o se encolan, con escritura diferida).
+    """
+    inicio = time.perf_counter()
+    escribe = any(comando is not None and not comando.lectura for comando, _ in pasos)
+    if not escribe:
+        texto, _, _ = comandos.planificar(snap, pasos)
+    elif escritura_diferida.COLA is not None:
+        texto = escritura_diferida.encolar_plan(snap, lambda actual: comandos.planificar(actual, pasos))
+    else:
+        # El plan se hace sobre lo que hay en la base ahora, no sobre la caché: persistir() copia
+        # el estado final tal cual
+        usuario = (session.query(Usuario).options(selectinload(Usuario.examenes))
+                   .filter_by(telefono=from_phone).one())
+        texto, final, aplicados = comandos.planificar(cache_usuarios.snapshot(usuario), pasos)
+        if aplicados:
+            try:
+                comandos.persistir(session, usuario, final)
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                texto = f"❌ Error guardando los cambios: {e}"
+    metricas.REGISTRO.observar(M_ETAPA, time.perf_counter() - inicio, "VARIAS", "ejecutar")
+    resp.message(texto)
+    return "VARIAS"
 
 @app.route("/", methods=["GET"])
 def home():
     return "WhatsApp Academic Bot OK"
 
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return metricas.REGISTRO.exponer(), 200, {"Content-Type": metricas.CONTENT_TYPE}
+
 if __name__ == "__main__":
     print(f"[{datetime.now()}] Iniciando webhook Flask en http://127.0.0.1:5000 ...")
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -2,13 +2,13 @@ import json
 from datetime import datetime
 from flask import Flask, request
 from twilio.twiml.messaging_response import MessagingResponse
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from models import Usuario, Examen, Base
+from models import Usuario, Examen, Base, crear_engine
+from avisos import a_mascara, a_texto
 
 # ---------------- CONFIGURACIÓN ----------------
 app = Flask(__name__)
-engine = create_engine("sqlite:///data.db")
+engine = crear_engine("sqlite:///data.db")
 Session = sessionmaker(bind=engine)
 
 MIN_DIA = 5
@@ -30,7 +30,7 @@ def normalizar_avisos(avisos):
 def pretty_examenes(usuario):
     lines = []
     for ex in usuario.examenes:
-        avisos_str = ex.avisos if ex.avisos else f"(usa globales: {usuario.avisos_globales})"
+        avisos_str = a_texto(ex.avisos_mask) if ex.avisos_mask else f"(usa globales: {a_texto(usuario.avisos_globales_mask)})"
         lines.append(f"- {ex.curso}: {ex.fecha} | avisos: {avisos_str}")
     return "\n".join(lines) if lines else "No tienes exámenes registrados."
 
@@ -83,7 +83,7 @@ def whatsapp_webhook():
     if incoming.upper().startswith("SET GLOBALES"):
         valores = incoming.upper().replace("SET GLOBALES", "").strip().split()
         avisos = normalizar_avisos(valores)
-        usuario.avisos_globales = ",".join(map(str, avisos))
+        usuario.avisos_globales_mask = a_mascara(avisos)
         usuario.usar_globales = True
         session.commit()
         resp.message(f"✅ Avisos globales guardados: {avisos}")